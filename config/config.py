@@ -1,3 +1,5 @@
+BASE_FRAME_SIZE = (1080, 1920)
+
 TEMPLATE_MATCHING_THRESHOLD = 0.6
 POKEMON_TEMPLATE_MATCHING_THRESHOLD = 0.78
 WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD = 0.8
@@ -13,6 +15,10 @@ FIRST_RANKING_NUMBER_WINDOW = (520, 610, 1200, 1650)
 
 RANKING_WINDOW = (360, 515, 710, 1210)
 RANKING_NUMBER_WINDOW = (580, 680, 750, 1200)
+RANKING_NUMBER_THRESHOLD_VALUE = 160
+# 順位の数字のテンプレート(0.png - 9.png)。全ての数字のスコアがこれ以上の場合のみ OCR を省略する
+RANK_DIGIT_TEMPLATE_DIR = "template_images/rank_digit_templates"
+RANK_DIGIT_MATCHING_THRESHOLD = 0.8
 
 WIN_LOST_WINDOW = (950, 1050, 400, 750)
 
@@ -35,6 +41,10 @@ POKEMON_SELECT_NUMBER_WINDOW5 = (616, 666, 748, 928)
 POKEMON_SELECT_NUMBER_WINDOW6 = (733, 783, 748, 928)
 POKEMON_SELECT_DONE_WINDOW = (855, 930, 145, 805)
 POKEMON_SELECT_WINDOW_THRESHOLD_VALUE = 200
+# 選出順のテンプレートのスコアがこれを超え、2番目のウィンドウとの差が MARGIN 以上であれば、
+# OCR せずに選出順を決める(テンプレートは背景が共通なので、違う順番でも 0.8 程度になる)
+POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_THRESHOLD = 0.9
+POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_MARGIN = 0.1
 
 POKEMON_MESSAGE_WINDOW = (800, 840, 285, 330)
 POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE = 230
@@ -42,6 +52,20 @@ POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS = 500
 POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS = 300
 MESSAGE_WINDOW = (780, 930, 250, 1500)
 MESSAGE_TEMPLATE_MATCHING_THRESHOLD = 0.8
+# メッセージをまとめて修正する場合の、1リクエストあたりのメッセージのトークン数(見積もり)と件数の上限
+MESSAGE_CORRECTION_MAX_CHUNK_TOKENS = 3000
+MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES = 60
+# メッセージの修正を並行に行う場合の、同時リクエスト数・1秒あたりのリクエスト数(連続で送れる数)・
+# 再試行の回数と最初の待ち時間(秒)
+MESSAGE_CORRECTION_MAX_CONCURRENCY = 8
+MESSAGE_CORRECTION_REQUESTS_PER_SECOND = 5.0
+MESSAGE_CORRECTION_BURST = 10
+MESSAGE_CORRECTION_MAX_RETRIES = 3
+MESSAGE_CORRECTION_BACKOFF_SECONDS = 1.0
+# 文法でメッセージを修正する場合に、名前の部分をチームの名前に置き換える正規化編集距離の上限
+LOCAL_MESSAGE_FIX_NAME_THRESHOLD = 0.34
+# 技の部分を技の一覧の名前に置き換える正規化編集距離の上限(技は数が多いので、名前より厳しくする)
+LOCAL_MESSAGE_FIX_MOVE_THRESHOLD = 0.2
 
 FAISS_POKEMON_SCORE_THRESHOLD = 100
 POKEMON_NAME_WINDOW_THRESHOLD_VALUE = 200
@@ -86,3 +110,10 @@ MOVE_TITLE1 = (600, 660, 1470, 1880)
 MOVE_TITLE2 = (710, 770, 1470, 1880)
 MOVE_TITLE3 = (820, 880, 1470, 1880)
 MOVE_TITLE4 = (930, 990, 1470, 1880)
+
+# 検出器のウィンドウの平均絶対差がこの値以下なら、前回の判定結果を使い回す
+FRAME_CHANGE_THRESHOLD = 1.0
+FRAME_CHANGE_MAX_REUSE_FRAMES = 30
+
+# SceneGrammarDetector が何フレームごとに全ての検出器で判定し直すか(画面遷移の追跡の再同期)
+SCENE_GRAMMAR_FULL_CHECK_INTERVAL = 30
@@ -5,7 +5,6 @@ from typing import Dict, List, Union
 
 import cv2
 import numpy as np
-import pandas as pd
 import yt_dlp
 from fastapi import FastAPI, File, HTTPException, Request, UploadFile, status
 from fastapi.exceptions import RequestValidationError
@@ -19,6 +18,7 @@ from poke_battle_logger.cloud_batch_handler import CloudBatchHandler
 from poke_battle_logger.database.database_handler import DatabaseHandler
 from poke_battle_logger.firestore_handler import FirestoreHandler
 from poke_battle_logger.gcs_handler import GCSHandler
+from poke_battle_logger.name_registry import get_name_registry
 from poke_battle_logger.types import ImageLabel, NameWindowImageLabel
 
 logging.basicConfig(
@@ -44,13 +44,6 @@ app.add_middleware(
 )
 
 
-pokemon_name_df = pd.read_csv("data/pokemon_names.csv")
-pokemon_japanese_to_no_dict: Dict[str, int] = dict(
-    zip(pokemon_name_df["Japanese"], pokemon_name_df["No."])
-)
-pokemon_japanese_to_english_dict: Dict[str, str] = dict(
-    zip(pokemon_name_df["Japanese"], pokemon_name_df["English"])
-)
 pokemon_extractor = PokemonExtractor()
 
 
@@ -78,7 +71,7 @@ async def get_trainer_id_in_DB_api(trainer_id: str) -> int:
 
 @app.get("/api/v1/pokemon_name_to_no")
 async def get_pokemon_name_to_no(pokemon_name: str) -> int:
-    return pokemon_japanese_to_no_dict[pokemon_name]
+    return get_name_registry().ja_to_no[pokemon_name]
 
 
 @app.get("/api/v1/recent_battle_summary")
@@ -309,8 +302,7 @@ async def get_pokemon_image_url(
     if pokemon_name == "Unseen":
         return "https://upload.wikimedia.org/wikipedia/commons/5/53/Pok%C3%A9_Ball_icon.svg"
     # もしカタカナだったら英語に直す
-    if pokemon_name in pokemon_japanese_to_english_dict:
-        pokemon_name = pokemon_japanese_to_english_dict[pokemon_name]
+    pokemon_name = get_name_registry().english_name(pokemon_name)
     # lowerに変換・空白はハイフンに変換
     pokemon_name = pokemon_name.lower().replace(" ", "-")
     pokemon_image_url = (
@@ -0,0 +1,240 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import Future
+from logging import getLogger
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+)
+
+from config.config import (
+    MESSAGE_CORRECTION_BACKOFF_SECONDS,
+    MESSAGE_CORRECTION_BURST,
+    MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES,
+    MESSAGE_CORRECTION_MAX_CHUNK_TOKENS,
+    MESSAGE_CORRECTION_MAX_CONCURRENCY,
+    MESSAGE_CORRECTION_MAX_RETRIES,
+    MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+)
+
+from poke_battle_logger.batch.local_message_fixer import LocalMessageFixer
+from poke_battle_logger.batch.message_correction import (
+    BattleMessageContext,
+    BattleMessageRequest,
+    chunk_requests,
+)
+from poke_battle_logger.batch.message_correction_cache import MessageCorrectionCache
+
+logger = getLogger(__name__)
+
+T = TypeVar("T")
+
+AsyncFixBattleMessage = Callable[[BattleMessageRequest], Awaitable[str]]
+AsyncFixBattleMessages = Callable[
+    [Sequence[BattleMessageRequest], BattleMessageContext], Awaitable[Dict[int, str]]
+]
+
+
+class TokenBucket:
+    """
+    1秒あたり rate 回(最大 capacity 回まで連続)にリクエストを制限する
+    """
+
+    def __init__(self, rate: float, capacity: int) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AsyncMessageCorrectionStage:
+    """
+    メッセージの修正を、抽出のループとは別のスレッドのイベントループで並行に行う
+
+    submit したメッセージはすぐに(fix_messages がある場合は対戦が変わった時点でまとめて)
+    修正を始め、join で全ての結果を frame_number 順の dict で返す。
+    同時に送るリクエストは max_concurrency 件、1秒あたり requests_per_second 件までで、
+    失敗したリクエストは指数的に待ち時間を伸ばしながら max_retries 回まで再試行する。
+    cache がある場合は、修正済みのメッセージは submit の時点で結果を使い、修正した結果を保存する。
+    local_fixer がある場合は、文法で修正できるメッセージは submit の時点で修正する
+    """
+
+    def __init__(
+        self,
+        fix_message: AsyncFixBattleMessage,
+        fix_messages: Optional[AsyncFixBattleMessages] = None,
+        max_concurrency: int = MESSAGE_CORRECTION_MAX_CONCURRENCY,
+        requests_per_second: float = MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+        burst: int = MESSAGE_CORRECTION_BURST,
+        max_retries: int = MESSAGE_CORRECTION_MAX_RETRIES,
+        backoff_seconds: float = MESSAGE_CORRECTION_BACKOFF_SECONDS,
+        max_chunk_tokens: int = MESSAGE_CORRECTION_MAX_CHUNK_TOKENS,
+        max_chunk_messages: int = MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES,
+        cache: Optional[MessageCorrectionCache] = None,
+        local_fixer: Optional[LocalMessageFixer] = None,
+    ) -> None:
+        self.fix_message = fix_message
+        self.cache = cache
+        self.local_fixer = local_fixer
+        self.fix_messages = fix_messages
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_chunk_messages = max_chunk_messages
+        self.request_count = 0
+        self.retry_count = 0
+        self.fallback_count = 0
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="message-correction", daemon=True
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token_bucket: Optional[TokenBucket] = None
+        self._futures: List[Future] = []
+        self._pending: List[BattleMessageRequest] = []
+        self._lock = threading.Lock()
+        self._fixed_messages: Dict[int, str] = {}
+
+    def start(self) -> "AsyncMessageCorrectionStage":
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+        return self
+
+    async def _setup(self) -> None:
+        # イベントループのスレッドで作る
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._token_bucket = TokenBucket(self.requests_per_second, self.burst)
+
+    def submit(self, request: BattleMessageRequest) -> None:
+        """
+        メッセージの修正を登録する(抽出のスレッドから呼ぶ)
+        """
+        if not request.message:
+            with self._lock:
+                self._fixed_messages[request.frame_number] = ""
+            return
+        local_message = (
+            self.local_fixer.fix(request) if self.local_fixer is not None else None
+        )
+        if local_message is not None:
+            with self._lock:
+                self._fixed_messages[request.frame_number] = local_message
+            return
+        cached_message = self.cache.get(request) if self.cache is not None else None
+        if cached_message is not None:
+            with self._lock:
+                self._fixed_messages[request.frame_number] = cached_message
+            return
+        with self._lock:
+            if self.fix_messages is None:
+                self._schedule(self._correct_one(request))
+                return
+            if len(self._pending) > 0 and self._pending[-1].context != request.context:
+                self._flush()
+            self._pending.append(request)
+
+    def _flush(self) -> None:
+        for chunk in chunk_requests(
+            self._pending, self.max_chunk_tokens, self.max_chunk_messages
+        ):
+            self._schedule(self._correct_chunk(chunk))
+        self._pending = []
+
+    def _schedule(self, coroutine: Coroutine[Any, Any, None]) -> None:
+        self._futures.append(asyncio.run_coroutine_threadsafe(coroutine, self._loop))
+
+    def join(self) -> Dict[int, str]:
+        """
+        全ての修正を待ち、frame_number 順の修正後のメッセージを返す
+
+        再試行しても修正できなかったメッセージがある場合は、その例外を送出する
+        """
+        with self._lock:
+            self._flush()
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+        return dict(sorted(self._fixed_messages.items()))
+
+    async def _call(self, call: Callable[[], Awaitable[T]]) -> T:
+        """
+        同時実行数とレートを制限してリクエストし、失敗したら待ってから再試行する
+        """
+        assert self._semaphore is not None and self._token_bucket is not None
+        attempt = 0
+        while True:
+            await self._token_bucket.acquire()
+            try:
+                async with self._semaphore:
+                    self.request_count += 1
+                    return await call()
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff_seconds * 2**attempt
+                # 同時に失敗したリクエストが同時に再試行しないようにずらす
+                delay += random.uniform(0, self.backoff_seconds)
+                logger.warning(f"Retry message correction in {delay:.1f}s: {e}")
+                self.retry_count += 1
+                attempt += 1
+                await asyncio.sleep(delay)
+
+    async def _correct_one(self, request: BattleMessageRequest) -> None:
+        fixed_message = await self._call(lambda: self.fix_message(request))
+        self._store(request, fixed_message.strip())
+
+    def _store(self, request: BattleMessageRequest, fixed_message: str) -> None:
+        self._fixed_messages[request.frame_number] = fixed_message
+        if self.cache is not None:
+            self.cache.put(request, fixed_message)
+
+    async def _correct_chunk(self, chunk: List[BattleMessageRequest]) -> None:
+        assert self.fix_messages is not None
+        fix_messages = self.fix_messages
+        try:
+            fixed_chunk = await self._call(
+                lambda: fix_messages(chunk, chunk[0].context)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to fix {len(chunk)} messages at once: {e}")
+            fixed_chunk = {}
+
+        missing = []
+        for request in chunk:
+            if request.frame_number in fixed_chunk:
+                self._store(request, fixed_chunk[request.frame_number].strip())
+            else:
+                missing.append(request)
+        self.fallback_count += len(missing)
+        await asyncio.gather(*[self._correct_one(request) for request in missing])
@@ -0,0 +1,169 @@
+from typing import Dict, Tuple
+
+import cv2
+import numpy as np
+
+# 1フレームあたりの照合位置(縦方向のずれのみ)がこれ以下なら、DFT を使わずに行列積で計算する
+DIRECT_CORRELATION_MAX_POSITIONS = 64
+
+
+def to_gray(image: np.ndarray, code: int) -> np.ndarray:
+    """
+    画像をグレースケールにする(グレースケールでデコードした2次元の画像はそのまま返す)
+    """
+    if image.ndim == 2:
+        return image
+    return cv2.cvtColor(image, code)
+
+
+def batch_to_gray(images: np.ndarray, code: int) -> np.ndarray:
+    """
+    (K, H, W, 3) の配列をまとめてグレースケールにする((K, H, W) の配列はそのまま返す)
+
+    K 枚を縦に連結した1枚の画像として cv2.cvtColor を1回だけ呼ぶので、
+    フレームごとに変換した場合と同じ値になる
+    """
+    if images.ndim == 3:
+        return images
+    num_images, height, width = images.shape[:3]
+    gray = cv2.cvtColor(
+        np.ascontiguousarray(images).reshape(num_images * height, width, -1), code
+    )
+    return gray.reshape(num_images, height, width)
+
+
+def _box_sum(images: np.ndarray, size: int, axis: int) -> np.ndarray:
+    if images.shape[axis] == size:
+        sums: np.ndarray = images.sum(axis=axis, keepdims=True, dtype=np.int64)
+        return sums
+    cumulative = np.cumsum(images, axis=axis, dtype=np.int64)
+    upper = np.take(cumulative, np.arange(size - 1, images.shape[axis]), axis=axis)
+    lower = np.take(cumulative, np.arange(0, images.shape[axis] - size), axis=axis)
+    upper[(slice(None),) * axis + (slice(1, None),)] -= lower
+    return upper
+
+
+def _window_sums(images: np.ndarray, height: int, width: int) -> np.ndarray:
+    """
+    (height, width) の窓ごとの総和を K フレーム分まとめて求める(整数で厳密に計算する)
+
+    ROI いっぱいの軸を先に足し合わせて、累積和を取る配列を小さくする
+    """
+    if images.shape[2] == width:
+        return _box_sum(_box_sum(images, width, 2), height, 1)
+    return _box_sum(_box_sum(images, height, 1), width, 2)
+
+
+class BatchTemplateMatcher:
+    """
+    同じ ROI を K フレーム分重ねた配列に対して、cv2.matchTemplate(TM_CCOEFF_NORMED)と
+    同じスコアをまとめて計算する
+
+    分子はテンプレートから平均を引いたものとの相互相関で、ROI とテンプレートの幅が同じで
+    照合位置が少ない場合は K フレーム分を行列積で、それ以外は ROI の大きさごとに
+    事前計算したテンプレートのスペクトルとの積(DFT)で求める。
+    分母は積分画像から求めた窓ごとの分散を使う。
+    """
+
+    def __init__(self, template: np.ndarray) -> None:
+        self.template_shape: Tuple[int, int] = (template.shape[0], template.shape[1])
+        template = template.astype(np.float64)
+        self.template_area = template.size
+        self.zero_mean_template = (template - template.mean()).astype(np.float32)
+        # cv2 と同じく、テンプレートの標準偏差 * sqrt(面積) をテンプレート側のノルムにする
+        self.template_norm = float(template.std()) * np.sqrt(self.template_area)
+        self.is_flat_template = float(template.std()) ** 2 < np.finfo(np.float64).eps
+        self._spectra: Dict[Tuple[int, int], np.ndarray] = {}
+
+    def _spectrum(self, dft_shape: Tuple[int, int]) -> np.ndarray:
+        if dft_shape not in self._spectra:
+            padded = np.zeros(dft_shape, dtype=np.float32)
+            height, width = self.template_shape
+            padded[:height, :width] = self.zero_mean_template
+            self._spectra[dft_shape] = cv2.dft(padded, flags=cv2.DFT_COMPLEX_OUTPUT)
+        return self._spectra[dft_shape]
+
+    def _cross_correlation(self, images: np.ndarray) -> np.ndarray:
+        num_images, image_height, image_width = images.shape
+        height, width = self.template_shape
+        result_height = image_height - height + 1
+        result_width = image_width - width + 1
+        correlation = np.empty(
+            (num_images, result_height, result_width), dtype=np.float32
+        )
+        if result_width == 1 and result_height <= DIRECT_CORRELATION_MAX_POSITIONS:
+            # ROI と同じ幅のテンプレートなら、縦にずらした窓は連続したメモリになる
+            float_images = images.astype(np.float32)
+            template_vector = self.zero_mean_template.ravel()
+            for y in range(result_height):
+                correlation[:, y, 0] = (
+                    float_images[:, y : y + height].reshape(num_images, -1)
+                    @ template_vector
+                )
+            return correlation
+
+        # 巡回相関でも、有効な照合位置では折り返しが起きない
+        dft_shape = (
+            cv2.getOptimalDFTSize(image_height),
+            cv2.getOptimalDFTSize(image_width),
+        )
+        spectrum = self._spectrum(dft_shape)
+        padded = np.zeros(dft_shape, dtype=np.float32)
+        for k in range(num_images):
+            padded[:image_height, :image_width] = images[k]
+            image_spectrum = cv2.dft(
+                padded, flags=cv2.DFT_COMPLEX_OUTPUT, nonzeroRows=image_height
+            )
+            correlation[k] = cv2.idft(
+                cv2.mulSpectrums(image_spectrum, spectrum, 0, conjB=True),
+                flags=cv2.DFT_REAL_OUTPUT | cv2.DFT_SCALE,
+            )[:result_height, :result_width]
+        return correlation
+
+    def match(self, images: np.ndarray) -> np.ndarray:
+        """
+        (K, H, W) の uint8 のグレースケール画像に対する照合結果 (K, H - h + 1, W - w + 1) を返す
+        """
+        height, width = self.template_shape
+        result_shape = (
+            images.shape[0],
+            images.shape[1] - height + 1,
+            images.shape[2] - width + 1,
+        )
+        if self.is_flat_template:
+            return np.ones(result_shape, dtype=np.float64)
+
+        numerator = self._cross_correlation(images).astype(np.float64)
+        window_sums = _window_sums(images, height, width).astype(np.float64)
+        window_square_sums = _window_sums(
+            np.square(images, dtype=np.uint16), height, width
+        ).astype(np.float64)
+        variances = np.maximum(
+            window_square_sums - window_sums * window_sums / self.template_area, 0
+        )
+        # 平坦な窓は cv2 と同じく丸め誤差とみなして 0 除算を避ける
+        is_flat_window = variances <= np.minimum(
+            0.5, 10 * np.finfo(np.float32).eps * window_square_sums
+        )
+        denominator = np.where(is_flat_window, 0, np.sqrt(variances)) * (
+            self.template_norm
+        )
+
+        # |分子| が分母をわずかに超える場合の扱いも cv2 に合わせる
+        abs_numerator = np.abs(numerator)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            scores = np.where(
+                abs_numerator < denominator,
+                numerator / denominator,
+                np.where(abs_numerator < denominator * 1.125, np.sign(numerator), 0.0),
+            )
+        return scores
+
+    def max_scores(self, images: np.ndarray) -> np.ndarray:
+        """
+        フレームごとの最大スコア (K,) を返す(cv2.minMaxLoc の最大値に相当)
+        """
+        max_scores: np.ndarray = (
+            self.match(images).reshape(images.shape[0], -1).max(axis=1)
+        )
+        return max_scores
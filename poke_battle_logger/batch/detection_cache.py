@@ -0,0 +1,136 @@
+import hashlib
+import os
+from logging import getLogger
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from config.config import (
+    FIRST_RANKING_WINDOW,
+    FRAME_CHANGE_MAX_REUSE_FRAMES,
+    FRAME_CHANGE_THRESHOLD,
+    LEVEL_50_WINDOW,
+    MOVE_ANKER_POSITION,
+    MOVE_ANKER_THRESHOLD,
+    POKEMON_MESSAGE_WINDOW,
+    POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE,
+    POKEMON_SELECT_DONE_WINDOW,
+    RANKING_WINDOW,
+    STANDING_BY_WINDOW,
+    TEMPLATE_MATCHING_THRESHOLD,
+    WIN_LOST_WINDOW,
+    WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD,
+)
+
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_scanner import DETECTION_TARGETS
+
+logger = getLogger(__name__)
+
+DETECTION_CACHE_DIR = "detection_cache"
+
+# 検出処理(判定順や閾値の使い方など)を変えたら上げる
+DETECTOR_VERSION = 1
+
+# FrameDetector の判定に使う設定値(変わった場合はキャッシュを使わない)
+DETECTOR_SETTINGS = [
+    FIRST_RANKING_WINDOW,
+    LEVEL_50_WINDOW,
+    MOVE_ANKER_POSITION,
+    MOVE_ANKER_THRESHOLD,
+    POKEMON_MESSAGE_WINDOW,
+    POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE,
+    POKEMON_SELECT_DONE_WINDOW,
+    RANKING_WINDOW,
+    STANDING_BY_WINDOW,
+    TEMPLATE_MATCHING_THRESHOLD,
+    WIN_LOST_WINDOW,
+    WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD,
+]
+
+
+def detection_cache_path(video_id: str) -> str:
+    return os.path.join(DETECTION_CACHE_DIR, f"{video_id}.npz")
+
+
+def detector_version_key(
+    frame_detector: FrameDetector,
+    strides: Optional[Dict[str, int]] = None,
+    scene_grammar: bool = False,
+    change_detection: bool = False,
+    frame_source: str = "opencv",
+) -> str:
+    """
+    検出結果が変わりうる要素(テンプレート画像、閾値とウィンドウ、結果が変わりうる
+    走査方法)から、キャッシュの有効性を判定するキーを作る
+    """
+    digest = hashlib.sha1()
+    digest.update(f"version={DETECTOR_VERSION};lang={frame_detector.lang};".encode())
+    for template in frame_detector.setup_templates():
+        digest.update(np.ascontiguousarray(template).tobytes())
+    digest.update(f"settings={DETECTOR_SETTINGS!r};".encode())
+    digest.update(f"strides={sorted((strides or {}).items())};".encode())
+    digest.update(f"scene_grammar={scene_grammar};".encode())
+    if change_detection:
+        digest.update(
+            "change_detection="
+            f"{FRAME_CHANGE_THRESHOLD},{FRAME_CHANGE_MAX_REUSE_FRAMES};".encode()
+        )
+    if not frame_detector.geometry.is_base:
+        geometry = frame_detector.geometry
+        digest.update(f"geometry={geometry.height}x{geometry.width};".encode())
+    if frame_source != "opencv":
+        # デコーダが違うと画素値がわずかに変わりうる
+        digest.update(f"frame_source={frame_source};".encode())
+    return digest.hexdigest()
+
+
+def save_detection_cache(
+    path: str,
+    detected_frames: Dict[str, List[int]],
+    total_frames: int,
+    version_key: str,
+) -> None:
+    """
+    検出結果ごとのフレーム番号を int32 の配列として npz に保存する
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    arrays = {
+        key: np.asarray(detected_frames[key], dtype=np.int32)
+        for key in DETECTION_TARGETS
+    }
+    # np.savez は拡張子がなければ .npz を付けるので、一時ファイルも .npz にする
+    tmp_path = f"{path}.tmp.npz"
+    np.savez_compressed(
+        tmp_path,
+        version_key=np.array(version_key),
+        total_frames=np.array(total_frames, dtype=np.int64),
+        **arrays,
+    )
+    os.replace(tmp_path, path)
+
+
+def load_detection_cache(
+    path: str, version_key: str
+) -> Optional[Tuple[Dict[str, List[int]], int]]:
+    """
+    保存した検出結果を読み込む。ファイルがない、壊れている、キーが一致しない場合は None
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as cache:
+            if str(cache["version_key"]) != version_key:
+                logger.info(f"Detection cache is outdated: {path}")
+                return None
+            detected_frames = {
+                key: [int(i) for i in cache[key]] for key in DETECTION_TARGETS
+            }
+            total_frames = int(cache["total_frames"])
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Failed to load detection cache {path}: {e}")
+        return None
+    return detected_frames, total_frames
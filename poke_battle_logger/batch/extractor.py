@@ -1,10 +1,8 @@
 import re
-from typing import List, Optional, Tuple, cast
+from typing import Dict, List, Optional, Sequence, Tuple
 
 import cv2
-import editdistance
 import numpy as np
-import pytesseract
 from config.config import (
     FIRST_RANKING_NUMBER_WINDOW,
     MESSAGE_WINDOW,
@@ -24,18 +22,35 @@ from config.config import (
     POKEMON_SELECT_NUMBER_WINDOW5,
     POKEMON_SELECT_NUMBER_WINDOW6,
     POKEMON_SELECT_WINDOW_THRESHOLD_VALUE,
+    RANKING_NUMBER_THRESHOLD_VALUE,
     RANKING_NUMBER_WINDOW,
-    TEMPLATE_MATCHING_THRESHOLD,
     WIN_LOST_WINDOW,
     WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD,
     YOUR_POKEMON_NAME_WINDOW,
 )
 
+from poke_battle_logger.batch.async_message_correction import (
+    AsyncMessageCorrectionStage,
+)
+from poke_battle_logger.batch.local_message_fixer import LocalMessageFixer
+from poke_battle_logger.batch.message_correction import (
+    BatchMessageCorrector,
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+from poke_battle_logger.batch.message_correction_cache import MessageCorrectionCache
+from poke_battle_logger.batch.name_window_cache import NameWindowCache
+from poke_battle_logger.batch.ocr_engine import get_ocr_engine_pool
 from poke_battle_logger.batch.openai_handler import OpenAIHandler
 from poke_battle_logger.batch.pokemon_name_window_extractor import (
     EDIT_DISTANCE_THRESHOLD,
     PokemonNameWindowExtractor,
 )
+from poke_battle_logger.batch.rank_digit_recognizer import RankDigitRecognizer
+from poke_battle_logger.batch.select_order import (
+    decisive_select_order,
+    solve_select_order,
+)
 
 
 class Extractor:
@@ -45,9 +60,32 @@ class Extractor:
     TODO: やっていることが増えすぎたので、いずれ複数の小さなクラスに分割する
     """
 
-    def __init__(self, lang: str = "en") -> None:
+    def __init__(
+        self,
+        lang: str = "en",
+        name_window_cache: Optional[NameWindowCache] = None,
+        adaptive_name_langs: bool = False,
+        tiled_ocr: bool = False,
+        message_correction_cache: Optional[MessageCorrectionCache] = None,
+        local_message_fixer: Optional[LocalMessageFixer] = None,
+    ) -> None:
+        """
+        tiled_ocr: 同じフレームの複数の小さな画像(選出順のウィンドウ、名前ウィンドウの
+            2値化画像)を1枚に並べて、1回で OCR する
+        message_correction_cache: メッセージの修正結果のキャッシュ(修正済みのメッセージは API に送らない)
+        local_message_fixer: 決まった形のメッセージを文法で修正する(修正できたメッセージは API に送らない)
+        """
         self.lang = lang
-        self.pokemon_name_window_extractor = PokemonNameWindowExtractor()
+        self.message_correction_cache = message_correction_cache
+        self.local_message_fixer = local_message_fixer
+        self.tiled_ocr = tiled_ocr
+        self.ocr_engine_pool = get_ocr_engine_pool()
+        self.rank_digit_recognizer = RankDigitRecognizer()
+        self.rank_digit_template_count = 0
+        self.rank_ocr_fallback_count = 0
+        self.pokemon_name_window_extractor = PokemonNameWindowExtractor(
+            self.ocr_engine_pool, name_window_cache, adaptive_name_langs, tiled_ocr
+        )
         (
             self.win_window_template,
             self.lost_window_template,
@@ -58,6 +96,12 @@ class Extractor:
             self.third_template,
         ) = self._setup_pokemon_select_window_templates()
         self.openai_handler = OpenAIHandler()
+        self.message_corrector = BatchMessageCorrector(
+            self.openai_handler.fix_battle_messages,
+            self._fix_message_request,
+            cache=message_correction_cache,
+            local_fixer=local_message_fixer,
+        )
 
     def _setup_pokemon_select_window_templates(
         self,
@@ -135,74 +179,67 @@ class Extractor:
         """
         テンプレートマッチングで、ポケモンの選出順を検出する
 
-        select{i}_window に対して、 first_template・second_template・third_template との
-        テンプレートマッチングを行い、最もスコアが高いものを選出順として返す
+        select{i}_window と first_template・second_template・third_template との
+        スコアを1回ずつ計算し、スコアだけで決まる場合はそれを選出順として返す。
+        決まらない場合は各ウィンドウを1回ずつ OCR し、OCR 結果とスコアから選出順を決める
         """
-
-        pokemon_select_order_score: list[tuple[int, int, float]] = []
-
-        for i, template in enumerate(
-            [self.first_template, self.second_template, self.third_template]
-        ):
-            select_windows = [
-                select1_window,
-                select2_window,
-                select3_window,
-                select4_window,
-                select5_window,
-                select6_window,
+        select_windows = [
+            select1_window,
+            select2_window,
+            select3_window,
+            select4_window,
+            select5_window,
+            select6_window,
+        ]
+        template_scores = np.array(
+            [
+                [
+                    cv2.minMaxLoc(
+                        cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
+                    )[1]
+                    for window in select_windows
+                ]
+                for template in [
+                    self.first_template,
+                    self.second_template,
+                    self.third_template,
+                ]
             ]
-            for k, window in enumerate(select_windows):
-                threshold_value = POKEMON_SELECT_WINDOW_THRESHOLD_VALUE
-                max_value = 255
-                _, window2 = cv2.threshold(
-                    window, threshold_value, max_value, cv2.THRESH_BINARY
-                )
-                if self.lang == "ja":
-                    _recognized_order_str = pytesseract.image_to_string(
-                        window2, lang="jpn", config="--psm 8"  # 8: 1単語のみある想定
-                    )
-                elif self.lang == "en":
-                    _recognized_order_str = pytesseract.image_to_string(
-                        window2, lang="eng", config="--psm 6"
-                    )
-                else:
-                    raise ValueError("lang must be en or ja")
-                _recognized_order_str = re.sub(r"[^\w]", "", _recognized_order_str)
-
-                _order_str = self.order_str[i]
-                ed_score = editdistance.eval(_recognized_order_str, _order_str) / (
-                    max(len(_recognized_order_str), len(_order_str)) * 1.00
-                )
-                res = cv2.matchTemplate(window, template, cv2.TM_CCOEFF_NORMED)
-                score = cv2.minMaxLoc(res)[1]
-                if (
-                    _order_str in _recognized_order_str
-                    or ed_score == 0
-                    or (
-                        score > TEMPLATE_MATCHING_THRESHOLD
-                        and ed_score <= EDIT_DISTANCE_THRESHOLD
-                    )
-                ):
-                    if self.lang == "en":
-                        pokemon_select_order_score.append((k, i, score))
-                    elif self.lang == "ja":
-                        pokemon_select_order_score.append((k, i, 1 - ed_score))
-                    else:
-                        raise ValueError("lang must be en or ja")
-
-        pokemon_select_order: List[int] = []
-        for i in range(3):
-            sorted_orders = sorted(
-                [score for score in pokemon_select_order_score if score[1] == i],
-                key=lambda x: x[2],  # type: ignore
-                reverse=True,
+        )
+        pokemon_select_order = decisive_select_order(template_scores)
+        if pokemon_select_order is not None:
+            return pokemon_select_order
+
+        if self.lang == "ja":
+            _lang, psm = "jpn", 8  # 8: 1単語のみある想定
+        elif self.lang == "en":
+            _lang, psm = "eng", 6
+        else:
+            raise ValueError("lang must be en or ja")
+        threshold_value = POKEMON_SELECT_WINDOW_THRESHOLD_VALUE
+        max_value = 255
+        binary_windows = [
+            cv2.threshold(window, threshold_value, max_value, cv2.THRESH_BINARY)[1]
+            for window in select_windows
+        ]
+        if self.tiled_ocr:
+            # 6つのウィンドウを並べて1回で OCR する(行ごとに分けるので psm は 6)
+            texts = self.ocr_engine_pool.tiled_image_to_string(binary_windows, _lang, 6)
+        else:
+            texts = self.ocr_engine_pool.map_image_to_string(
+                [(window, _lang, psm) for window in binary_windows]
             )
-            for order in sorted_orders:
-                if order[0] not in pokemon_select_order:
-                    pokemon_select_order.append(order[0])
-                    break
-        return pokemon_select_order
+        recognized_order_strs = [
+            re.sub(r"[^\w]", "", _recognized_order_str)
+            for _recognized_order_str in texts
+        ]
+        return solve_select_order(
+            template_scores,
+            recognized_order_strs,
+            self.order_str,
+            self.lang,
+            EDIT_DISTANCE_THRESHOLD,
+        )
 
     def _search_win_or_lost_by_template_matching(self, frame: np.ndarray) -> str:
         """
@@ -311,13 +348,13 @@ class Extractor:
             your_pokemon_name,
             is_exist_unknown_pokemon1,
         ) = self.pokemon_name_window_extractor.extract_pokemon_name_in_battle(
-            your_pokemon_name_window
+            your_pokemon_name_window, side="your"
         )
         (
             opponent_pokemon_name,
             is_exist_unknown_pokemon2,
         ) = self.pokemon_name_window_extractor.extract_pokemon_name_in_battle(
-            opponent_pokemon_name_window
+            opponent_pokemon_name_window, side="opponent"
         )
 
         if is_exist_unknown_pokemon1 or is_exist_unknown_pokemon2:
@@ -334,27 +371,34 @@ class Extractor:
         return result
 
     def _detect_rank_number(self, image: np.ndarray) -> int:
-        """Detects text in the file."""
+        """
+        数字のテンプレートで順位を読み、読めなければ OCR する
+
+        OCR で読めた順位は、数字のテンプレートを作るのに使う(RankDigitRecognizer.learn)
+        """
+        rank = self.rank_digit_recognizer.recognize(image)
+        if rank is not None:
+            self.rank_digit_template_count += 1
+            return rank
+        self.rank_ocr_fallback_count += 1
+
         if self.lang == "en":
             _lang = "eng"
         elif self.lang == "ja":
             _lang = "jpn"
         else:
             raise ValueError("lang must be en or ja")
-        text = cast(
-            str, pytesseract.image_to_string(image, lang=_lang, config="--psm 6")
-        )
+        text = self.ocr_engine_pool.image_to_string(image, lang=_lang, psm=6)
 
         # 数字部分だけを取り出す
         _rank_text = text.split("No. ")[-1]
         _rank = int(re.sub(r"\D", "", _rank_text))
+        self.rank_digit_recognizer.learn(image, _rank)
         return _rank
 
     def _recognize_message(self, image: np.ndarray) -> str:
         """Detects text in the file."""
-        text = cast(
-            str, pytesseract.image_to_string(image, lang="eng+jpn", config="--psm 6")
-        )
+        text = self.ocr_engine_pool.image_to_string(image, lang="eng+jpn", psm=6)
 
         return text.replace("\n", "")
 
@@ -384,9 +428,59 @@ class Extractor:
         )
         return fixed_battle_message.fixed_battle_message.strip()
 
+    def _fix_message_request(self, request: BattleMessageRequest) -> str:
+        return self._fix_message(
+            request.message,
+            list(request.context.pre_battle_your_teams),
+            list(request.context.pre_battle_your_teams_english),
+            list(request.context.pre_battle_opponent_teams),
+            request.your_current_pokemon_name,
+            request.opponent_current_pokemon_name,
+        )
+
+    def fix_message(self, request: BattleMessageRequest) -> str:
+        """
+        メッセージを1つ修正する(文法で修正できるメッセージと、キャッシュにある修正済みの
+        メッセージは API に送らない)
+        """
+        if not request.message:
+            return ""
+        if self.local_message_fixer is not None:
+            local_message = self.local_message_fixer.fix(request)
+            if local_message is not None:
+                return local_message
+        if self.message_correction_cache is None:
+            return self._fix_message_request(request)
+        fixed_message = self.message_correction_cache.get(request)
+        if fixed_message is None:
+            fixed_message = self._fix_message_request(request)
+            self.message_correction_cache.put(request, fixed_message)
+        return fixed_message
+
+    def fix_messages(self, requests: Sequence[BattleMessageRequest]) -> Dict[int, str]:
+        """
+        メッセージを対戦ごとにまとめて修正し、frame_number ごとの修正後のメッセージを返す
+        """
+        return self.message_corrector.correct(requests)
+
+    def create_message_correction_stage(
+        self, batch: bool, max_concurrency: int, requests_per_second: float
+    ) -> AsyncMessageCorrectionStage:
+        """
+        メッセージの修正を並行に行うステージを作る(batch の場合は対戦ごとにまとめて修正する)
+        """
+        return AsyncMessageCorrectionStage(
+            self.openai_handler.afix_battle_message,
+            self.openai_handler.afix_battle_messages if batch else None,
+            max_concurrency=max_concurrency,
+            requests_per_second=requests_per_second,
+            cache=self.message_correction_cache,
+            local_fixer=self.local_message_fixer,
+        )
+
     def extract_first_rank_number(self, frame: np.ndarray) -> int:
         """
-        (開始時の)ランクをOCRで抽出する
+        (開始時の)ランクを数字のテンプレートまたはOCRで抽出する
         """
 
         rank_frame_window = frame[
@@ -394,7 +488,7 @@ class Extractor:
             FIRST_RANKING_NUMBER_WINDOW[2] : FIRST_RANKING_NUMBER_WINDOW[3],
         ]
         gray = cv2.cvtColor(rank_frame_window, cv2.COLOR_BGR2GRAY)
-        threshold_value = 160
+        threshold_value = RANKING_NUMBER_THRESHOLD_VALUE
         max_value = 255
         _, thresh = cv2.threshold(gray, threshold_value, max_value, cv2.THRESH_BINARY)
         rank_number = self._detect_rank_number(thresh)
@@ -402,7 +496,7 @@ class Extractor:
 
     def extract_rank_number(self, frame: np.ndarray) -> int:
         """
-        ランクをOCRで抽出する
+        ランクを数字のテンプレートまたはOCRで抽出する
         """
 
         rank_frame_window = frame[
@@ -410,7 +504,7 @@ class Extractor:
             RANKING_NUMBER_WINDOW[2] : RANKING_NUMBER_WINDOW[3],
         ]
         gray = cv2.cvtColor(rank_frame_window, cv2.COLOR_BGR2GRAY)
-        threshold_value = 160
+        threshold_value = RANKING_NUMBER_THRESHOLD_VALUE
         max_value = 255
         _, thresh = cv2.threshold(gray, threshold_value, max_value, cv2.THRESH_BINARY)
         rank_number = self._detect_rank_number(thresh)
@@ -426,7 +520,30 @@ class Extractor:
         opponent_current_pokemon_name: str,
     ) -> Optional[str]:
         """
-        メッセージをOCRで認識する
+        メッセージをOCRで認識し、OpenAI API で修正する
+        """
+        message = self.recognize_message(frame)
+        if message is None:
+            return None
+        # fix message by openai
+        return self.fix_message(
+            BattleMessageRequest(
+                # フレーム番号は修正にもキャッシュのキーにも使わない
+                frame_number=0,
+                message=message,
+                your_current_pokemon_name=your_current_pokemon_name,
+                opponent_current_pokemon_name=opponent_current_pokemon_name,
+                context=BattleMessageContext(
+                    tuple(pre_battle_your_teams),
+                    tuple(pre_battle_your_teams_english),
+                    tuple(pre_battle_opponent_teams),
+                ),
+            )
+        )
+
+    def recognize_message(self, frame: np.ndarray) -> Optional[str]:
+        """
+        メッセージをOCRで認識する(メッセージウィンドウでなければ None)
         """
 
         message_frame_window = frame[
@@ -442,17 +559,7 @@ class Extractor:
         if white_pixels > 10000:
             return None
 
-        message = self._recognize_message(thresh)
-        # fix message by openai
-        message = self._fix_message(
-            message,
-            pre_battle_your_teams,
-            pre_battle_your_teams_english,
-            pre_battle_opponent_teams,
-            your_current_pokemon_name,
-            opponent_current_pokemon_name,
-        )
-        return message
+        return self._recognize_message(thresh)
 
     def extract_move(self, frame: np.ndarray) -> dict[str, str]:
         """
@@ -524,7 +631,7 @@ class Extractor:
 
         gray = cv2.cvtColor(max_brightness_move_title_window, cv2.COLOR_BGR2GRAY)
         move = self._recognize_message(gray)
-        move = move.replace('|', '').strip()
+        move = move.replace("|", "").strip()
 
         (
             your_pokemon_name,
@@ -0,0 +1,277 @@
+import os
+import subprocess
+from io import BufferedReader
+from typing import List, Optional, Sequence, Tuple, cast
+
+import cv2
+import numpy as np
+
+from poke_battle_logger.batch.frame_detector import Window
+
+FRAME_SOURCES = ["opencv", "ffmpeg"]
+
+
+def align_window(window: Window, height: int, width: int) -> Window:
+    """
+    yuv420p のクロマの位置に合わせて、ウィンドウを偶数の座標まで広げる
+    (奇数の位置で crop すると ffmpeg が位置を丸めて、切り出す画素がずれる)
+    """
+    top, bottom, left, right = window
+    return (
+        top - top % 2,
+        min(height, bottom + bottom % 2),
+        left - left % 2,
+        min(width, right + right % 2),
+    )
+
+
+def build_tile_layout(
+    windows: Sequence[Window], height: int, width: int
+) -> Tuple[List[Tuple[Window, int]], Tuple[int, int]]:
+    """
+    ウィンドウ(重複は除く)を縦に並べたときの (ウィンドウ, 開始行) と、キャンバスの (高さ, 幅)
+
+    幅を揃えた分だけ画素が増えるので、全てのウィンドウを囲む領域の方が小さい場合は
+    その領域1つを切り出す
+    """
+    aligned_windows = sorted(
+        {align_window(window, height, width) for window in windows}
+    )
+    canvas_width = max(window[3] - window[2] for window in aligned_windows)
+    canvas_height = sum(window[1] - window[0] for window in aligned_windows)
+    bounding_window = (
+        min(window[0] for window in aligned_windows),
+        max(window[1] for window in aligned_windows),
+        min(window[2] for window in aligned_windows),
+        max(window[3] for window in aligned_windows),
+    )
+    bounding_height = bounding_window[1] - bounding_window[0]
+    bounding_width = bounding_window[3] - bounding_window[2]
+    if bounding_height * bounding_width <= canvas_height * canvas_width:
+        return [(bounding_window, 0)], (bounding_height, bounding_width)
+
+    layout = []
+    row = 0
+    for window in aligned_windows:
+        layout.append((window, row))
+        row += window[1] - window[0]
+    return layout, (canvas_height, canvas_width)
+
+
+def _contains(outer: Window, inner: Window) -> bool:
+    return (
+        outer[0] <= inner[0]
+        and inner[1] <= outer[1]
+        and outer[2] <= inner[2]
+        and inner[3] <= outer[3]
+    )
+
+
+def build_filter_graph(
+    layout: List[Tuple[Window, int]],
+    canvas_width: int,
+    pix_fmt: str,
+    input_label: str = "0:v",
+    output_label: str = "out",
+) -> str:
+    """
+    各ウィンドウを crop し、幅を揃えて縦に並べる filter_complex を作る
+
+    input_label の映像から output_label の映像を作る(途中のラベルは output_label から作る)
+    """
+    crops = [
+        f"crop={right - left}:{bottom - top}:{left}:{top},"
+        f"pad={canvas_width}:{bottom - top}:0:0"
+        for (top, bottom, left, right), _ in layout
+    ]
+    if len(crops) == 1:
+        return f"[{input_label}]{crops[0]},format={pix_fmt}[{output_label}]"
+    prefix = f"{output_label}_"
+    split = f"[{input_label}]split={len(crops)}" + "".join(
+        f"[{prefix}s{k}]" for k in range(len(crops))
+    )
+    tiles = [f"[{prefix}s{k}]{crop}[{prefix}c{k}]" for k, crop in enumerate(crops)]
+    stack = (
+        "".join(f"[{prefix}c{k}]" for k in range(len(crops)))
+        + f"vstack=inputs={len(crops)},format={pix_fmt}[{output_label}]"
+    )
+    return ";".join([split] + tiles + [stack])
+
+
+class WindowFrame:
+    """
+    FFmpegFrameSource が返すフレーム
+
+    切り出したウィンドウを縦に並べた配列(canvas)をそのまま持ち、frame[top:bottom, left:right]
+    (元のフレームの座標)で、そのウィンドウを含む切り出し部分のビューを返す。
+    canvas が複数ある場合(グレースケールと BGR)は先の canvas から探す。
+    切り出したウィンドウのどれにも含まれない領域を参照すると IndexError になる
+    """
+
+    def __init__(
+        self,
+        canvases: Sequence[Tuple[np.ndarray, List[Tuple[Window, int]]]],
+        shape: Tuple[int, ...],
+    ) -> None:
+        self.canvases = canvases
+        self.shape = shape
+        self.dtype = canvases[0][0].dtype
+
+    def __getitem__(self, key: Tuple[slice, slice]) -> np.ndarray:
+        rows, columns = key
+        top = rows.start or 0
+        bottom = self.shape[0] if rows.stop is None else rows.stop
+        left = columns.start or 0
+        right = self.shape[1] if columns.stop is None else columns.stop
+        for canvas, layout in self.canvases:
+            for window, row in layout:
+                if _contains(window, (top, bottom, left, right)):
+                    return canvas[
+                        row + top - window[0] : row + bottom - window[0],
+                        left - window[2] : right - window[2],
+                    ]
+        raise IndexError(f"{(top, bottom, left, right)} is not a decoded window")
+
+    def copy(self) -> "WindowFrame":
+        return WindowFrame(
+            [(canvas.copy(), layout) for canvas, layout in self.canvases], self.shape
+        )
+
+
+class FFmpegFrameSource:
+    """
+    ffmpeg のサブプロセスで必要なウィンドウだけを切り出してデコードするフレームソース
+
+    ffmpeg 側で windows を crop して縦に並べた rawvideo をパイプで読み、WindowFrame として返す
+    (フレーム全体の配列には書き戻さない)。cv2.VideoCapture と同じく read() で (ret, frame) を
+    返すが、frame は毎回同じバッファを使うので、保持する場合はコピーすること
+
+    検出器しか使わない windows はグレースケールで(パイプの転送量が BGR の 1/3 になる)、
+    色が必要な color_windows(抽出に使う ROI)は BGR で、別のパイプからそれぞれ読む
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        windows: Sequence[Window],
+        start_frame: int = 0,
+        color_windows: Sequence[Window] = (),
+    ) -> None:
+        """
+        windows: グレースケールでデコードするウィンドウ(color_windows に含まれるものは除く)
+        color_windows: BGR でデコードするウィンドウ
+        """
+        video = cv2.VideoCapture(video_path)
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        fps = video.get(cv2.CAP_PROP_FPS)
+        video.release()
+
+        # (ラベル, pix_fmt, レイアウト, canvas)
+        outputs: List[Tuple[str, str, List[Tuple[Window, int]], np.ndarray]] = []
+        color_layout: List[Tuple[Window, int]] = []
+        if color_windows:
+            color_layout, (canvas_height, canvas_width) = build_tile_layout(
+                color_windows, height, width
+            )
+            outputs.append(
+                (
+                    "color",
+                    "bgr24",
+                    color_layout,
+                    np.empty((canvas_height, canvas_width, 3), np.uint8),
+                )
+            )
+        gray_windows = [
+            window
+            for window in windows
+            if not any(
+                _contains(color_window, align_window(window, height, width))
+                for color_window, _ in color_layout
+            )
+        ]
+        if gray_windows:
+            gray_layout, (canvas_height, canvas_width) = build_tile_layout(
+                gray_windows, height, width
+            )
+            outputs.append(
+                (
+                    "gray",
+                    "gray",
+                    gray_layout,
+                    np.empty((canvas_height, canvas_width), np.uint8),
+                )
+            )
+        self._frame = WindowFrame(
+            [(canvas, layout) for _, _, layout, canvas in outputs],
+            (height, width, 3),
+        )
+        self._canvas_bytes = [canvas.reshape(-1).data for _, _, _, canvas in outputs]
+
+        graphs = [
+            build_filter_graph(
+                layout,
+                canvas.shape[1],
+                pix_fmt,
+                input_label=f"{label}_in" if len(outputs) > 1 else "0:v",
+                output_label=label,
+            )
+            for label, pix_fmt, layout, canvas in outputs
+        ]
+        if len(outputs) > 1:
+            graphs.insert(
+                0,
+                f"[0:v]split={len(outputs)}"
+                + "".join(f"[{label}_in]" for label, _, _, _ in outputs),
+            )
+
+        # 1つ目の出力は stdout、2つ目の出力は別のパイプに書く
+        pipe_fds = [os.pipe() for _ in outputs[1:]]
+        targets = ["-"] + [f"pipe:{write_fd}" for _, write_fd in pipe_fds]
+        command = ["ffmpeg", "-v", "error", "-nostdin"]
+        if start_frame > 0 and fps > 0:
+            command += ["-ss", f"{start_frame / fps:.6f}"]
+        command += ["-i", video_path, "-filter_complex", ";".join(graphs)]
+        for (label, pix_fmt, _, _), target in zip(outputs, targets):
+            command += [
+                "-map",
+                f"[{label}]",
+                # フレームの複製・間引きをしない(cv2.VideoCapture とフレーム番号を揃える)
+                "-fps_mode",
+                "passthrough",
+                "-f",
+                "rawvideo",
+                "-pix_fmt",
+                pix_fmt,
+                target,
+            ]
+        self.process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            bufsize=len(self._canvas_bytes[0]),
+            pass_fds=[write_fd for _, write_fd in pipe_fds],
+        )
+        self._streams = [cast(BufferedReader, self.process.stdout)]
+        for (read_fd, write_fd), canvas_bytes in zip(pipe_fds, self._canvas_bytes[1:]):
+            os.close(write_fd)
+            self._streams.append(
+                cast(BufferedReader, os.fdopen(read_fd, "rb", len(canvas_bytes)))
+            )
+
+    def read(self) -> Tuple[bool, Optional[WindowFrame]]:
+        # ffmpeg は各出力にフレーム順に書くので、出力の順に1フレーム分ずつ読む
+        for stream, canvas_bytes in zip(self._streams, self._canvas_bytes):
+            filled = 0
+            while filled < len(canvas_bytes):
+                size = stream.readinto(canvas_bytes[filled:])
+                if not size:
+                    return False, None
+                filled += size
+        return True, self._frame
+
+    def release(self) -> None:
+        for stream in self._streams:
+            stream.close()
+        if self.process.poll() is None:
+            self.process.kill()
+        self.process.wait()
@@ -0,0 +1,70 @@
+from typing import List, Optional
+
+import cv2
+import numpy as np
+from config.config import FRAME_CHANGE_MAX_REUSE_FRAMES, FRAME_CHANGE_THRESHOLD
+
+from poke_battle_logger.batch.batch_template_matcher import to_gray
+from poke_battle_logger.batch.frame_detector import DETECTOR_WINDOWS, Window
+
+# 比較用にウィンドウを縮小する倍率(圧縮ノイズを均す)
+SIGNATURE_SCALE = 4
+
+
+class FrameChangeDetector:
+    """
+    検出器のウィンドウごとに、前回判定したフレームから画素が変化したかを判定するクラス
+
+    ウィンドウを縮小したグレースケール画像を持ち、平均絶対差が threshold を超えた
+    ウィンドウが1つでもあれば変化ありとする。比較対象は直前のフレームではなく
+    最後に判定したフレームなので、少しずつの変化が積み重なった場合も検出できる
+    """
+
+    def __init__(
+        self,
+        threshold: float = FRAME_CHANGE_THRESHOLD,
+        max_reuse_frames: int = FRAME_CHANGE_MAX_REUSE_FRAMES,
+        windows: List[Window] = DETECTOR_WINDOWS,
+    ) -> None:
+        self.threshold = threshold
+        self.max_reuse_frames = max_reuse_frames
+        self.windows = windows
+        self.checked_frames = 0
+        self.reused_frames = 0
+        self._signatures: Optional[List[np.ndarray]] = None
+        self._reuse_count = 0
+
+    def _signature(self, frame: np.ndarray) -> List[np.ndarray]:
+        signatures = []
+        for window in self.windows:
+            gray = to_gray(
+                frame[window[0] : window[1], window[2] : window[3]], cv2.COLOR_BGR2GRAY
+            )
+            size = (
+                max(1, gray.shape[1] // SIGNATURE_SCALE),
+                max(1, gray.shape[0] // SIGNATURE_SCALE),
+            )
+            small = cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+            signatures.append(small.astype(np.int16))
+        return signatures
+
+    def is_changed(self, frame: np.ndarray) -> bool:
+        """
+        変化なし(前回の判定結果を使い回せる)の場合は False を返す
+        """
+        self.checked_frames += 1
+        signatures = self._signature(frame)
+        if (
+            self._signatures is not None
+            and self._reuse_count < self.max_reuse_frames
+            and all(
+                np.abs(signature - previous).mean() <= self.threshold
+                for signature, previous in zip(signatures, self._signatures)
+            )
+        ):
+            self._reuse_count += 1
+            self.reused_frames += 1
+            return False
+        self._signatures = signatures
+        self._reuse_count = 0
+        return True
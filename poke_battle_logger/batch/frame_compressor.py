@@ -1,6 +1,7 @@
 from typing import List
 
 FRAME_SEQUENCE_THRESHOLD = 100
+MESSAGE_FRAME_SEQUENCE_THRESHOLD = 3
 
 
 def frame_compress(
@@ -31,7 +32,7 @@ def frame_compress(
 
 
 def message_frame_compress(
-    target_frames: List[int], frame_threshold: int = 3
+    target_frames: List[int], frame_threshold: int = MESSAGE_FRAME_SEQUENCE_THRESHOLD
 ) -> List[List[int]]:
     # フレームを連続区間で分割する
     message_frame_results = []
@@ -1,4 +1,5 @@
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Collection, Dict, List, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
@@ -34,10 +35,158 @@ from config.config import (
     WIN_TEMPLATE_PATH,
 )
 
+from poke_battle_logger.batch.batch_template_matcher import (
+    BatchTemplateMatcher,
+    batch_to_gray,
+    to_gray,
+)
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+
+Window = Tuple[int, int, int, int]
+
+SCENE_NONE = "none"
+SCENE_MESSAGE_WINDOW = "message_window"
+SCENE_LEVEL_50 = "level_50"
+SCENE_MOVE = "move"  # level_50 かつ技選択
+SCENE_FIRST_RANKING = "first_ranking"
+SCENE_SELECT_DONE = "select_done"
+SCENE_STANDING_BY = "standing_by"
+SCENE_RANKING = "ranking"
+SCENE_WIN_OR_LOST = "win_or_lost"
+SCENE_POKEMON_SELECTION = "pokemon_selection"
+
+
+def _union_window(*windows: Window) -> Window:
+    return (
+        min(window[0] for window in windows),
+        max(window[1] for window in windows),
+        min(window[2] for window in windows),
+        max(window[3] for window in windows),
+    )
+
+
+# 重なっているウィンドウは、それらを囲む領域をまとめてグレースケール変換する
+SHARED_GRAY_REGIONS: Dict[Window, Window] = {
+    STANDING_BY_WINDOW: _union_window(STANDING_BY_WINDOW, POKEMON_SELECT_DONE_WINDOW),
+    POKEMON_SELECT_DONE_WINDOW: _union_window(
+        STANDING_BY_WINDOW, POKEMON_SELECT_DONE_WINDOW
+    ),
+}
+
+
+# setup_templates の各テンプレートを探すウィンドウ
+TEMPLATE_WINDOWS: List[List[Window]] = [
+    [STANDING_BY_WINDOW],
+    [LEVEL_50_WINDOW],
+    [RANKING_WINDOW, FIRST_RANKING_WINDOW],
+    [WIN_LOST_WINDOW],
+    [WIN_LOST_WINDOW],
+    [POKEMON_SELECT_DONE_WINDOW],
+    [MOVE_ANKER_POSITION],
+    [POKEMON_SELECTION_ICON],
+]
+
+LEVEL_50_MIN_WHITE_PIXELS = 100
+
+# classify が参照するウィンドウ
+DETECTOR_WINDOWS: List[Window] = [
+    POKEMON_MESSAGE_WINDOW,
+    LEVEL_50_WINDOW,
+    MOVE_ANKER_POSITION,
+    FIRST_RANKING_WINDOW,
+    POKEMON_SELECT_DONE_WINDOW,
+    STANDING_BY_WINDOW,
+    RANKING_WINDOW,
+    WIN_LOST_WINDOW,
+]
+
+
+class GrayWindows:
+    """
+    1フレーム分のグレースケール変換済みの領域を保持し、ウィンドウの切り出しを共有する
+    """
+
+    def __init__(
+        self, frame: np.ndarray, geometry: FrameGeometry = FrameGeometry()
+    ) -> None:
+        self.frame = frame
+        self.geometry = geometry
+        self._gray_regions: Dict[Tuple[Window, int], np.ndarray] = {}
+
+    def get(self, window: Window, code: int) -> np.ndarray:
+        # window は BASE_FRAME_SIZE の座標で渡し、動画の解像度の座標に変換して切り出す
+        region = self.geometry.window(SHARED_GRAY_REGIONS.get(window, window))
+        window = self.geometry.window(window)
+        key = (region, code)
+        if key not in self._gray_regions:
+            self._gray_regions[key] = to_gray(
+                self.frame[region[0] : region[1], region[2] : region[3]], code
+            )
+        return self._gray_regions[key][
+            window[0] - region[0] : window[1] - region[0],
+            window[2] - region[2] : window[3] - region[2],
+        ]
+
+
+class BatchGrayWindows:
+    """
+    複数フレーム分のグレースケール変換済みの領域を (K, h, w) の配列で保持する
+
+    get には判定対象のフレームの番号(frames の添字)を渡す。判定が進むと対象は
+    絞られていくので、一度変換した領域はその部分集合の取り出しにも使う
+    """
+
+    def __init__(
+        self, frames: Sequence[np.ndarray], geometry: FrameGeometry = FrameGeometry()
+    ) -> None:
+        self.frames = frames
+        self.geometry = geometry
+        self._gray_regions: Dict[
+            Tuple[Window, int], Tuple[Dict[int, int], np.ndarray]
+        ] = {}
+
+    def get(self, window: Window, code: int, indices: np.ndarray) -> np.ndarray:
+        region = self.geometry.window(SHARED_GRAY_REGIONS.get(window, window))
+        window = self.geometry.window(window)
+        key = (region, code)
+        cached = self._gray_regions.get(key)
+        if cached is None or any(k not in cached[0] for k in indices):
+            crops = np.stack(
+                [
+                    self.frames[k][region[0] : region[1], region[2] : region[3]]
+                    for k in indices
+                ]
+            )
+            cached = (
+                {int(k): position for position, k in enumerate(indices)},
+                batch_to_gray(crops, code),
+            )
+            self._gray_regions[key] = cached
+        positions, gray_regions = cached
+        return gray_regions[
+            [positions[int(k)] for k in indices],
+            window[0] - region[0] : window[1] - region[0],
+            window[2] - region[2] : window[3] - region[2],
+        ]
+
+
+@dataclass
+class SceneClassification:
+    label: str
+    scores: Dict[str, float] = field(default_factory=dict)
+    detected: List[str] = field(default_factory=list)
+
 
 class FrameDetector:
-    def __init__(self, lang: str = "en") -> None:
+    def __init__(
+        self, lang: str = "en", geometry: Optional[FrameGeometry] = None
+    ) -> None:
+        """
+        geometry: 動画の解像度(None の場合は BASE_FRAME_SIZE)。ウィンドウ、テンプレート、
+            画素数の閾値をその解像度に合わせる
+        """
         self.lang = lang
+        self.geometry = geometry or FrameGeometry()
         (
             self.gray_standing_by_template,
             self.gray_level_50_template,
@@ -47,7 +196,32 @@ class FrameDetector:
             self.gray_done_template,
             self.gray_move_anker_template,
             self.gray_pokemon_selection_template,
-        ) = self.setup_templates()
+        ) = [
+            self.geometry.template(template, *windows)
+            for template, windows in zip(self.setup_templates(), TEMPLATE_WINDOWS)
+        ]
+        self.message_window_min_white_pixels = self.geometry.pixel_count(
+            POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS
+        )
+        self.message_window_max_white_pixels = self.geometry.pixel_count(
+            POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS
+        )
+        self.level_50_min_white_pixels = self.geometry.pixel_count(
+            LEVEL_50_MIN_WHITE_PIXELS
+        )
+        # classify で評価した検出器の数(テンプレートマッチング / MSER の呼び出し回数の目安)
+        self.evaluation_count = 0
+        self.batch_matchers = {
+            "standing_by": BatchTemplateMatcher(self.gray_standing_by_template),
+            "level_50": BatchTemplateMatcher(self.gray_level_50_template),
+            "ranking": BatchTemplateMatcher(self.gray_ranking_template),
+            "win": BatchTemplateMatcher(self.gray_win_template),
+            "lost": BatchTemplateMatcher(self.gray_lost_template),
+            "select_done": BatchTemplateMatcher(self.gray_done_template),
+            "move": BatchTemplateMatcher(self.gray_move_anker_template),
+        }
+        # メッセージウィンドウの文字領域の検出用(フレームごとに作らない)
+        self.mser = cv2.MSER.create()
 
     def setup_templates(
         self,
@@ -103,150 +277,278 @@ class FrameDetector:
             gray_pokemon_selection_template,
         )
 
-    def is_standing_by_frame(self, frame: np.ndarray) -> bool:
-        gray_standing_by_area = cv2.cvtColor(
-            frame[
-                STANDING_BY_WINDOW[0] : STANDING_BY_WINDOW[1],
-                STANDING_BY_WINDOW[2] : STANDING_BY_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
-        )
-        result = cv2.matchTemplate(
-            gray_standing_by_area, self.gray_standing_by_template, cv2.TM_CCOEFF_NORMED
-        )
-        _result = cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
-        return bool(_result)
+    def _match_score(self, gray_area: np.ndarray, template: np.ndarray) -> float:
+        result = cv2.matchTemplate(gray_area, template, cv2.TM_CCOEFF_NORMED)
+        return float(cv2.minMaxLoc(result)[1])
 
-    def is_level_50_frame(self, frame: np.ndarray) -> bool:
-        gray_level_50_area = cv2.cvtColor(
-            frame[
-                LEVEL_50_WINDOW[0] : LEVEL_50_WINDOW[1],
-                LEVEL_50_WINDOW[2] : LEVEL_50_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
-        )
-        result = cv2.matchTemplate(
-            gray_level_50_area, self.gray_level_50_template, cv2.TM_CCOEFF_NORMED
-        )
+    def _detect_standing_by(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_standing_by_area = gray_windows.get(STANDING_BY_WINDOW, cv2.COLOR_RGB2GRAY)
+        score = self._match_score(gray_standing_by_area, self.gray_standing_by_template)
+        scores["standing_by"] = score
+        return score >= TEMPLATE_MATCHING_THRESHOLD
+
+    def _detect_level_50(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_level_50_area = gray_windows.get(LEVEL_50_WINDOW, cv2.COLOR_RGB2GRAY)
+        score = self._match_score(gray_level_50_area, self.gray_level_50_template)
         _, thresh = cv2.threshold(gray_level_50_area, 200, 255, cv2.THRESH_BINARY)
-        _res = (
-            cv2.countNonZero(thresh) > 100
-            and cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
+        white_pixels = cv2.countNonZero(thresh)
+        scores["level_50"] = score
+        scores["level_50_white_pixels"] = float(white_pixels)
+        return (
+            white_pixels > self.level_50_min_white_pixels
+            and score >= TEMPLATE_MATCHING_THRESHOLD
         )
-        return bool(_res)
 
-    def is_first_ranking_frame(self, frame: np.ndarray) -> bool:
-        gray_ranking_area = cv2.cvtColor(
-            frame[
-                FIRST_RANKING_WINDOW[0] : FIRST_RANKING_WINDOW[1],
-                FIRST_RANKING_WINDOW[2] : FIRST_RANKING_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
-        )
-        result = cv2.matchTemplate(
-            gray_ranking_area, self.gray_ranking_template, cv2.TM_CCOEFF_NORMED
-        )
-        _result = cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
-        return bool(_result)
+    def _detect_first_ranking(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_ranking_area = gray_windows.get(FIRST_RANKING_WINDOW, cv2.COLOR_RGB2GRAY)
+        score = self._match_score(gray_ranking_area, self.gray_ranking_template)
+        scores["first_ranking"] = score
+        return score >= TEMPLATE_MATCHING_THRESHOLD
 
-    def is_ranking_frame(self, frame: np.ndarray) -> bool:
-        gray_ranking_area = cv2.cvtColor(
-            frame[
-                RANKING_WINDOW[0] : RANKING_WINDOW[1],
-                RANKING_WINDOW[2] : RANKING_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
-        )
-        result = cv2.matchTemplate(
-            gray_ranking_area, self.gray_ranking_template, cv2.TM_CCOEFF_NORMED
-        )
-        _result = cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
-        return bool(_result)
+    def _detect_ranking(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_ranking_area = gray_windows.get(RANKING_WINDOW, cv2.COLOR_RGB2GRAY)
+        score = self._match_score(gray_ranking_area, self.gray_ranking_template)
+        scores["ranking"] = score
+        return score >= TEMPLATE_MATCHING_THRESHOLD
 
-    def is_win_or_lost_frame(self, frame: np.ndarray) -> bool:
-        gray_win_lost_area = cv2.cvtColor(
-            frame[
-                WIN_LOST_WINDOW[0] : WIN_LOST_WINDOW[1],
-                WIN_LOST_WINDOW[2] : WIN_LOST_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
-        )
-        result_win = cv2.matchTemplate(
-            gray_win_lost_area, self.gray_win_template, cv2.TM_CCOEFF_NORMED
-        )
-        result_lost = cv2.matchTemplate(
-            gray_win_lost_area, self.gray_lost_template, cv2.TM_CCOEFF_NORMED
-        )
-        _result = (
-            cv2.minMaxLoc(result_win)[1] >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD
-            or cv2.minMaxLoc(result_lost)[1] >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD
+    def _detect_win_or_lost(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_win_lost_area = gray_windows.get(WIN_LOST_WINDOW, cv2.COLOR_RGB2GRAY)
+        win_score = self._match_score(gray_win_lost_area, self.gray_win_template)
+        lost_score = self._match_score(gray_win_lost_area, self.gray_lost_template)
+        scores["win"] = win_score
+        scores["lost"] = lost_score
+        return (
+            win_score >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD
+            or lost_score >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD
         )
-        return bool(_result)
 
-    def is_select_done_frame(self, frame: np.ndarray) -> bool:
-        gray_select_done_area = cv2.cvtColor(
-            frame[
-                POKEMON_SELECT_DONE_WINDOW[0] : POKEMON_SELECT_DONE_WINDOW[1],
-                POKEMON_SELECT_DONE_WINDOW[2] : POKEMON_SELECT_DONE_WINDOW[3],
-            ],
-            cv2.COLOR_RGB2GRAY,
+    def _detect_select_done(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_select_done_area = gray_windows.get(
+            POKEMON_SELECT_DONE_WINDOW, cv2.COLOR_RGB2GRAY
         )
-        result = cv2.matchTemplate(
-            gray_select_done_area, self.gray_done_template, cv2.TM_CCOEFF_NORMED
-        )
-        _result = cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
-        return bool(_result)
+        score = self._match_score(gray_select_done_area, self.gray_done_template)
+        scores["select_done"] = score
+        return score >= TEMPLATE_MATCHING_THRESHOLD
 
-    def is_message_window_frame(self, frame: np.ndarray) -> bool:
-        gray = cv2.cvtColor(
-            frame[
-                POKEMON_MESSAGE_WINDOW[0] : POKEMON_MESSAGE_WINDOW[1],
-                POKEMON_MESSAGE_WINDOW[2] : POKEMON_MESSAGE_WINDOW[3],
-            ],
-            cv2.COLOR_BGR2GRAY,
-        )
+    def _detect_message_window(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray = gray_windows.get(POKEMON_MESSAGE_WINDOW, cv2.COLOR_BGR2GRAY)
         max_value = 255
         _, thresh = cv2.threshold(
             gray, POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE, max_value, cv2.THRESH_BINARY
         )
         white_pixels = cv2.countNonZero(thresh)
-        is_message = (
-            white_pixels > POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS
-            and white_pixels < POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS
-        )
+        scores["message_window_white_pixels"] = float(white_pixels)
+        # MSER が最も重いので、白画素数の条件を満たすフレームだけ MSER にかける
+        if not (
+            white_pixels > self.message_window_min_white_pixels
+            and white_pixels < self.message_window_max_white_pixels
+        ):
+            return False
 
-        mser = cv2.MSER.create()
-        regions, _ = mser.detectRegions(thresh)
-        is_exist_text = len(regions) >= 2
-        _result = is_message & is_exist_text
-        return bool(_result)
+        regions, _ = self.mser.detectRegions(thresh)
+        scores["message_window_regions"] = float(len(regions))
+        return len(regions) >= 2
 
-    def is_move_frame(self, frame: np.ndarray) -> bool:
-        gray_move_anker_area = cv2.cvtColor(
-            frame[
-                MOVE_ANKER_POSITION[0] : MOVE_ANKER_POSITION[1],
-                MOVE_ANKER_POSITION[2] : MOVE_ANKER_POSITION[3],
-            ],
-            cv2.COLOR_BGR2GRAY,
+    def _detect_move(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_move_anker_area = gray_windows.get(MOVE_ANKER_POSITION, cv2.COLOR_BGR2GRAY)
+        score = self._match_score(gray_move_anker_area, self.gray_move_anker_template)
+        scores["move"] = score
+        return score >= MOVE_ANKER_THRESHOLD
+
+    def _detect_pokemon_selection(
+        self, gray_windows: "GrayWindows", scores: Dict[str, float]
+    ) -> bool:
+        gray_pokemon_selection_area = gray_windows.get(
+            POKEMON_SELECTION_ICON, cv2.COLOR_BGR2GRAY
         )
-        result = cv2.matchTemplate(
-            gray_move_anker_area, self.gray_move_anker_template, cv2.TM_CCOEFF_NORMED
+        score = self._match_score(
+            gray_pokemon_selection_area, self.gray_pokemon_selection_template
         )
-        _result = cv2.minMaxLoc(result)[1] >= MOVE_ANKER_THRESHOLD
-        return bool(_result)
+        scores["pokemon_selection"] = score
+        return score >= TEMPLATE_MATCHING_THRESHOLD
 
-    def is_pokemon_selection_frame(self, frame: np.ndarray) -> bool:
-        gray_pokemon_selection_area = cv2.cvtColor(
-            frame[
-                POKEMON_SELECTION_ICON[0] : POKEMON_SELECTION_ICON[1],
-                POKEMON_SELECTION_ICON[2] : POKEMON_SELECTION_ICON[3],
-            ],
-            cv2.COLOR_BGR2GRAY,
-        )
-        result = cv2.matchTemplate(
-            gray_pokemon_selection_area,
-            self.gray_pokemon_selection_template,
-            cv2.TM_CCOEFF_NORMED,
+    def classify(
+        self,
+        frame: np.ndarray,
+        with_scores: bool = False,
+        scenes: Optional[Collection[str]] = None,
+    ) -> SceneClassification:
+        """
+        フレームがどの画面かを判定する
+
+        グレースケール変換は必要な領域について1フレーム1回だけ行い、検出器間で共有する。
+        with_scores=False の場合は最初に該当した検出器で打ち切る。
+        with_scores=True の場合は全ての検出器のスコアを計算する(デバッグ用)
+        scenes を渡すと、その画面の検出器だけを同じ順序で評価する
+        """
+        gray_windows = GrayWindows(frame, self.geometry)
+        classification = SceneClassification(label=SCENE_NONE)
+        for scene, detect in [
+            (SCENE_MESSAGE_WINDOW, self._detect_message_window),
+            (SCENE_LEVEL_50, self._detect_level_50),
+            (SCENE_FIRST_RANKING, self._detect_first_ranking),
+            (SCENE_SELECT_DONE, self._detect_select_done),
+            (SCENE_STANDING_BY, self._detect_standing_by),
+            (SCENE_RANKING, self._detect_ranking),
+            (SCENE_WIN_OR_LOST, self._detect_win_or_lost),
+        ]:
+            if scenes is not None and scene not in scenes:
+                continue
+            self.evaluation_count += 1
+            if not detect(gray_windows, classification.scores):
+                continue
+            classification.detected.append(scene)
+            if classification.label != SCENE_NONE:
+                continue
+            classification.label = scene
+            # level_50 と move は同時に検出されるべき
+            if scene == SCENE_LEVEL_50:
+                self.evaluation_count += 1
+                if self._detect_move(gray_windows, classification.scores):
+                    classification.label = SCENE_MOVE
+                    classification.detected.append(SCENE_MOVE)
+            if not with_scores:
+                return classification
+
+        if with_scores:
+            if "move" not in classification.scores and self._detect_move(
+                gray_windows, classification.scores
+            ):
+                classification.detected.append(SCENE_MOVE)
+            if self._detect_pokemon_selection(gray_windows, classification.scores):
+                classification.detected.append(SCENE_POKEMON_SELECTION)
+        return classification
+
+    def classify_batch(self, frames: Sequence[np.ndarray]) -> List[SceneClassification]:
+        """
+        複数フレームをまとめて判定する。ラベルは classify(frame) と同じになる
+
+        テンプレートマッチングは同じウィンドウを K フレーム分重ねた配列に対して
+        BatchTemplateMatcher でまとめて計算し、ラベルが決まっていないフレームだけを
+        次の検出器に回す
+        """
+        gray_windows = BatchGrayWindows(frames, self.geometry)
+        classifications = [SceneClassification(label=SCENE_NONE) for _ in frames]
+        pending = np.arange(len(frames))
+
+        def _record(key: str, values: np.ndarray) -> None:
+            for k, value in zip(pending, values):
+                classifications[k].scores[key] = float(value)
+
+        def _template_scores(window: Window, code: int, key: str) -> np.ndarray:
+            gray = gray_windows.get(window, code, pending)
+            return self.batch_matchers[key].max_scores(gray)
+
+        def _assign(detected: np.ndarray, scene: str) -> np.ndarray:
+            for k in pending[detected]:
+                classifications[k].label = scene
+                classifications[k].detected.append(scene)
+            return pending[~detected]
+
+        # message_window: 白画素数の条件を満たすフレームだけ MSER にかける
+        gray = gray_windows.get(POKEMON_MESSAGE_WINDOW, cv2.COLOR_BGR2GRAY, pending)
+        thresh = gray > POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE
+        white_pixels = thresh.sum(axis=(1, 2))
+        _record("message_window_white_pixels", white_pixels)
+        is_message = (white_pixels > self.message_window_min_white_pixels) & (
+            white_pixels < self.message_window_max_white_pixels
         )
-        _result = cv2.minMaxLoc(result)[1] >= TEMPLATE_MATCHING_THRESHOLD
-        return bool(_result)
+        for position in np.flatnonzero(is_message):
+            regions, _ = self.mser.detectRegions(
+                thresh[position].astype(np.uint8) * 255
+            )
+            classifications[pending[position]].scores["message_window_regions"] = float(
+                len(regions)
+            )
+            is_message[position] = len(regions) >= 2
+        pending = _assign(is_message, SCENE_MESSAGE_WINDOW)
+
+        # level_50 と move は同時に検出されるべき
+        if len(pending) > 0:
+            gray = gray_windows.get(LEVEL_50_WINDOW, cv2.COLOR_RGB2GRAY, pending)
+            scores = self.batch_matchers["level_50"].max_scores(gray)
+            white_pixels = (gray > 200).sum(axis=(1, 2))
+            _record("level_50", scores)
+            _record("level_50_white_pixels", white_pixels)
+            is_level_50 = (white_pixels > self.level_50_min_white_pixels) & (
+                scores >= TEMPLATE_MATCHING_THRESHOLD
+            )
+            level_50_frames = pending[is_level_50]
+            pending = _assign(is_level_50, SCENE_LEVEL_50)
+            if len(level_50_frames) > 0:
+                gray = gray_windows.get(
+                    MOVE_ANKER_POSITION, cv2.COLOR_BGR2GRAY, level_50_frames
+                )
+                scores = self.batch_matchers["move"].max_scores(gray)
+                for k, score in zip(level_50_frames, scores):
+                    classifications[k].scores["move"] = float(score)
+                    if score >= MOVE_ANKER_THRESHOLD:
+                        classifications[k].label = SCENE_MOVE
+                        classifications[k].detected.append(SCENE_MOVE)
+
+        for scene, window, key in [
+            (SCENE_FIRST_RANKING, FIRST_RANKING_WINDOW, "ranking"),
+            (SCENE_SELECT_DONE, POKEMON_SELECT_DONE_WINDOW, "select_done"),
+            (SCENE_STANDING_BY, STANDING_BY_WINDOW, "standing_by"),
+            (SCENE_RANKING, RANKING_WINDOW, "ranking"),
+        ]:
+            if len(pending) == 0:
+                return classifications
+            scores = _template_scores(window, cv2.COLOR_RGB2GRAY, key)
+            _record(scene, scores)
+            pending = _assign(scores >= TEMPLATE_MATCHING_THRESHOLD, scene)
+
+        if len(pending) > 0:
+            win_scores = _template_scores(WIN_LOST_WINDOW, cv2.COLOR_RGB2GRAY, "win")
+            lost_scores = _template_scores(WIN_LOST_WINDOW, cv2.COLOR_RGB2GRAY, "lost")
+            _record("win", win_scores)
+            _record("lost", lost_scores)
+            _assign(
+                (win_scores >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD)
+                | (lost_scores >= WIN_OR_LOST_TEMPLATE_MATCHING_THRESHOLD),
+                SCENE_WIN_OR_LOST,
+            )
+        return classifications
+
+    def is_standing_by_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_standing_by(GrayWindows(frame, self.geometry), {})
+
+    def is_level_50_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_level_50(GrayWindows(frame, self.geometry), {})
+
+    def is_first_ranking_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_first_ranking(GrayWindows(frame, self.geometry), {})
+
+    def is_ranking_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_ranking(GrayWindows(frame, self.geometry), {})
+
+    def is_win_or_lost_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_win_or_lost(GrayWindows(frame, self.geometry), {})
+
+    def is_select_done_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_select_done(GrayWindows(frame, self.geometry), {})
+
+    def is_message_window_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_message_window(GrayWindows(frame, self.geometry), {})
+
+    def is_move_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_move(GrayWindows(frame, self.geometry), {})
+
+    def is_pokemon_selection_frame(self, frame: np.ndarray) -> bool:
+        return self._detect_pokemon_selection(GrayWindows(frame, self.geometry), {})
@@ -0,0 +1,136 @@
+from dataclasses import dataclass
+from typing import Sequence, Tuple
+
+import cv2
+import numpy as np
+from config.config import BASE_FRAME_SIZE
+
+Window = Tuple[int, int, int, int]
+
+
+def _scale(value: int, scale: float) -> int:
+    # 四捨五入(単調なので、内側のウィンドウは変換後も内側に収まる)
+    return int(value * scale + 0.5)
+
+
+@dataclass(frozen=True)
+class FrameGeometry:
+    """
+    config.config のウィンドウやテンプレート(BASE_FRAME_SIZE の画素座標)を、
+    動画の解像度に合わせて変換する
+    """
+
+    height: int = BASE_FRAME_SIZE[0]
+    width: int = BASE_FRAME_SIZE[1]
+
+    @classmethod
+    def from_video(cls, video_path: str) -> "FrameGeometry":
+        video = cv2.VideoCapture(video_path)
+        height = int(video.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        width = int(video.get(cv2.CAP_PROP_FRAME_WIDTH))
+        video.release()
+        if height <= 0 or width <= 0:
+            return cls()
+        return cls(height, width)
+
+    @property
+    def is_base(self) -> bool:
+        return (self.height, self.width) == BASE_FRAME_SIZE
+
+    @property
+    def scale_y(self) -> float:
+        return self.height / BASE_FRAME_SIZE[0]
+
+    @property
+    def scale_x(self) -> float:
+        return self.width / BASE_FRAME_SIZE[1]
+
+    def window(self, window: Window, margin: int = 0) -> Window:
+        """
+        ウィンドウを動画の座標に変換する(margin 画素だけ外側に広げる)
+        """
+        if self.is_base and margin == 0:
+            return window
+        top, bottom, left, right = window
+        return (
+            max(0, _scale(top, self.scale_y) - margin),
+            min(self.height, _scale(bottom, self.scale_y) + margin),
+            max(0, _scale(left, self.scale_x) - margin),
+            min(self.width, _scale(right, self.scale_x) + margin),
+        )
+
+    def pixel_count(self, count: float) -> float:
+        """
+        画素数の閾値を動画の解像度に合わせる
+        """
+        return count * self.scale_y * self.scale_x
+
+    def template(self, template: np.ndarray, *windows: Window) -> np.ndarray:
+        """
+        テンプレートを動画の解像度に縮小・拡大する
+
+        変換後のウィンドウより大きくならないように、windows(テンプレートを探す
+        ウィンドウ)の大きさで切り詰める
+        """
+        if self.is_base:
+            return template
+        height = _scale(template.shape[0], self.scale_y)
+        width = _scale(template.shape[1], self.scale_x)
+        for window in windows:
+            top, bottom, left, right = self.window(window)
+            height = min(height, bottom - top)
+            width = min(width, right - left)
+        interpolation = cv2.INTER_AREA if self.scale_y < 1 else cv2.INTER_LINEAR
+        return cv2.resize(template, (width, height), interpolation=interpolation)
+
+    def to_base(self, frame: np.ndarray) -> np.ndarray:
+        """
+        フレームを BASE_FRAME_SIZE に拡大・縮小する(抽出処理は BASE_FRAME_SIZE の座標を使う)
+        """
+        if frame.shape[:2] == BASE_FRAME_SIZE:
+            return frame
+        return cv2.resize(
+            frame,
+            (BASE_FRAME_SIZE[1], BASE_FRAME_SIZE[0]),
+            interpolation=cv2.INTER_LINEAR,
+        )
+
+    def to_base_windows(
+        self, frame: np.ndarray, windows: Sequence[Window]
+    ) -> np.ndarray:
+        """
+        windows(BASE_FRAME_SIZE の座標)の部分だけを BASE_FRAME_SIZE に拡大・縮小したフレームを返す
+
+        フレーム全体を to_base するより軽い。各ウィンドウの画素は to_base と同じ位置から
+        補間する(固定小数点の丸めで ±1 だけ異なることがある)。windows の外側の画素は 0 になる
+        入力のフレームは、各ウィンドウを動画の座標に変換して 2 画素広げた範囲だけを参照する
+        """
+        if frame.shape[:2] == BASE_FRAME_SIZE:
+            return frame
+        frame_geometry = FrameGeometry(frame.shape[0], frame.shape[1])
+        scale_y = frame_geometry.scale_y
+        scale_x = frame_geometry.scale_x
+        base_frame = np.zeros(BASE_FRAME_SIZE + frame.shape[2:], dtype=frame.dtype)
+        for window in windows:
+            top, bottom, left, right = window
+            (
+                source_top,
+                source_bottom,
+                source_left,
+                source_right,
+            ) = frame_geometry.window(window, margin=2)
+            # 出力の画素 (x, y) を、cv2.resize と同じ入力の座標に対応させる
+            matrix = np.array(
+                [
+                    [scale_x, 0, (left + 0.5) * scale_x - 0.5 - source_left],
+                    [0, scale_y, (top + 0.5) * scale_y - 0.5 - source_top],
+                ]
+            )
+            base_frame[top:bottom, left:right] = cv2.warpAffine(
+                frame[source_top:source_bottom, source_left:source_right],
+                matrix,
+                (right - left, bottom - top),
+                flags=cv2.INTER_LINEAR | cv2.WARP_INVERSE_MAP,
+                borderMode=cv2.BORDER_REPLICATE,
+            ).reshape(base_frame[top:bottom, left:right].shape)
+        return base_frame
@@ -0,0 +1,54 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+# 次に読むフレームまでの間隔がこれ以下なら、シークせずに grab で読み飛ばす
+# (シークはキーフレームからデコードし直すので、近いフレームは読み飛ばす方が速い)
+DEFAULT_MAX_GRAB_GAP = 120
+
+
+def build_dispatch_table(
+    extraction_targets: List[Tuple[str, List[int]]]
+) -> Dict[int, List[str]]:
+    """
+    (抽出の種類, フレーム番号のリスト) から、フレーム番号(昇順)ごとの抽出の種類を作る
+
+    同じフレームの抽出の種類は extraction_targets の順に並べる
+    """
+    dispatch_table: Dict[int, List[str]] = {}
+    for task, frame_numbers in extraction_targets:
+        for frame_number in frame_numbers:
+            dispatch_table.setdefault(frame_number, []).append(task)
+    return dict(sorted(dispatch_table.items()))
+
+
+def read_frames(
+    video_path: str,
+    frame_numbers: List[int],
+    max_grab_gap: int = DEFAULT_MAX_GRAB_GAP,
+) -> Iterator[Tuple[int, Optional[np.ndarray]]]:
+    """
+    frame_numbers(昇順)のフレームだけを動画から読む
+
+    離れたフレームにはシークし、近いフレームまでは grab で読み飛ばす(色変換をしない)。
+    grab / read に失敗した後は位置がわからないので、次のフレームにはシークする。
+    読めなかったフレームは None を返す
+    """
+    video = cv2.VideoCapture(video_path)
+    # 次に read で読むフレーム番号(わからない場合は None)
+    position: Optional[int] = 0
+    for frame_number in frame_numbers:
+        gap = frame_number - position if position is not None else -1
+        if gap < 0 or gap > max_grab_gap:
+            video.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+        else:
+            for _ in range(gap):
+                if not video.grab():
+                    # 読み飛ばしの途中で失敗すると、残りの分だけ位置がずれる
+                    video.set(cv2.CAP_PROP_POS_FRAMES, frame_number)
+                    break
+        ret, frame = video.read()
+        position = frame_number + 1 if ret else None
+        yield frame_number, frame if ret else None
+    video.release()
@@ -0,0 +1,554 @@
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from logging import getLogger
+from multiprocessing import get_context
+from typing import Callable, Deque, Dict, List, Optional, Tuple, Union, cast
+
+import cv2
+import numpy as np
+
+from poke_battle_logger.batch.ffmpeg_frame_source import FFmpegFrameSource
+from poke_battle_logger.batch.frame_change_detector import FrameChangeDetector
+from poke_battle_logger.batch.frame_detector import (
+    DETECTOR_WINDOWS,
+    SCENE_FIRST_RANKING,
+    SCENE_LEVEL_50,
+    SCENE_MESSAGE_WINDOW,
+    SCENE_MOVE,
+    SCENE_NONE,
+    SCENE_RANKING,
+    SCENE_SELECT_DONE,
+    SCENE_STANDING_BY,
+    SCENE_WIN_OR_LOST,
+    SHARED_GRAY_REGIONS,
+    FrameDetector,
+    Window,
+)
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_store import TASK_WINDOWS, FrameStore
+from poke_battle_logger.batch.scene_grammar import SceneGrammarDetector
+
+logger = getLogger(__name__)
+
+# シャードの開始位置より何フレーム手前から判定するか(粗い走査の stride 以上にする)
+SHARD_OVERLAP_FRAMES = 30
+
+DETECTION_TARGETS = [
+    "first_ranking",
+    "select_done",
+    "standing_by",
+    "level_50",
+    "ranking",
+    "win_or_lost",
+    "message_window",
+    "move",
+]
+
+# FrameDetector.classify のラベルと、それに該当する検出結果の対応
+SCENE_DETECTION_TARGETS: Dict[str, List[str]] = {
+    SCENE_NONE: [],
+    SCENE_MESSAGE_WINDOW: ["message_window"],
+    SCENE_LEVEL_50: ["level_50"],
+    SCENE_MOVE: ["level_50", "move"],
+    SCENE_FIRST_RANKING: ["first_ranking"],
+    SCENE_SELECT_DONE: ["select_done"],
+    SCENE_STANDING_BY: ["standing_by"],
+    SCENE_RANKING: ["ranking"],
+    SCENE_WIN_OR_LOST: ["win_or_lost"],
+}
+
+# 粗い走査で各検出器を何フレームおきに判定するか
+# 各画面の表示が stride フレーム以上続く限り、全フレームを判定した結果と一致する
+DEFAULT_SCAN_STRIDES = {
+    "message_window": 2,
+    "level_50": 5,
+    "move": 5,
+    "first_ranking": 10,
+    "select_done": 5,
+    "standing_by": 10,
+    "ranking": 10,
+    "win_or_lost": 5,
+}
+
+
+def detect_scenes(frame_detector: FrameDetector, frame: np.ndarray) -> List[str]:
+    """
+    1フレームを判定し、該当した検出結果の名前を返す
+    """
+    label = frame_detector.classify(frame).label
+    return SCENE_DETECTION_TARGETS[label]
+
+
+def detect_scenes_batch(
+    frame_detector: FrameDetector, frames: List[Tuple[int, np.ndarray]]
+) -> List[Tuple[int, np.ndarray, List[str]]]:
+    """
+    (フレーム番号, フレーム) のリストをまとめて判定し、(フレーム番号, フレーム, 検出結果) を返す
+    """
+    classifications = frame_detector.classify_batch([frame for _, frame in frames])
+    return [
+        (frame_number, frame, SCENE_DETECTION_TARGETS[classification.label])
+        for (frame_number, frame), classification in zip(frames, classifications)
+    ]
+
+
+class CoarseToFineScanner:
+    """
+    検出器ごとに stride フレームおきに判定し、検出された周辺だけを全フレーム判定し直す
+
+    push したフレームのうち判定が確定したものを (フレーム番号, フレーム, 検出結果) で返す。
+    直近のフレームをリングバッファに持つので、検出時に手前のフレームへ遡って判定できる
+    """
+
+    def __init__(self, frame_detector: FrameDetector, strides: Dict[str, int]) -> None:
+        self.frame_detector = frame_detector
+        self.strides = strides
+        self.sampling_predicates: Dict[str, Callable[[np.ndarray], bool]] = {
+            "message_window": frame_detector.is_message_window_frame,
+            "level_50": frame_detector.is_level_50_frame,
+            "first_ranking": frame_detector.is_first_ranking_frame,
+            "select_done": frame_detector.is_select_done_frame,
+            "standing_by": frame_detector.is_standing_by_frame,
+            "ranking": frame_detector.is_ranking_frame,
+            "win_or_lost": frame_detector.is_win_or_lost_frame,
+        }
+        max_stride = max(strides.values())
+        self._recent_frames: Deque[Tuple[int, np.ndarray]] = deque(
+            maxlen=max(1, max_stride - 1)
+        )
+        self._dense_until = -1
+        self._last_classified_frame_number = -1
+        self.sampled_frames = 0
+        self.classified_frames = 0
+
+    def _stride(self, key: str) -> int:
+        return self.strides.get(key, 1)
+
+    def _classify(
+        self, frame_number: int, frame: np.ndarray
+    ) -> Tuple[int, np.ndarray, List[str]]:
+        keys = detect_scenes(self.frame_detector, frame)
+        self.classified_frames += 1
+        self._last_classified_frame_number = frame_number
+        for key in keys:
+            self._dense_until = max(
+                self._dense_until, frame_number + self._stride(key) - 1
+            )
+        return frame_number, frame, keys
+
+    def push(
+        self, frame_number: int, frame: np.ndarray
+    ) -> List[Tuple[int, np.ndarray, List[str]]]:
+        results = []
+        if frame_number <= self._dense_until:
+            results.append(self._classify(frame_number, frame))
+        else:
+            hit_strides = []
+            for key, predicate in self.sampling_predicates.items():
+                if frame_number % self._stride(key) != 0:
+                    continue
+                self.sampled_frames += 1
+                if predicate(frame):
+                    hit_strides.append(self._stride(key))
+            if hit_strides:
+                # 検出された場合、stride 分手前まで遡って全フレーム判定する
+                backfill_from = max(
+                    self._last_classified_frame_number + 1,
+                    frame_number - max(hit_strides) + 1,
+                )
+                for _frame_number, _frame in self._recent_frames:
+                    if _frame_number >= backfill_from:
+                        results.append(self._classify(_frame_number, _frame))
+                results.append(self._classify(frame_number, frame))
+        self._recent_frames.append((frame_number, frame))
+        return results
+
+
+def _frame_hash(frame: np.ndarray, windows: List[Window]) -> str:
+    """
+    フレームの検出器のウィンドウの画素のハッシュ
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for top, bottom, left, right in windows:
+        digest.update(np.ascontiguousarray(frame[top:bottom, left:right]).tobytes())
+    return digest.hexdigest()
+
+
+def scan_frame_range(
+    video_path: str,
+    frame_detector: FrameDetector,
+    start: int,
+    end: int,
+    frame_store: Optional[FrameStore] = None,
+    overlap: int = 0,
+    strides: Optional[Dict[str, int]] = None,
+    batch_size: int = 1,
+    scene_grammar: bool = False,
+    change_detection: bool = False,
+    frame_source: str = "opencv",
+    frame_hashes: Optional[Dict[int, str]] = None,
+) -> Tuple[Dict[str, List[int]], Dict[str, List[int]]]:
+    """
+    [start, end) のフレームを検出器にかけ、検出結果ごとのフレーム番号を返す
+
+    start の overlap フレーム手前からデコードして判定し、その結果は別に返す
+    (シャード間の境界でフレーム位置がずれていないかの確認に使う)
+    frame_hashes を渡すと、start より前と末尾の overlap フレームについて、
+    フレーム番号 -> 検出器のウィンドウの画素のハッシュ を記録する(検出結果によらない位置の確認に使う)
+    strides を渡すと CoarseToFineScanner で間引いて判定する
+    batch_size が 2 以上の場合、batch_size フレームずつ FrameDetector.classify_batch で
+    まとめて判定する(strides を渡した場合は使わない)
+    scene_grammar=True の場合、SceneGrammarDetector で画面遷移に沿った検出器だけを評価する
+    (strides / batch_size を渡した場合は使わない)
+    change_detection=True の場合、検出器のウィンドウが前回判定したフレームから変化していなければ
+    判定結果を使い回す(strides / batch_size を渡した場合は使わない)
+    frame_source="ffmpeg" の場合、FFmpegFrameSource で検出(と frame_store)に必要な
+    ウィンドウだけをデコードし、切り出した部分をそのまま判定する
+    """
+    detected_frames: Dict[str, List[int]] = {key: [] for key in DETECTION_TARGETS}
+    overlap_detected_frames: Dict[str, List[int]] = {
+        key: [] for key in DETECTION_TARGETS
+    }
+
+    coarse_to_fine_scanner = (
+        CoarseToFineScanner(frame_detector, strides) if strides is not None else None
+    )
+    scene_grammar_detector = (
+        SceneGrammarDetector(frame_detector) if scene_grammar else None
+    )
+    geometry = frame_detector.geometry
+    frame_change_detector = (
+        FrameChangeDetector(
+            windows=[geometry.window(window) for window in DETECTOR_WINDOWS]
+        )
+        if change_detection
+        else None
+    )
+    previous_keys: List[str] = []
+    hash_windows = [geometry.window(window) for window in DETECTOR_WINDOWS]
+    first_evaluation_count = frame_detector.evaluation_count
+
+    def _record(results: List[Tuple[int, np.ndarray, List[str]]]) -> None:
+        for frame_number, frame, keys in results:
+            if keys and frame_store is not None and frame_number >= start:
+                # 抽出処理は BASE_FRAME_SIZE の座標を使う(保存するウィンドウだけを変換する)
+                frame = geometry.to_base_windows(
+                    frame, [window for key in keys for window in TASK_WINDOWS[key]]
+                )
+            for key in keys:
+                if frame_number < start:
+                    overlap_detected_frames[key].append(frame_number)
+                    continue
+                detected_frames[key].append(frame_number)
+                if frame_store is not None:
+                    frame_store.add(key, frame_number, frame)
+
+    batch_frames: List[Tuple[int, np.ndarray]] = []
+    first_frame = max(0, start - overlap)
+    video: Union[cv2.VideoCapture, FFmpegFrameSource]
+    if frame_source == "ffmpeg":
+        # GrayWindows は重なっているウィンドウを囲む領域ごと切り出すので、その領域もデコードする
+        # (検出器はグレースケールしか使わない)
+        windows = [
+            geometry.window(window)
+            for window in DETECTOR_WINDOWS + list(SHARED_GRAY_REGIONS.values())
+        ]
+        color_windows = []
+        if frame_store is not None:
+            # BASE_FRAME_SIZE に拡大・縮小するときに周りの画素も使うので、少し広げる
+            color_windows = [
+                geometry.window(window, margin=2)
+                for task in TASK_WINDOWS
+                for window in TASK_WINDOWS[task]
+            ]
+        video = FFmpegFrameSource(
+            video_path, windows, start_frame=first_frame, color_windows=color_windows
+        )
+    else:
+        video = cv2.VideoCapture(video_path)
+        if first_frame > 0:
+            video.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+    # FFmpegFrameSource は同じ配列を使い回すので、後で判定するフレームはコピーしておく
+    copy_frames = frame_source == "ffmpeg" and (
+        coarse_to_fine_scanner is not None or batch_size > 1
+    )
+    for i in range(first_frame, end):
+        ret, read_frame = video.read()
+        if not ret or read_frame is None:
+            continue
+        # WindowFrame は、デコードしたウィンドウの範囲では np.ndarray と同じように切り出せる
+        frame = cast(np.ndarray, read_frame)
+        if frame_hashes is not None and (i < start or i >= end - overlap):
+            frame_hashes[i] = _frame_hash(frame, hash_windows)
+        if copy_frames:
+            frame = frame.copy()
+        if coarse_to_fine_scanner is not None:
+            _record(coarse_to_fine_scanner.push(i, frame))
+        elif batch_size > 1:
+            batch_frames.append((i, frame))
+            if len(batch_frames) >= batch_size:
+                _record(detect_scenes_batch(frame_detector, batch_frames))
+                batch_frames = []
+        elif frame_change_detector is not None and not (
+            frame_change_detector.is_changed(frame)
+        ):
+            _record([(i, frame, previous_keys)])
+        elif scene_grammar_detector is not None:
+            label = scene_grammar_detector.classify(i, frame).label
+            previous_keys = SCENE_DETECTION_TARGETS[label]
+            _record([(i, frame, previous_keys)])
+        else:
+            previous_keys = detect_scenes(frame_detector, frame)
+            _record([(i, frame, previous_keys)])
+    video.release()
+    if batch_frames:
+        _record(detect_scenes_batch(frame_detector, batch_frames))
+
+    if coarse_to_fine_scanner is not None:
+        logger.info(
+            f"Coarse scan: {coarse_to_fine_scanner.classified_frames} frames classified, "
+            f"{coarse_to_fine_scanner.sampled_frames} detector samples "
+            f"in {end - first_frame} frames"
+        )
+    elif scene_grammar_detector is not None:
+        evaluation_count = frame_detector.evaluation_count - first_evaluation_count
+        logger.info(
+            "Scene grammar: "
+            f"{evaluation_count / max(1, scene_grammar_detector.classified_frames):.2f} "
+            "detector evaluations per frame, "
+            f"{scene_grammar_detector.full_checks} full checks, "
+            f"{scene_grammar_detector.recoveries} recoveries"
+        )
+    if frame_change_detector is not None and frame_change_detector.checked_frames > 0:
+        logger.info(
+            f"Change detection: {frame_change_detector.reused_frames} of "
+            f"{frame_change_detector.checked_frames} frames reused previous results"
+        )
+
+    if frame_store is not None:
+        frame_store.flush()
+
+    return detected_frames, overlap_detected_frames
+
+
+def get_total_frames(video_path: str) -> int:
+    video = cv2.VideoCapture(video_path)
+    total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
+    video.release()
+    return total_frames
+
+
+def scan_video(
+    video_path: str,
+    frame_detector: FrameDetector,
+    frame_store: Optional[FrameStore] = None,
+    strides: Optional[Dict[str, int]] = None,
+    batch_size: int = 1,
+    scene_grammar: bool = False,
+    change_detection: bool = False,
+    frame_source: str = "opencv",
+) -> Tuple[Dict[str, List[int]], int]:
+    """
+    動画の全フレームを検出器にかけ、検出結果ごとのフレーム番号と総フレーム数を返す
+
+    frame_store を渡すと、抽出で使うフレームの ROI を検出と同時に保存する
+    strides を渡すと、検出器ごとに間引いて判定する(CoarseToFineScanner)
+    batch_size を渡すと、そのフレーム数ずつまとめて判定する
+    scene_grammar=True の場合、画面遷移に沿った検出器だけを評価する(SceneGrammarDetector)
+    change_detection=True の場合、変化のないフレームは判定結果を使い回す(FrameChangeDetector)
+    frame_source="ffmpeg" の場合、必要なウィンドウだけを ffmpeg でデコードする
+    """
+    total_frames = get_total_frames(video_path)
+    detected_frames, _ = scan_frame_range(
+        video_path,
+        frame_detector,
+        0,
+        total_frames,
+        frame_store=frame_store,
+        strides=strides,
+        batch_size=batch_size,
+        scene_grammar=scene_grammar,
+        change_detection=change_detection,
+        frame_source=frame_source,
+    )
+    return detected_frames, total_frames
+
+
+def split_frame_range(total_frames: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    [0, total_frames) をほぼ等しい長さの num_shards 個の区間に分割する
+    """
+    num_shards = max(1, min(num_shards, total_frames))
+    boundaries = [total_frames * k // num_shards for k in range(num_shards + 1)]
+    return [(boundaries[k], boundaries[k + 1]) for k in range(num_shards)]
+
+
+def merge_shard_results(
+    frame_ranges: List[Tuple[int, int]],
+    shard_results: List[Dict[str, List[int]]],
+    overlap_results: List[Dict[str, List[int]]],
+    frame_hashes: List[Dict[int, str]],
+    overlap: int,
+) -> Optional[Dict[str, List[int]]]:
+    """
+    シャードごとの検出結果をフレーム順に連結する
+
+    各シャードが overlap 区間でデコードしたフレームのハッシュ(または判定した結果)が、
+    その区間を担当したシャードのものと一致しない場合(seek でフレーム位置がずれた場合)は None を返す。
+    overlap 区間のフレームが全て同じ場合も、ずれていても一致するので確認できず None を返す
+    """
+    detected_frames: Dict[str, List[int]] = {key: [] for key in DETECTION_TARGETS}
+    for k, (start, _) in enumerate(frame_ranges):
+        if k > 0:
+            boundary = range(max(0, start - overlap), start)
+            hashes = [frame_hashes[k].get(i) for i in boundary]
+            if hashes != [frame_hashes[k - 1].get(i) for i in boundary]:
+                return None
+            if len(set(hashes) - {None}) < 2:
+                return None
+        for key in DETECTION_TARGETS:
+            if k > 0:
+                expected = [
+                    i for i in detected_frames[key] if start - overlap <= i < start
+                ]
+                if overlap_results[k][key] != expected:
+                    return None
+            detected_frames[key].extend(shard_results[k][key])
+    return detected_frames
+
+
+def _scan_shard(
+    video_path: str,
+    lang: str,
+    start: int,
+    end: int,
+    overlap: int,
+    use_frame_store: bool,
+    frame_store_max_bytes: int,
+    strides: Optional[Dict[str, int]],
+    batch_size: int,
+    scene_grammar: bool,
+    change_detection: bool,
+    frame_source: str,
+) -> Tuple[
+    Dict[str, List[int]], Dict[str, List[int]], Dict[int, str], Optional[FrameStore]
+]:
+    # ワーカープロセスの数だけ並列に動くので、OpenCV 内部のスレッドは使わない
+    cv2.setNumThreads(1)
+    frame_detector = FrameDetector(lang, FrameGeometry.from_video(video_path))
+    frame_store = FrameStore(frame_store_max_bytes) if use_frame_store else None
+    frame_hashes: Dict[int, str] = {}
+    detected_frames, overlap_detected_frames = scan_frame_range(
+        video_path,
+        frame_detector,
+        start,
+        end,
+        frame_store=frame_store,
+        overlap=overlap,
+        strides=strides,
+        batch_size=batch_size,
+        scene_grammar=scene_grammar,
+        change_detection=change_detection,
+        frame_source=frame_source,
+        frame_hashes=frame_hashes,
+    )
+    return detected_frames, overlap_detected_frames, frame_hashes, frame_store
+
+
+def scan_video_sharded(
+    video_path: str,
+    lang: str,
+    num_workers: int,
+    frame_store: Optional[FrameStore] = None,
+    overlap: int = SHARD_OVERLAP_FRAMES,
+    strides: Optional[Dict[str, int]] = None,
+    batch_size: int = 1,
+    scene_grammar: bool = False,
+    change_detection: bool = False,
+    frame_source: str = "opencv",
+) -> Tuple[Dict[str, List[int]], int]:
+    """
+    フレーム区間を num_workers 個に分割し、プロセスごとに検出する
+
+    結果は scan_video と一致する。シャード境界でフレーム位置のずれを検出した場合は
+    scan_video で逐次に検出し直す。
+    scene_grammar / change_detection は前のフレームまでの状態を使って判定するため、
+    シャードの先頭で状態が初期化されると scan_video と一致しない。この場合は分割せずに
+    scan_video で逐次に検出する
+    """
+    if scene_grammar or change_detection:
+        logger.info(
+            "Scene grammar and change detection depend on previous frames. "
+            "Scan sequentially without sharding."
+        )
+        return scan_video(
+            video_path,
+            FrameDetector(lang, FrameGeometry.from_video(video_path)),
+            frame_store=frame_store,
+            strides=strides,
+            batch_size=batch_size,
+            scene_grammar=scene_grammar,
+            change_detection=change_detection,
+            frame_source=frame_source,
+        )
+
+    total_frames = get_total_frames(video_path)
+    frame_ranges = split_frame_range(total_frames, num_workers)
+    use_frame_store = frame_store is not None
+    frame_store_max_bytes = (
+        frame_store.max_bytes // len(frame_ranges) if frame_store is not None else 0
+    )
+
+    with ProcessPoolExecutor(
+        max_workers=len(frame_ranges), mp_context=get_context("spawn")
+    ) as executor:
+        futures = [
+            executor.submit(
+                _scan_shard,
+                video_path,
+                lang,
+                start,
+                end,
+                overlap,
+                use_frame_store,
+                frame_store_max_bytes,
+                strides,
+                batch_size,
+                scene_grammar,
+                change_detection,
+                frame_source,
+            )
+            for start, end in frame_ranges
+        ]
+        results = [future.result() for future in futures]
+
+    detected_frames = merge_shard_results(
+        frame_ranges,
+        [result[0] for result in results],
+        [result[1] for result in results],
+        [result[2] for result in results],
+        overlap,
+    )
+    if detected_frames is None:
+        logger.warning(
+            "Shard boundaries are misaligned or cannot be verified. "
+            "Fall back to sequential scan."
+        )
+        return scan_video(
+            video_path,
+            FrameDetector(lang, FrameGeometry.from_video(video_path)),
+            frame_store=frame_store,
+            strides=strides,
+            batch_size=batch_size,
+            scene_grammar=scene_grammar,
+            change_detection=change_detection,
+            frame_source=frame_source,
+        )
+
+    if frame_store is not None:
+        for _, _, _, shard_frame_store in results:
+            if shard_frame_store is not None:
+                frame_store.merge(shard_frame_store)
+
+    return detected_frames, total_frames
@@ -0,0 +1,236 @@
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+from config.config import (
+    FIRST_RANKING_NUMBER_WINDOW,
+    MESSAGE_WINDOW,
+    MOVE_SELECT_WINDOW1,
+    MOVE_SELECT_WINDOW2,
+    MOVE_SELECT_WINDOW3,
+    MOVE_SELECT_WINDOW4,
+    MOVE_TITLE1,
+    MOVE_TITLE2,
+    MOVE_TITLE3,
+    MOVE_TITLE4,
+    OPPONENT_POKEMON_NAME_WINDOW,
+    OPPONENT_PRE_POKEMON_POSITION,
+    POKEMON_POSITIONS,
+    POKEMON_SELECT_NUMBER_WINDOW1,
+    POKEMON_SELECT_NUMBER_WINDOW2,
+    POKEMON_SELECT_NUMBER_WINDOW3,
+    POKEMON_SELECT_NUMBER_WINDOW4,
+    POKEMON_SELECT_NUMBER_WINDOW5,
+    POKEMON_SELECT_NUMBER_WINDOW6,
+    RANKING_NUMBER_WINDOW,
+    WIN_LOST_WINDOW,
+    YOUR_POKEMON_NAME_WINDOW,
+    YOUR_PRE_POKEMON_POSITION,
+)
+
+from poke_battle_logger.batch.frame_compressor import (
+    FRAME_SEQUENCE_THRESHOLD,
+    MESSAGE_FRAME_SEQUENCE_THRESHOLD,
+)
+from poke_battle_logger.batch.frame_reader import read_frames
+
+Window = Tuple[int, int, int, int]
+
+DEFAULT_FRAME_STORE_MAX_BYTES = 1024 * 1024 * 1024
+
+# 抽出時に各検出結果のフレームから参照されるウィンドウ
+TASK_WINDOWS: Dict[str, List[Window]] = {
+    "first_ranking": [FIRST_RANKING_NUMBER_WINDOW],
+    "ranking": [RANKING_NUMBER_WINDOW],
+    "select_done": [
+        POKEMON_SELECT_NUMBER_WINDOW1,
+        POKEMON_SELECT_NUMBER_WINDOW2,
+        POKEMON_SELECT_NUMBER_WINDOW3,
+        POKEMON_SELECT_NUMBER_WINDOW4,
+        POKEMON_SELECT_NUMBER_WINDOW5,
+        POKEMON_SELECT_NUMBER_WINDOW6,
+    ],
+    "standing_by": [
+        (position[0], position[1], column[0], column[1])
+        for position in POKEMON_POSITIONS
+        for column in [YOUR_PRE_POKEMON_POSITION, OPPONENT_PRE_POKEMON_POSITION]
+    ],
+    "level_50": [YOUR_POKEMON_NAME_WINDOW, OPPONENT_POKEMON_NAME_WINDOW],
+    "win_or_lost": [WIN_LOST_WINDOW],
+    "message_window": [MESSAGE_WINDOW],
+    "move": [
+        MOVE_SELECT_WINDOW1,
+        MOVE_SELECT_WINDOW2,
+        MOVE_SELECT_WINDOW3,
+        MOVE_SELECT_WINDOW4,
+        MOVE_TITLE1,
+        MOVE_TITLE2,
+        MOVE_TITLE3,
+        MOVE_TITLE4,
+        YOUR_POKEMON_NAME_WINDOW,
+        OPPONENT_POKEMON_NAME_WINDOW,
+    ],
+}
+
+# 連続区間の末尾から何フレームを抽出に使うか(None は区間の全フレーム)
+# PokemonBattleExtractor.run で各区間から取り出す位置(v[-5] など)に対応させる
+TASK_TAIL_SIZES: Dict[str, Optional[int]] = {
+    "first_ranking": 5,
+    "ranking": 5,
+    "select_done": 6,
+    "standing_by": 1,
+    "level_50": 2,
+    "win_or_lost": None,
+    "message_window": 1,
+    "move": 2,
+}
+
+# 連続区間を区切るフレーム間隔(frame_compress / message_frame_compress と同じ)
+TASK_FRAME_THRESHOLDS: Dict[str, int] = {
+    "first_ranking": FRAME_SEQUENCE_THRESHOLD,
+    "ranking": FRAME_SEQUENCE_THRESHOLD,
+    "select_done": FRAME_SEQUENCE_THRESHOLD,
+    "standing_by": FRAME_SEQUENCE_THRESHOLD,
+    "level_50": FRAME_SEQUENCE_THRESHOLD,
+    "win_or_lost": FRAME_SEQUENCE_THRESHOLD,
+    "message_window": MESSAGE_FRAME_SEQUENCE_THRESHOLD,
+    "move": FRAME_SEQUENCE_THRESHOLD,
+}
+
+
+class FrameStore:
+    """
+    検出パスの間に、抽出で使うフレームの ROI だけを保持するクラス
+
+    検出結果ごとに連続区間の末尾のフレームだけをリングバッファに持ち、区間が閉じた時点で
+    ROI を PNG(可逆)で圧縮して保存する。保存量は max_bytes で上限を設け、
+    上限を超えたフレームは保存せず、iter_frames で動画から読み直す。
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_FRAME_STORE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.stored_bytes = 0
+        self.frame_shape: Optional[Tuple[int, ...]] = None
+        self.frame_dtype: Optional[np.dtype] = None
+        self.dropped_frame_numbers: Set[int] = set()
+        self._crops: Dict[int, Dict[Window, bytes]] = {}
+        self._tails: Dict[str, Deque[Tuple[int, Dict[Window, np.ndarray]]]] = {}
+        self._last_frame_numbers: Dict[str, int] = {}
+
+    def __contains__(self, frame_number: int) -> bool:
+        return (
+            frame_number in self._crops
+            and frame_number not in self.dropped_frame_numbers
+        )
+
+    def add(self, task: str, frame_number: int, frame: np.ndarray) -> None:
+        """
+        task として検出されたフレームを登録する
+        """
+        if self.frame_shape is None:
+            self.frame_shape = frame.shape
+            self.frame_dtype = frame.dtype
+
+        last_frame_number = self._last_frame_numbers.get(task)
+        if (
+            last_frame_number is not None
+            and frame_number - last_frame_number > TASK_FRAME_THRESHOLDS[task]
+        ):
+            self._commit(task)
+        self._last_frame_numbers[task] = frame_number
+
+        if task not in self._tails:
+            self._tails[task] = deque(maxlen=TASK_TAIL_SIZES[task])
+        crops = {
+            window: frame[window[0] : window[1], window[2] : window[3]].copy()
+            for window in TASK_WINDOWS[task]
+        }
+        self._tails[task].append((frame_number, crops))
+
+    def flush(self) -> None:
+        """
+        閉じていない区間を全て保存する(検出パスの最後に呼ぶ)
+        """
+        for task in list(self._tails.keys()):
+            self._commit(task)
+        self._last_frame_numbers = {}
+
+    def _commit(self, task: str) -> None:
+        tail = self._tails.get(task)
+        if not tail:
+            return
+        for frame_number, crops in tail:
+            if frame_number in self.dropped_frame_numbers:
+                continue
+            encoded_crops = {}
+            for window, crop in crops.items():
+                if window in self._crops.get(frame_number, {}):
+                    continue
+                _, buffer = cv2.imencode(".png", crop, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+                encoded_crops[window] = buffer.tobytes()
+            size = sum(len(v) for v in encoded_crops.values())
+            if self.stored_bytes + size > self.max_bytes:
+                # 一部の ROI だけが残ると抽出結果が変わるので、フレームごと破棄する
+                self._discard(frame_number)
+                continue
+            self._crops.setdefault(frame_number, {}).update(encoded_crops)
+            self.stored_bytes += size
+        tail.clear()
+
+    def _discard(self, frame_number: int) -> None:
+        self.dropped_frame_numbers.add(frame_number)
+        for buffer in self._crops.pop(frame_number, {}).values():
+            self.stored_bytes -= len(buffer)
+
+    def merge(self, other: "FrameStore") -> None:
+        """
+        別の FrameStore(シャードごとの検出結果など)の内容を取り込む
+        """
+        other.flush()
+        if self.frame_shape is None:
+            self.frame_shape = other.frame_shape
+            self.frame_dtype = other.frame_dtype
+        for frame_number in other.dropped_frame_numbers:
+            self._discard(frame_number)
+        for frame_number, encoded_crops in other._crops.items():
+            if frame_number in self.dropped_frame_numbers:
+                continue
+            for window, buffer in encoded_crops.items():
+                if window in self._crops.get(frame_number, {}):
+                    continue
+                self._crops.setdefault(frame_number, {})[window] = buffer
+                self.stored_bytes += len(buffer)
+
+    def get(self, frame_number: int) -> Optional[np.ndarray]:
+        """
+        保存した ROI を元の位置に配置したフレームを返す
+
+        ROI 以外の画素は 0 になるので、抽出処理は登録時のウィンドウだけを参照すること
+        """
+        if frame_number not in self or self.frame_shape is None:
+            return None
+        frame = np.zeros(self.frame_shape, dtype=self.frame_dtype)
+        for window, buffer in self._crops[frame_number].items():
+            crop = cv2.imdecode(
+                np.frombuffer(buffer, dtype=np.uint8), cv2.IMREAD_UNCHANGED
+            )
+            frame[window[0] : window[1], window[2] : window[3]] = crop.reshape(
+                frame[window[0] : window[1], window[2] : window[3]].shape
+            )
+        return frame
+
+    def iter_frames(
+        self, frame_numbers: List[int], video_path: str
+    ) -> Iterator[Tuple[int, Optional[np.ndarray]]]:
+        """
+        frame_numbers(昇順)のフレームを返す。保存されていないフレームだけ動画から読む
+        """
+        missing_frames = read_frames(
+            video_path, [i for i in frame_numbers if i not in self]
+        )
+        for frame_number in frame_numbers:
+            if frame_number in self:
+                yield frame_number, self.get(frame_number)
+            else:
+                yield next(missing_frames)
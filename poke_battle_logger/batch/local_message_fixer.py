@@ -0,0 +1,182 @@
+import csv
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from config.config import (
+    LOCAL_MESSAGE_FIX_MOVE_THRESHOLD,
+    LOCAL_MESSAGE_FIX_NAME_THRESHOLD,
+)
+
+from poke_battle_logger.batch.message_correction import (
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+from poke_battle_logger.batch.message_correction_cache import normalize_ocr_message
+from poke_battle_logger.batch.name_index import NameIndex
+
+# 技の英語名の一覧(Pokémon Showdown のデータから作ったもの)
+MOVE_NAMES_PATH = "data/move_names.csv"
+
+# "バドレックス(黒馬)" のようなフォルム名は、メッセージには表示されない
+_FORM_PATTERN = re.compile(r"[(（].*?[)）]")
+# 日本語の文字の間の空白(OCR で文字の間に入る)
+_INTRA_NAME_SPACE_PATTERN = re.compile(r"(?<=[^\x00-\x7f])\s+(?=[^\x00-\x7f])")
+
+_OPPOSING = r"(?P<opposing>The opposing )?"
+_END = r"\s*!$"
+_MOVE = r"(?P<move>.+?)"
+
+# (パターン, 名前がどちらのポケモンか, 修正後のメッセージの形式)
+# side が "auto" の場合は "The opposing " の有無で決める
+MESSAGE_GRAMMAR: Tuple[Tuple["re.Pattern[str]", str, str], ...] = (
+    (
+        re.compile(rf"^{_OPPOSING}(?P<name>.+?)\s*used\s+{_MOVE}{_END}"),
+        "auto",
+        "{opposing}{name} used {move}!",
+    ),
+    (
+        re.compile(rf"^{_OPPOSING}(?P<name>.+?)\s*fainted{_END}"),
+        "auto",
+        "{opposing}{name} fainted!",
+    ),
+    (
+        re.compile(rf"^(?P<trainer>.+?)\s*sent out\s+(?P<name>.+?){_END}"),
+        "opponent",
+        "{trainer} sent out {name}!",
+    ),
+    (
+        re.compile(rf"^Go!\s*(?P<name>.+?){_END}"),
+        "your",
+        "Go! {name}!",
+    ),
+)
+
+
+def strip_form(name: str) -> str:
+    return _FORM_PATTERN.sub("", name).strip()
+
+
+def remove_intra_name_spaces(text: str) -> str:
+    return _INTRA_NAME_SPACE_PATTERN.sub("", text)
+
+
+@lru_cache(maxsize=128)
+def _build_name_index(names: Tuple[str, ...]) -> NameIndex:
+    return NameIndex(names, names)
+
+
+@lru_cache(maxsize=None)
+def load_move_name_index(path: str = MOVE_NAMES_PATH) -> NameIndex:
+    """
+    技の名前の検索(NameIndex は検索する文字列の空白を除くので、技の名前も空白を除いて登録する)
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        move_names = tuple(row["English"] for row in csv.DictReader(f))
+    return NameIndex(tuple(name.replace(" ", "") for name in move_names), move_names)
+
+
+def _candidate_names(*name_groups: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    フォルム名を除いた名前を、重複を除いて先に現れた順に並べる
+    """
+    names: Dict[str, None] = {}
+    for group in name_groups:
+        for name in group:
+            stripped = strip_form(name)
+            if stripped:
+                names.setdefault(stripped, None)
+    return tuple(names)
+
+
+@dataclass
+class LocalMessageFixStats:
+    local: int = 0
+    llm: int = 0
+
+    @property
+    def local_rate(self) -> float:
+        total = self.local + self.llm
+        return self.local / total if total > 0 else 0.0
+
+
+class LocalMessageFixer:
+    """
+    決まった形のメッセージ("X used Y!"、"The opposing X fainted!"、"T sent out X!" など)を
+    文法で解析し、LLM を使わずに修正する
+
+    名前の部分は空白を除き、そちら側のチーム・戦闘に出ているポケモンの中で最も近い名前に、
+    技の部分は技の一覧の中で最も近い名前に置き換える。
+    どの形にも当てはまらない場合や、近い名前・技が無い場合は None を返す(呼び出し元で LLM に送る)
+    """
+
+    def __init__(
+        self,
+        threshold: float = LOCAL_MESSAGE_FIX_NAME_THRESHOLD,
+        move_threshold: float = LOCAL_MESSAGE_FIX_MOVE_THRESHOLD,
+        move_names_path: str = MOVE_NAMES_PATH,
+    ) -> None:
+        self.threshold = threshold
+        self.move_threshold = move_threshold
+        self.move_name_index = load_move_name_index(move_names_path)
+        self.stats = LocalMessageFixStats()
+
+    def _candidates(self, request: BattleMessageRequest, side: str) -> NameIndex:
+        context: BattleMessageContext = request.context
+        if side == "your":
+            names = _candidate_names(
+                (request.your_current_pokemon_name,),
+                context.pre_battle_your_teams,
+                context.pre_battle_your_teams_english,
+            )
+        else:
+            names = _candidate_names(
+                (request.opponent_current_pokemon_name,),
+                context.pre_battle_opponent_teams,
+            )
+        return _build_name_index(names)
+
+    def _parse(self, request: BattleMessageRequest) -> Optional[str]:
+        message = normalize_ocr_message(request.message)
+        for pattern, side, template in MESSAGE_GRAMMAR:
+            match = pattern.match(message)
+            if match is None:
+                continue
+            groups = match.groupdict()
+            if side == "auto":
+                name_side = "opponent" if groups.get("opposing") else "your"
+            else:
+                name_side = side
+            name = self._candidates(request, name_side).search(
+                groups["name"], self.threshold
+            )
+            if name is None:
+                return None
+            move = ""
+            if groups.get("move") is not None:
+                snapped_move = self.move_name_index.search(
+                    groups["move"], self.move_threshold
+                )
+                if snapped_move is None:
+                    return None
+                move = snapped_move
+            fields = {
+                "opposing": groups.get("opposing") or "",
+                "name": name,
+                "move": move,
+                "trainer": remove_intra_name_spaces(groups.get("trainer") or ""),
+            }
+            return template.format(**fields)
+        return None
+
+    def fix(self, request: BattleMessageRequest) -> Optional[str]:
+        """
+        修正後のメッセージを返す。文法で修正できない場合は None
+        """
+        fixed_message = self._parse(request)
+        if fixed_message is None:
+            self.stats.llm += 1
+        else:
+            self.stats.local += 1
+        return fixed_message
@@ -0,0 +1,177 @@
+from dataclasses import dataclass
+from logging import getLogger
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config.config import (
+    MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES,
+    MESSAGE_CORRECTION_MAX_CHUNK_TOKENS,
+)
+
+if TYPE_CHECKING:
+    from poke_battle_logger.batch.local_message_fixer import LocalMessageFixer
+    from poke_battle_logger.batch.message_correction_cache import MessageCorrectionCache
+
+logger = getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BattleMessageContext:
+    """
+    1つの対戦のメッセージで共通のチーム情報
+    """
+
+    pre_battle_your_teams: Tuple[str, ...]
+    pre_battle_your_teams_english: Tuple[str, ...]
+    pre_battle_opponent_teams: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class BattleMessageRequest:
+    """
+    修正する1つのメッセージ(OCR の結果)と、そのフレームで戦闘に出ているポケモン
+    """
+
+    frame_number: int
+    message: str
+    your_current_pokemon_name: str
+    opponent_current_pokemon_name: str
+    context: BattleMessageContext
+
+
+# (1つの対戦のメッセージ, チーム情報) -> frame_number ごとの修正後のメッセージ
+FixBattleMessages = Callable[
+    [Sequence[BattleMessageRequest], BattleMessageContext], Dict[int, str]
+]
+FixBattleMessage = Callable[[BattleMessageRequest], str]
+
+
+def estimate_tokens(request: BattleMessageRequest) -> int:
+    """
+    リクエストに含めるメッセージのトークン数を、多めに見積もる(日本語は1文字1トークン程度)
+    """
+    # 番号や区切りの分
+    overhead = 16
+    return (
+        len(request.message)
+        + len(request.your_current_pokemon_name)
+        + len(request.opponent_current_pokemon_name)
+        + overhead
+    )
+
+
+def split_by_context(
+    requests: Sequence[BattleMessageRequest],
+) -> List[List[BattleMessageRequest]]:
+    """
+    フレーム順に並べ、チーム情報が同じ連続したメッセージ(1つの対戦)ごとに分ける
+    """
+    battles: List[List[BattleMessageRequest]] = []
+    for request in sorted(requests, key=lambda r: r.frame_number):
+        if len(battles) > 0 and battles[-1][-1].context == request.context:
+            battles[-1].append(request)
+        else:
+            battles.append([request])
+    return battles
+
+
+def chunk_requests(
+    requests: Sequence[BattleMessageRequest],
+    max_tokens: int = MESSAGE_CORRECTION_MAX_CHUNK_TOKENS,
+    max_messages: int = MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES,
+) -> List[List[BattleMessageRequest]]:
+    """
+    見積もったトークン数とメッセージ数が上限を超えないように分ける
+    (1つで上限を超えるメッセージは、それだけのチャンクにする)
+    """
+    chunks: List[List[BattleMessageRequest]] = []
+    chunk_tokens = 0
+    for request in requests:
+        tokens = estimate_tokens(request)
+        if (
+            len(chunks) == 0
+            or chunk_tokens + tokens > max_tokens
+            or len(chunks[-1]) >= max_messages
+        ):
+            chunks.append([])
+            chunk_tokens = 0
+        chunks[-1].append(request)
+        chunk_tokens += tokens
+    return chunks
+
+
+class BatchMessageCorrector:
+    """
+    対戦ごとのメッセージを、チャンクに分けてまとめて修正する
+
+    まとめた修正が失敗した場合や、結果が返らなかったメッセージは、1つずつ修正する。
+    cache がある場合は、修正済みのメッセージは送らず、修正した結果を保存する。
+    local_fixer がある場合は、文法で修正できるメッセージは送らない
+    """
+
+    def __init__(
+        self,
+        fix_messages: FixBattleMessages,
+        fix_message: FixBattleMessage,
+        max_chunk_tokens: int = MESSAGE_CORRECTION_MAX_CHUNK_TOKENS,
+        max_chunk_messages: int = MESSAGE_CORRECTION_MAX_CHUNK_MESSAGES,
+        cache: Optional["MessageCorrectionCache"] = None,
+        local_fixer: Optional["LocalMessageFixer"] = None,
+    ) -> None:
+        self.fix_messages = fix_messages
+        self.cache = cache
+        self.local_fixer = local_fixer
+        self.fix_message = fix_message
+        self.max_chunk_tokens = max_chunk_tokens
+        self.max_chunk_messages = max_chunk_messages
+        self.batch_call_count = 0
+        self.fallback_count = 0
+
+    def correct(self, requests: Sequence[BattleMessageRequest]) -> Dict[int, str]:
+        """
+        frame_number ごとの修正後のメッセージを返す(空のメッセージは修正せずに空のまま)
+        """
+        fixed_messages: Dict[int, str] = {}
+        uncached_requests = []
+        for request in requests:
+            if not request.message:
+                fixed_messages[request.frame_number] = ""
+                continue
+            local_message = (
+                self.local_fixer.fix(request) if self.local_fixer is not None else None
+            )
+            if local_message is not None:
+                fixed_messages[request.frame_number] = local_message
+                continue
+            cached_message = self.cache.get(request) if self.cache is not None else None
+            if cached_message is not None:
+                fixed_messages[request.frame_number] = cached_message
+                continue
+            uncached_requests.append(request)
+
+        for battle_requests in split_by_context(uncached_requests):
+            for chunk in chunk_requests(
+                battle_requests, self.max_chunk_tokens, self.max_chunk_messages
+            ):
+                fixed_messages.update(self._correct_chunk(chunk))
+        return fixed_messages
+
+    def _correct_chunk(self, chunk: List[BattleMessageRequest]) -> Dict[int, str]:
+        self.batch_call_count += 1
+        try:
+            fixed_chunk = self.fix_messages(chunk, chunk[0].context)
+        except Exception as e:
+            logger.warning(f"Failed to fix {len(chunk)} messages at once: {e}")
+            fixed_chunk = {}
+
+        fixed_messages: Dict[int, str] = {}
+        for request in chunk:
+            if request.frame_number in fixed_chunk:
+                fixed_messages[request.frame_number] = fixed_chunk[
+                    request.frame_number
+                ].strip()
+            else:
+                self.fallback_count += 1
+                fixed_messages[request.frame_number] = self.fix_message(request).strip()
+            if self.cache is not None:
+                self.cache.put(request, fixed_messages[request.frame_number])
+        return fixed_messages
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from logging import getLogger
+from typing import Optional
+
+from poke_battle_logger.batch.message_correction import BattleMessageRequest
+
+logger = getLogger(__name__)
+
+MESSAGE_CORRECTION_CACHE_DIR = "message_correction_cache"
+DEFAULT_MESSAGE_CORRECTION_CACHE_SIZE = 100000
+
+# キーの作り方を変えたら上げる(モデルやプロンプトの変更は corrector_fingerprint で区別する)
+MESSAGE_CORRECTION_CACHE_VERSION = 2
+
+
+def message_correction_cache_path(trainer_id_in_DB: int) -> str:
+    return os.path.join(MESSAGE_CORRECTION_CACHE_DIR, f"{trainer_id_in_DB}.sqlite3")
+
+
+def normalize_ocr_message(message: str) -> str:
+    """
+    NFC に正規化し、連続する空白を1つにして前後の空白を削除する
+    """
+    return " ".join(unicodedata.normalize("NFC", message).split())
+
+
+def message_correction_key(
+    request: BattleMessageRequest, corrector_fingerprint: str
+) -> str:
+    """
+    修正に使う情報(OCR の結果、チーム、戦闘に出ているポケモン)と、修正の方法
+    (corrector_fingerprint: モデル名とプロンプトのハッシュなど)からキーを作る
+
+    frame_number は修正の結果に影響しないので含めない
+    """
+    payload = json.dumps(
+        [
+            MESSAGE_CORRECTION_CACHE_VERSION,
+            corrector_fingerprint,
+            normalize_ocr_message(request.message),
+            request.context.pre_battle_your_teams,
+            request.context.pre_battle_your_teams_english,
+            request.context.pre_battle_opponent_teams,
+            request.your_current_pokemon_name,
+            request.opponent_current_pokemon_name,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+@dataclass
+class MessageCorrectionCacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class MessageCorrectionCache:
+    """
+    メッセージの修正結果を SQLite に保存し、同じトレーナーの別の対戦・動画でも使い回す
+
+    件数が max_size を超えたら、最後に使った時刻が古いものから削除する。
+    corrector_fingerprint が異なる(モデルやプロンプトを変えた)場合の結果は使わない
+    """
+
+    def __init__(
+        self,
+        path: str,
+        corrector_fingerprint: str,
+        max_size: int = DEFAULT_MESSAGE_CORRECTION_CACHE_SIZE,
+    ) -> None:
+        self.path = path
+        self.corrector_fingerprint = corrector_fingerprint
+        self.max_size = max_size
+        self.stats = MessageCorrectionCacheStats()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # 非同期の修正ではイベントループのスレッドからも書き込むので、ロックで直列化する
+        self._connection = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS message_corrections ("
+                "key TEXT PRIMARY KEY, fixed_message TEXT NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS message_corrections_used_at "
+                "ON message_corrections (used_at)"
+            )
+            self._size = self._connection.execute(
+                "SELECT COUNT(*) FROM message_corrections"
+            ).fetchone()[0]
+
+    def __len__(self) -> int:
+        return int(self._size)
+
+    def get(self, request: BattleMessageRequest) -> Optional[str]:
+        key = message_correction_key(request, self.corrector_fingerprint)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fixed_message FROM message_corrections WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE message_corrections SET used_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.stats.hits += 1
+            return str(row[0])
+
+    def put(self, request: BattleMessageRequest, fixed_message: str) -> None:
+        key = message_correction_key(request, self.corrector_fingerprint)
+        with self._lock:
+            is_new = (
+                self._connection.execute(
+                    "SELECT 1 FROM message_corrections WHERE key = ?", (key,)
+                ).fetchone()
+                is None
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO message_corrections VALUES (?, ?, ?)",
+                (key, fixed_message, time.time()),
+            )
+            if is_new:
+                self._size += 1
+            if self._size > self.max_size:
+                self._connection.execute(
+                    "DELETE FROM message_corrections WHERE key IN ("
+                    "SELECT key FROM message_corrections ORDER BY used_at LIMIT ?)",
+                    (self._size - self.max_size,),
+                )
+                self._size = self.max_size
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,80 @@
+from typing import Dict, Optional, Sequence
+
+import editdistance
+import numpy as np
+
+
+class NameIndex:
+    """
+    名前の一覧に対する正規化編集距離の検索を、候補を絞り込んでから行う
+
+    編集距離は、2つの文字列に共通する文字数(文字ごとの出現回数の min の和)を c として
+    max(len(target) - c, len(name) - c) 以上になる。この下限で閾値を超える名前は、
+    編集距離を計算せずに除外する(結果は一覧を全て調べた場合と同じ)
+    """
+
+    def __init__(self, names: Sequence[str], labels: Sequence[str]) -> None:
+        """
+        names: 検索する名前の一覧
+        labels: 見つかった場合に返す値(names と同じ順)
+        """
+        self.names = names
+        self.labels = labels
+        # 一覧と完全に一致する場合は、編集距離を計算せずに返す(同じ名前は先の行)
+        self.exact_labels: Dict[str, str] = {}
+        for name, label in zip(names, labels):
+            self.exact_labels.setdefault(name, label)
+        self.lengths = np.array([len(name) for name in names], dtype=np.int32)
+        self.char_columns: Dict[str, int] = {}
+        for name in names:
+            for char in name:
+                self.char_columns.setdefault(char, len(self.char_columns))
+        # (名前, 文字) ごとの出現回数
+        self.char_counts = np.zeros(
+            (len(names), len(self.char_columns)), dtype=np.int32
+        )
+        for row, name in enumerate(names):
+            for char in name:
+                self.char_counts[row, self.char_columns[char]] += 1
+
+    def _lower_bounds(self, target: str) -> np.ndarray:
+        target_counts: Dict[int, int] = {}
+        for char in target:
+            column = self.char_columns.get(char)
+            if column is not None:
+                target_counts[column] = target_counts.get(column, 0) + 1
+        if len(target_counts) == 0:
+            common = np.zeros(len(self.names), dtype=np.int32)
+        else:
+            columns = list(target_counts.keys())
+            common = np.minimum(
+                self.char_counts[:, columns],
+                np.array(list(target_counts.values()), dtype=np.int32),
+            ).sum(axis=1)
+        return np.maximum(len(target) - common, self.lengths - common)
+
+    def search(self, target: str, threshold: float) -> Optional[str]:
+        """
+        正規化編集距離(編集距離 / 長い方の文字数)が threshold 未満で最小の名前のラベルを返す
+        (同じ距離の場合は一覧で先の名前。見つからなければ None)
+        """
+        target = target.replace("\n", "").replace(" ", "")
+        exact_label = self.exact_labels.get(target)
+        if exact_label is not None:
+            return exact_label
+        max_lengths = np.maximum(self.lengths, len(target))
+        candidates = np.flatnonzero(
+            self._lower_bounds(target) / max_lengths < threshold
+        )
+        best_row: Optional[int] = None
+        best_score = threshold
+        for row in candidates:
+            score = editdistance.eval(target, self.names[row]) / (
+                max_lengths[row] * 1.00
+            )
+            if score < best_score:
+                best_row = int(row)
+                best_score = score
+        if best_row is None:
+            return None
+        return self.labels[best_row]
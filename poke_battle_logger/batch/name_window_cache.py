@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from logging import getLogger
+from typing import List, Optional, Tuple
+
+import numpy as np
+from config.config import (
+    POKEMON_NAME_WINDOW_THRESHOLD_VALUE1,
+    POKEMON_NAME_WINDOW_THRESHOLD_VALUE2,
+)
+
+from poke_battle_logger.name_registry import POKEMON_NAME_MULTI_LANGUAGE_PATH
+
+logger = getLogger(__name__)
+
+NAME_WINDOW_CACHE_DIR = "name_window_cache"
+DEFAULT_NAME_WINDOW_CACHE_SIZE = 4096
+
+# 名前の認識処理(OCR の前処理や投票方法など)を変えたら上げる
+NAME_WINDOW_CACHE_VERSION = 1
+
+
+def name_window_cache_path(trainer_id_in_DB: int) -> str:
+    return os.path.join(NAME_WINDOW_CACHE_DIR, f"{trainer_id_in_DB}.json")
+
+
+def name_window_key(gray_name_window: np.ndarray) -> str:
+    """
+    OCR にかける2値化画像(濃いとき・薄いとき)から、名前ウィンドウのキーを作る
+
+    OCR の結果は2値化画像だけで決まるので、閾値をまたがない圧縮ノイズなどの違いは同じキーになる
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(gray_name_window.shape).encode())
+    for threshold_value in [
+        POKEMON_NAME_WINDOW_THRESHOLD_VALUE1,
+        POKEMON_NAME_WINDOW_THRESHOLD_VALUE2,
+    ]:
+        binary = gray_name_window > threshold_value
+        digest.update(np.packbits(binary).tobytes())
+    return digest.hexdigest()
+
+
+def name_window_version_key(
+    candidate_langs: List[str],
+    edit_distance_threshold: float,
+    adaptive_langs: bool = False,
+    tiled_ocr: bool = False,
+) -> str:
+    """
+    認識結果が変わりうる要素(OCR の言語、閾値、名前の一覧)から、キャッシュの有効性を判定するキーを作る
+    """
+    digest = hashlib.sha1()
+    digest.update(f"version={NAME_WINDOW_CACHE_VERSION};".encode())
+    digest.update(f"langs={candidate_langs};".encode())
+    digest.update(
+        "thresholds="
+        f"{POKEMON_NAME_WINDOW_THRESHOLD_VALUE1},{POKEMON_NAME_WINDOW_THRESHOLD_VALUE2},"
+        f"{edit_distance_threshold};".encode()
+    )
+    if adaptive_langs:
+        # 途中で打ち切った場合は多数決と結果が変わりうる
+        digest.update("adaptive_langs;".encode())
+    if tiled_ocr:
+        # 並べて OCR すると、1枚ずつの場合と認識結果が変わりうる
+        digest.update("tiled_ocr;".encode())
+    if os.path.exists(POKEMON_NAME_MULTI_LANGUAGE_PATH):
+        with open(POKEMON_NAME_MULTI_LANGUAGE_PATH, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+@dataclass
+class NameWindowCacheStats:
+    hits: int = 0
+    misses: int = 0
+    saved_ocr_calls: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+class NameWindowCache:
+    """
+    名前ウィンドウの認識結果を、2値化画像のハッシュをキーにして LRU で保持する
+
+    path を渡すと load / save でファイルに保存し、同じトレーナーの別の動画でも使い回す
+    (load に渡した version_key が保存時と一致しない場合は読み込まない)
+    テンプレートマッチングで判定した unknown の結果は、ラベル付けで変わりうるので保持しない
+    """
+
+    def __init__(
+        self,
+        max_size: int = DEFAULT_NAME_WINDOW_CACHE_SIZE,
+        path: Optional[str] = None,
+    ) -> None:
+        self.max_size = max_size
+        self.path = path
+        self.version_key = ""
+        self.stats = NameWindowCacheStats()
+        # キー -> (ポケモン名, 認識に使った OCR の回数)
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            self.stats.saved_ocr_calls += entry[1]
+            return entry[0]
+
+    def put(self, key: str, pokemon_name: str, ocr_calls: int) -> None:
+        with self._lock:
+            self._entries[key] = (pokemon_name, ocr_calls)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def load(self, version_key: str) -> None:
+        self.version_key = version_key
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                cache = json.load(f)
+            if cache["version_key"] != self.version_key:
+                logger.info(f"Name window cache is outdated: {self.path}")
+                return
+            entries = [
+                (key, (str(name), int(calls))) for key, name, calls in cache["entries"]
+            ]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Failed to load name window cache {self.path}: {e}")
+            return
+        with self._lock:
+            for key, entry in entries[-self.max_size :]:
+                self._entries[key] = entry
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._lock:
+            # 古い順に保存する(読み込んだときに LRU の順序が戻る)
+            entries = [
+                [key, name, calls] for key, (name, calls) in self._entries.items()
+            ]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(
+                {"version_key": self.version_key, "entries": entries},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp_path, self.path)
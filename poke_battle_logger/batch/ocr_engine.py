@@ -0,0 +1,275 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Tuple,
+    cast,
+)
+
+import numpy as np
+import pytesseract
+
+from poke_battle_logger.batch.tiled_ocr import OCRLine, assign_lines, build_tiled_canvas
+
+try:
+    import tesserocr
+except ImportError:  # libtesseract が無い環境(ローカル開発など)では pytesseract を使う
+    tesserocr = None
+
+# (画像, 言語, ページ分割モード)
+OCRRequest = Tuple[np.ndarray, str, int]
+# (画像のリスト, 言語, ページ分割モード)
+TiledOCRRequest = Tuple[Sequence[np.ndarray], str, int]
+
+
+class OCREngine(Protocol):
+    def recognize(self, image: np.ndarray) -> str:
+        ...
+
+    def recognize_lines(self, image: np.ndarray) -> List[OCRLine]:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class TesseractAPIEngine:
+    """
+    tesserocr(tesseract の C API)で1つの言語・ページ分割モードを認識するエンジン
+
+    言語データの読み込みは初期化時に1回だけ行う。スレッドセーフではないので、
+    同時に複数のスレッドから使わないこと
+    """
+
+    def __init__(self, lang: str, psm: int) -> None:
+        self.api = tesserocr.PyTessBaseAPI(lang=lang, psm=psm)
+
+    def _set_image(self, image: np.ndarray) -> None:
+        # PytesseractEngine と同じく、チャンネルの順序は変えずに渡す
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+        # 一時ファイルを作らず、NumPy のバッファをそのまま渡す
+        self.api.SetImageBytes(
+            image.tobytes(), width, height, bytes_per_pixel, image.strides[0]
+        )
+
+    def recognize(self, image: np.ndarray) -> str:
+        self._set_image(image)
+        return cast(str, self.api.GetUTF8Text())
+
+    def recognize_lines(self, image: np.ndarray) -> List[OCRLine]:
+        self._set_image(image)
+        self.api.Recognize()
+        iterator = self.api.GetIterator()
+        if iterator is None:
+            return []
+        level = tesserocr.RIL.TEXTLINE
+        lines = []
+        for result in tesserocr.iterate_level(iterator, level):
+            box = result.BoundingBox(level)
+            if box is None:
+                continue
+            lines.append((result.GetUTF8Text(level), box[1], box[3]))
+        return lines
+
+    def close(self) -> None:
+        self.api.End()
+
+
+class PytesseractEngine:
+    """
+    tesserocr が使えない場合のエンジン(呼び出しごとに tesseract のプロセスを起動する)
+    """
+
+    def __init__(self, lang: str, psm: int) -> None:
+        self.lang = lang
+        self.config = f"--psm {psm}"
+
+    def recognize(self, image: np.ndarray) -> str:
+        return cast(
+            str, pytesseract.image_to_string(image, lang=self.lang, config=self.config)
+        )
+
+    def recognize_lines(self, image: np.ndarray) -> List[OCRLine]:
+        data = pytesseract.image_to_data(
+            image,
+            lang=self.lang,
+            config=self.config,
+            output_type=pytesseract.Output.DICT,
+        )
+        # 単語を (ブロック, 段落, 行) ごとにまとめる
+        words: Dict[Tuple[int, int, int], List[Tuple[str, int, int]]] = {}
+        for k, text in enumerate(data["text"]):
+            if not text.strip():
+                continue
+            key = (data["block_num"][k], data["par_num"][k], data["line_num"][k])
+            top = data["top"][k]
+            words.setdefault(key, []).append((text, top, top + data["height"][k]))
+        return [
+            (
+                " ".join(text for text, _, _ in line_words),
+                min(top for _, top, _ in line_words),
+                max(bottom for _, _, bottom in line_words),
+            )
+            for line_words in words.values()
+        ]
+
+    def close(self) -> None:
+        pass
+
+
+def create_engine(lang: str, psm: int) -> OCREngine:
+    if tesserocr is not None:
+        return TesseractAPIEngine(lang, psm)
+    return PytesseractEngine(lang, psm)
+
+
+class OCREnginePool:
+    """
+    言語・ページ分割モードごとのエンジンを使い回して OCR する
+
+    image_to_string は呼び出し元のスレッドで、map_image_to_string はコア数の
+    スレッドプールで並列に認識する(tesserocr は認識中に GIL を解放する)。
+    エンジンは使っていないものを貸し出し、言語・ページ分割モードごとに max_workers 個までしか作らない
+    (全て使用中の場合は返却を待つ)。shutdown で全てのエンジンを閉じる
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        engine_factory: Callable[[str, int], OCREngine] = create_engine,
+    ) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.engine_factory = engine_factory
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # (言語, ページ分割モード) ごとの、使っていないエンジンと貸し出せる残りの数
+        self._idle_engines: Dict[Tuple[str, int], List[OCREngine]] = {}
+        self._engine_slots: Dict[Tuple[str, int], threading.BoundedSemaphore] = {}
+        self._engines: List[OCREngine] = []
+
+    @contextmanager
+    def _engine(self, lang: str, psm: int) -> Iterator[OCREngine]:
+        key = (lang, psm)
+        with self._lock:
+            if key not in self._engine_slots:
+                self._engine_slots[key] = threading.BoundedSemaphore(self.max_workers)
+                self._idle_engines[key] = []
+            slots = self._engine_slots[key]
+            idle_engines = self._idle_engines[key]
+        with slots:
+            with self._lock:
+                engine = idle_engines.pop() if idle_engines else None
+            if engine is None:
+                engine = self.engine_factory(lang, psm)
+                with self._lock:
+                    self._engines.append(engine)
+            try:
+                yield engine
+            finally:
+                with self._lock:
+                    idle_engines.append(engine)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="ocr"
+                )
+            return self._executor
+
+    def image_to_string(self, image: np.ndarray, lang: str, psm: int = 6) -> str:
+        with self._engine(lang, psm) as engine:
+            return engine.recognize(image)
+
+    def map_image_to_string(self, requests: Sequence[OCRRequest]) -> List[str]:
+        """
+        複数の画像を並列に OCR し、requests の順に結果を返す
+        """
+        if len(requests) <= 1 or self.max_workers == 1:
+            return [
+                self.image_to_string(image, lang, psm) for image, lang, psm in requests
+            ]
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self.image_to_string, image, lang, psm)
+            for image, lang, psm in requests
+        ]
+        return [future.result() for future in futures]
+
+    def tiled_image_to_string(
+        self, images: Sequence[np.ndarray], lang: str, psm: int = 6
+    ) -> List[str]:
+        """
+        複数の小さな画像を1枚に並べて1回で OCR し、画像ごとのテキストを返す
+
+        画像ごとの OCR に比べて、エンジンの呼び出しとレイアウト解析が1回で済む。
+        行ごとに分けて認識するので、psm は複数行を扱うモード(6 など)にすること
+        """
+        if len(images) == 0:
+            return []
+        if len(images) == 1:
+            return [self.image_to_string(images[0], lang, psm)]
+        canvas, spans = build_tiled_canvas(images)
+        with self._engine(lang, psm) as engine:
+            lines = engine.recognize_lines(canvas)
+        return assign_lines(lines, spans)
+
+    def map_tiled_image_to_string(
+        self, requests: Sequence[TiledOCRRequest]
+    ) -> List[List[str]]:
+        """
+        (画像のリスト, 言語, ページ分割モード) ごとに tiled_image_to_string を並列に行う
+        """
+        if len(requests) <= 1 or self.max_workers == 1:
+            return [
+                self.tiled_image_to_string(images, lang, psm)
+                for images, lang, psm in requests
+            ]
+        executor = self._get_executor()
+        futures = [
+            executor.submit(self.tiled_image_to_string, images, lang, psm)
+            for images, lang, psm in requests
+        ]
+        return [future.result() for future in futures]
+
+    def shutdown(self) -> None:
+        """
+        スレッドプールを止め、作った全てのエンジンを閉じる(その後の OCR ではエンジンを作り直す)
+        """
+        with self._lock:
+            executor = self._executor
+            self._executor = None
+        if executor is not None:
+            executor.shutdown()
+        with self._lock:
+            engines = self._engines
+            self._engines = []
+            self._idle_engines = {}
+            self._engine_slots = {}
+        for engine in engines:
+            engine.close()
+
+
+_ocr_engine_pool: Optional[OCREnginePool] = None
+_ocr_engine_pool_lock = threading.Lock()
+
+
+def get_ocr_engine_pool() -> OCREnginePool:
+    """
+    プロセス内で共有する OCREnginePool を返す
+    """
+    global _ocr_engine_pool
+    with _ocr_engine_pool_lock:
+        if _ocr_engine_pool is None:
+            _ocr_engine_pool = OCREnginePool()
+        return _ocr_engine_pool
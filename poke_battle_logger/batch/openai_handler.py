@@ -1,7 +1,18 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional, Sequence
+
 from langchain.prompts import ChatPromptTemplate
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
 
+from poke_battle_logger.batch.message_correction import (
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+
+OPENAI_MODEL_NAME = "gpt-4.1-mini"
+
 
 class FixedBattleMessage(BaseModel):
     internal_thinking_process: str = Field(
@@ -14,37 +25,22 @@ class FixedBattleMessage(BaseModel):
     )
 
 
-class OpenAIHandler:
-    def __init__(self) -> None:
-        self.model_name = "gpt-4.1-mini"
+class IndexedFixedBattleMessage(BaseModel):  # type: ignore
+    index: int = Field(..., description="修正対象のメッセージの番号")
+    fixed_battle_message: str = Field(
+        ...,
+        description="ポケモン対戦中に表示されるメッセージを修正した結果のテキスト",
+    )
 
-    def fix_battle_message(
-        self,
-        original_message: str,
-        pre_battle_your_teams: list[str],
-        pre_battle_your_teams_english: list[str],
-        pre_battle_opponent_teams: list[str],
-        your_current_pokemon_name: str,
-        opponent_current_pokemon_name: str,
-    ) -> FixedBattleMessage:
-        """ポケモン対戦中に表示されるメッセージを修正する"""
-        model = ChatOpenAI(
-            model=self.model_name,
-        ).with_structured_output(FixedBattleMessage)
 
-        prompt = ChatPromptTemplate.from_template(
-            """
-            ## あなたの役割
-            あなたはポケモン対戦のメッセージを修正するAIです。
-            以下の情報をもとに、ポケモン対戦中に表示されるメッセージを修正してください。
+class FixedBattleMessages(BaseModel):  # type: ignore
+    fixed_battle_messages: list[IndexedFixedBattleMessage] = Field(
+        ...,
+        description="修正対象のメッセージごとの修正結果(全てのメッセージについて1つずつ)",
+    )
 
-            ## 予備情報
-            あなたのチーム: {pre_battle_your_teams}
-            あなたのチーム（英語）: {pre_battle_your_teams_english}
-            相手のチーム: {pre_battle_opponent_teams}
-            あなたの現在のポケモン: {your_current_pokemon_name}
-            相手の現在のポケモン: {opponent_current_pokemon_name}
 
+FIX_BATTLE_MESSAGE_EXAMPLES = """\
             ## 修正例（これらはあくまでも修正例です！)
             ### Case1
             これは opposing とあるので相手のポケモンが倒れた様子です。ポケモン名はキラフロルです。
@@ -78,6 +74,24 @@ class OpenAIHandler:
             - 元のメッセージ: "モニ ミニ ジ sent out コラ イド ン !"
             - 修正後のメッセージ: "モニミニジ sent out コライドン!"
 
+"""
+
+FIX_BATTLE_MESSAGE_PROMPT = (
+    """
+            ## あなたの役割
+            あなたはポケモン対戦のメッセージを修正するAIです。
+            以下の情報をもとに、ポケモン対戦中に表示されるメッセージを修正してください。
+
+            ## 予備情報
+            あなたのチーム: {pre_battle_your_teams}
+            あなたのチーム（英語）: {pre_battle_your_teams_english}
+            相手のチーム: {pre_battle_opponent_teams}
+            あなたの現在のポケモン: {your_current_pokemon_name}
+            相手の現在のポケモン: {opponent_current_pokemon_name}
+
+"""
+    + FIX_BATTLE_MESSAGE_EXAMPLES
+    + """\
             ## 出力形式
             あなたは以下の形式で出力を行います。
             - internal_thinking_process: ポケモン対戦中に表示されるメッセージを修正する際のAIの内部思考過程を説明するテキスト
@@ -85,10 +99,138 @@ class OpenAIHandler:
 
             # 修正対象のメッセージ
             「{original_message}」
-            """,
+"""
+)
+
+FIX_BATTLE_MESSAGES_PROMPT = (
+    """
+            ## あなたの役割
+            あなたはポケモン対戦のメッセージを修正するAIです。
+            以下の情報をもとに、1つの対戦中に表示された複数のメッセージをそれぞれ修正してください。
+
+            ## 予備情報
+            あなたのチーム: {pre_battle_your_teams}
+            あなたのチーム（英語）: {pre_battle_your_teams_english}
+            相手のチーム: {pre_battle_opponent_teams}
+            あなたの現在のポケモン・相手の現在のポケモンは、メッセージごとに示します。
+
+"""
+    + FIX_BATTLE_MESSAGE_EXAMPLES
+    + """\
+            ## 出力形式
+            あなたは以下の形式で出力を行います。
+            - fixed_battle_messages: 修正対象のメッセージごとに、index(メッセージの番号)と
+              fixed_battle_message(修正した結果のテキスト)を1つずつ。できるだけ原型を保ちながら、空白や誤ったポケモン名を修正してください。
+              メッセージを省略したり、まとめたりしないでください。
+
+            # 修正対象のメッセージ(JSON Lines)
+            {original_messages}
+"""
+)
+
+
+def message_correction_fingerprint(model_name: str = OPENAI_MODEL_NAME) -> str:
+    """
+    メッセージの修正に使うモデル・プロンプト・出力形式を表す文字列
+
+    メッセージの修正結果のキャッシュのキーに含め、これらを変えたら以前の結果を使わないようにする
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for prompt in (FIX_BATTLE_MESSAGE_PROMPT, FIX_BATTLE_MESSAGES_PROMPT):
+        digest.update(prompt.encode())
+    for schema in (FixedBattleMessage, FixedBattleMessages):
+        digest.update(json.dumps(schema.model_json_schema(), sort_keys=True).encode())
+    return f"{model_name}:{digest.hexdigest()}"
+
+
+class OpenAIHandler:
+    def __init__(self, base_url: Optional[str] = None) -> None:
+        """
+        base_url: OpenAI 互換 API の URL(テスト用のスタブサーバーなど。None の場合は OpenAI)
+        """
+        self.model_name = OPENAI_MODEL_NAME
+        self.base_url = base_url
+        # クライアントとプロンプトは初回の呼び出しで作り、使い回す
+        self._chains: Dict[str, Any] = {}
+
+    def _get_chain(self, prompt: str, schema: type[BaseModel]) -> Any:
+        if schema.__name__ not in self._chains:
+            model = ChatOpenAI(
+                model=self.model_name,
+                base_url=self.base_url,
+            ).with_structured_output(schema)
+            self._chains[schema.__name__] = (
+                ChatPromptTemplate.from_template(prompt) | model
+            )
+        return self._chains[schema.__name__]
+
+    def _fix_battle_message_inputs(
+        self, request: BattleMessageRequest
+    ) -> Dict[str, Any]:
+        return {
+            "original_message": request.message,
+            "pre_battle_your_teams": list(request.context.pre_battle_your_teams),
+            "pre_battle_your_teams_english": list(
+                request.context.pre_battle_your_teams_english
+            ),
+            "pre_battle_opponent_teams": list(
+                request.context.pre_battle_opponent_teams
+            ),
+            "your_current_pokemon_name": request.your_current_pokemon_name,
+            "opponent_current_pokemon_name": request.opponent_current_pokemon_name,
+        }
+
+    def _fix_battle_messages_inputs(
+        self,
+        requests: Sequence[BattleMessageRequest],
+        context: BattleMessageContext,
+    ) -> Dict[str, Any]:
+        original_messages = "\n".join(
+            json.dumps(
+                {
+                    "index": index,
+                    "message": request.message,
+                    "your_current_pokemon_name": request.your_current_pokemon_name,
+                    "opponent_current_pokemon_name": request.opponent_current_pokemon_name,
+                },
+                ensure_ascii=False,
+            )
+            for index, request in enumerate(requests)
         )
+        return {
+            "original_messages": original_messages,
+            "pre_battle_your_teams": list(context.pre_battle_your_teams),
+            "pre_battle_your_teams_english": list(
+                context.pre_battle_your_teams_english
+            ),
+            "pre_battle_opponent_teams": list(context.pre_battle_opponent_teams),
+        }
 
-        chain = prompt | model
+    def _parse_fixed_battle_messages(
+        self, requests: Sequence[BattleMessageRequest], result: Any
+    ) -> Dict[int, str]:
+        """
+        番号が範囲外・重複した結果は捨てる(返らなかったメッセージは呼び出し元で1つずつ修正する)
+        """
+        typed_result = FixedBattleMessages.model_validate(result)
+        fixed_messages: Dict[int, str] = {}
+        for fixed in typed_result.fixed_battle_messages:
+            if 0 <= fixed.index < len(requests):
+                frame_number = requests[fixed.index].frame_number
+                fixed_messages.setdefault(frame_number, fixed.fixed_battle_message)
+        return fixed_messages
+
+    def fix_battle_message(
+        self,
+        original_message: str,
+        pre_battle_your_teams: list[str],
+        pre_battle_your_teams_english: list[str],
+        pre_battle_opponent_teams: list[str],
+        your_current_pokemon_name: str,
+        opponent_current_pokemon_name: str,
+    ) -> FixedBattleMessage:
+        """ポケモン対戦中に表示されるメッセージを修正する"""
+        chain = self._get_chain(FIX_BATTLE_MESSAGE_PROMPT, FixedBattleMessage)
 
         result = chain.invoke(
             {
@@ -102,3 +244,37 @@ class OpenAIHandler:
         )
         typed_result = FixedBattleMessage.model_validate(result)
         return typed_result
+
+    def fix_battle_messages(
+        self,
+        requests: Sequence[BattleMessageRequest],
+        context: BattleMessageContext,
+    ) -> Dict[int, str]:
+        """
+        1つの対戦のメッセージを1回のリクエストでまとめて修正し、frame_number ごとの結果を返す
+        """
+        chain = self._get_chain(FIX_BATTLE_MESSAGES_PROMPT, FixedBattleMessages)
+        result = chain.invoke(self._fix_battle_messages_inputs(requests, context))
+        return self._parse_fixed_battle_messages(requests, result)
+
+    async def afix_battle_message(self, request: BattleMessageRequest) -> str:
+        """
+        fix_battle_message の非同期版(修正後のメッセージだけを返す)
+        """
+        chain = self._get_chain(FIX_BATTLE_MESSAGE_PROMPT, FixedBattleMessage)
+        result = await chain.ainvoke(self._fix_battle_message_inputs(request))
+        return str(FixedBattleMessage.model_validate(result).fixed_battle_message)
+
+    async def afix_battle_messages(
+        self,
+        requests: Sequence[BattleMessageRequest],
+        context: BattleMessageContext,
+    ) -> Dict[int, str]:
+        """
+        fix_battle_messages の非同期版
+        """
+        chain = self._get_chain(FIX_BATTLE_MESSAGES_PROMPT, FixedBattleMessages)
+        result = await chain.ainvoke(
+            self._fix_battle_messages_inputs(requests, context)
+        )
+        return self._parse_fixed_battle_messages(requests, result)
@@ -1,23 +1,57 @@
 import logging
 import os
 from collections import Counter
+from dataclasses import dataclass, field
 from logging import getLogger
-from typing import List, Tuple, cast
+from typing import Callable, Dict, List, Optional, Tuple, cast
 
-import cv2
+import numpy as np
 import resend
 import yt_dlp
+from config.config import (
+    MESSAGE_CORRECTION_MAX_CONCURRENCY,
+    MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+)
 from resend import Emails
 from rich.logging import RichHandler
 
+from poke_battle_logger.batch.async_message_correction import (
+    AsyncMessageCorrectionStage,
+)
 from poke_battle_logger.batch.data_builder import DataBuilder
+from poke_battle_logger.batch.detection_cache import (
+    detection_cache_path,
+    detector_version_key,
+    load_detection_cache,
+    save_detection_cache,
+)
 from poke_battle_logger.batch.extractor import Extractor
 from poke_battle_logger.batch.frame_compressor import (
+    MESSAGE_FRAME_SEQUENCE_THRESHOLD,
     frame_compress,
     message_frame_compress,
 )
 from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_reader import build_dispatch_table, read_frames
+from poke_battle_logger.batch.frame_scanner import scan_video, scan_video_sharded
+from poke_battle_logger.batch.frame_store import TASK_WINDOWS, FrameStore
+from poke_battle_logger.batch.local_message_fixer import LocalMessageFixer
+from poke_battle_logger.batch.message_correction import (
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+from poke_battle_logger.batch.message_correction_cache import (
+    MessageCorrectionCache,
+    message_correction_cache_path,
+)
+from poke_battle_logger.batch.name_window_cache import (
+    NameWindowCache,
+    name_window_cache_path,
+)
+from poke_battle_logger.batch.openai_handler import message_correction_fingerprint
 from poke_battle_logger.batch.pokemon_extractor import PokemonExtractor
+from poke_battle_logger.batch.streaming_pipeline import StreamingBattlePipeline
 from poke_battle_logger.database.database_handler import DatabaseHandler
 from poke_battle_logger.firestore_handler import FirestoreHandler
 from poke_battle_logger.gcs_handler import GCSHandler
@@ -38,6 +72,33 @@ logging.basicConfig(
 logger = getLogger(__name__)
 
 
+@dataclass
+class BattleExtractionResults:
+    """
+    フレームごとの抽出結果
+
+    ストリーミング処理では複数のスレッドから書き込まれるので、フレーム順に並べ直して使う
+    """
+
+    first_rank_numbers: Dict[int, int] = field(default_factory=dict)
+    ranking_rank_numbers: Dict[int, int] = field(default_factory=dict)
+    pokemon_select_order: Dict[int, List[int]] = field(default_factory=dict)
+    pre_battle_pokemons: Dict[int, Dict[str, List[str]]] = field(default_factory=dict)
+    is_exist_unknown_pokemon_list1: List[bool] = field(default_factory=list)
+    battle_pokemons: List[Dict[str, str | int]] = field(default_factory=list)
+    is_exist_unknown_pokemon_list2: List[bool] = field(default_factory=list)
+    pre_win_or_lost: Dict[int, str] = field(default_factory=dict)
+    messages: Dict[int, str] = field(default_factory=dict)
+    # batch_message_correction の場合の、修正前のメッセージ
+    message_requests: List[BattleMessageRequest] = field(default_factory=list)
+    move_infos: Dict[int, Dict[str, str]] = field(default_factory=dict)
+
+    def get_rank_numbers(self) -> Dict[int, int]:
+        # 同じフレームでは ranking の結果を優先する(逐次処理での上書きと同じ)
+        rank_numbers = {**self.first_rank_numbers, **self.ranking_rank_numbers}
+        return dict(sorted(rank_numbers.items()))
+
+
 class PokemonBattleExtractor:
     """
     API でポケモンの対戦動画から情報を抽出するクラス
@@ -50,12 +111,86 @@ class PokemonBattleExtractor:
         trainer_id_in_DB: int,
         email: str,
         final_result: int | None,
+        decode_once: bool = True,
+        detection_workers: int = 1,
+        scan_strides: Optional[Dict[str, int]] = None,
+        detection_batch_size: int = 1,
+        scene_grammar: bool = False,
+        use_detection_cache: bool = False,
+        streaming: bool = False,
+        extraction_workers: int = 2,
+        change_detection: bool = False,
+        frame_source: str = "opencv",
+        max_height: int = 1080,
+        use_name_window_cache: bool = False,
+        adaptive_name_langs: bool = False,
+        tiled_ocr: bool = False,
+        batch_message_correction: bool = False,
+        async_message_correction: bool = False,
+        message_correction_concurrency: int = MESSAGE_CORRECTION_MAX_CONCURRENCY,
+        message_correction_rate: float = MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+        use_message_correction_cache: bool = False,
+        local_message_fixer: bool = False,
     ) -> None:
+        """
+        decode_once: 検出パスで抽出に必要な ROI を保存し、動画のデコードを1回で済ませる
+        detection_workers: 2 以上の場合、フレーム区間を分割して複数プロセスで検出する
+            (scene_grammar / change_detection の場合は分割しない)
+        scan_strides: 検出器ごとに何フレームおきに判定するか(None の場合は全フレーム判定)
+        detection_batch_size: 2 以上の場合、そのフレーム数ずつまとめてテンプレートマッチングする
+        scene_grammar: 画面遷移に沿って、次に現れうる画面の検出器だけを評価する
+            (検出器の評価回数は半分程度になる。対戦中の3つの検出器は毎フレーム評価する)
+        use_detection_cache: 検出結果を video_id ごとに(ローカルと GCS に)保存し、再実行時は検出を省略する
+        streaming: デコード・検出・抽出を並行に動かし、区間が確定したフレームから抽出する
+            (detection_workers は検出用のスレッド数になり、scan_strides などは使わない)
+        extraction_workers: streaming の場合に、順序に依存しない抽出を行うスレッド数
+        change_detection: 検出器のウィンドウが変化していないフレームは、前回の判定結果を使い回す
+        frame_source: 検出パスのデコード方法("opencv" または "ffmpeg")。"ffmpeg" の場合は
+            必要なウィンドウだけを ffmpeg で切り出してデコードする
+        max_height: YouTube からダウンロードする動画の最大の高さ(720 にするとデコードが軽くなる)
+        use_name_window_cache: 対戦中の名前ウィンドウの認識結果をトレーナーごとに保存し、
+            同じウィンドウは OCR を省略する
+        adaptive_name_langs: 名前ウィンドウの OCR を、自分・相手それぞれで直近に名前が
+            見つかった言語から行い、見つかった時点で残りの言語を省略する
+        tiled_ocr: 同じフレームの複数の小さな画像を1枚に並べて、1回で OCR する
+        batch_message_correction: メッセージの修正をフレームごとに行わず、抽出後に
+            対戦ごとにまとめて OpenAI API に送る
+        async_message_correction: メッセージの修正を別スレッドのイベントループで並行に行い、
+            抽出のループが API の応答を待たないようにする(batch_message_correction と併用可)
+        message_correction_concurrency: async_message_correction の同時リクエスト数
+        message_correction_rate: async_message_correction の1秒あたりのリクエスト数
+        use_message_correction_cache: メッセージの修正結果をトレーナーごとに保存し、
+            同じメッセージ・チーム・戦闘中のポケモンの組み合わせは API に送らない
+        local_message_fixer: 決まった形のメッセージ("X used Y!" など)は文法で修正し、
+            文法で修正できないメッセージだけを API に送る
+        """
         self.video_id = video_id
         self.language = language
         self.trainer_id_in_DB = trainer_id_in_DB
         self.email = email
         self.final_result = final_result
+        self.decode_once = decode_once
+        self.detection_workers = detection_workers
+        self.scan_strides = scan_strides
+        self.detection_batch_size = detection_batch_size
+        self.scene_grammar = scene_grammar
+        self.use_detection_cache = use_detection_cache
+        self.streaming = streaming
+        self.extraction_workers = extraction_workers
+        self.change_detection = change_detection
+        self.frame_source = frame_source
+        self.max_height = max_height
+        self.use_name_window_cache = use_name_window_cache
+        self.adaptive_name_langs = adaptive_name_langs
+        self.tiled_ocr = tiled_ocr
+        self.batch_message_correction = batch_message_correction
+        self.async_message_correction = async_message_correction
+        self.message_correction_concurrency = message_correction_concurrency
+        self.message_correction_rate = message_correction_rate
+        self.message_correction_stage: Optional[AsyncMessageCorrectionStage] = None
+        self.use_message_correction_cache = use_message_correction_cache
+        self.local_message_fixer = local_message_fixer
+        self.video_path = f"video/{self.video_id}.mp4"
         self.gcs_handler = GCSHandler()
         self.firestore_handler = FirestoreHandler()
         self.database_handler = DatabaseHandler()
@@ -72,18 +207,18 @@ class PokemonBattleExtractor:
             self.gcs_handler.download_video_from_gcs(
                 trainer_id_in_DB=self.trainer_id_in_DB,
                 video_id=self.video_id,
-                local_path=f"video/{self.video_id}.mp4",
+                local_path=self.video_path,
             )
             return
         # あれば、それを video/{video_id}.mp4 にダウンロードする
         # なければ、youtube からダウンロードする
 
         # download youtube video use yt-dlp
-        # setting: 1080p, 30fps, mp4, video only(音声なし)
+        # setting: max_height(1080p or 720p), 30fps, mp4, video only(音声なし)
         # output: video/{video_id}.mp4
         yt_dlp_opts = {
-            "format": "bestvideo[height<=1080][fps<=30][ext=mp4]",
-            "outtmpl": f"video/{self.video_id}.mp4",
+            "format": f"bestvideo[height<={self.max_height}][fps<=30][ext=mp4]",
+            "outtmpl": self.video_path,
             "quiet": True,
         }
 
@@ -94,7 +229,7 @@ class PokemonBattleExtractor:
         self.gcs_handler.upload_video_to_gcs(
             trainer_id_in_DB=self.trainer_id_in_DB,
             video_id=self.video_id,
-            local_path=f"video/{self.video_id}.mp4",
+            local_path=self.video_path,
         )
 
         self.database_handler.update_video_process_status(
@@ -127,6 +262,212 @@ class PokemonBattleExtractor:
             opponent_current_pokemon_name,
         )
 
+    def _extract_frame(
+        self,
+        task: str,
+        i: int,
+        frame: np.ndarray,
+        extractor: Extractor,
+        pokemon_extractor: PokemonExtractor,
+        results: BattleExtractionResults,
+    ) -> None:
+        """
+        検出結果の種類に応じて、1フレームから情報を抽出して results に保存する
+        """
+        # 開始時のランクを検出(OCR)
+        if task == "first_ranking":
+            logger.info(f"Extracting first ranking... {self.video_id}")
+            results.first_rank_numbers[i] = extractor.extract_first_rank_number(frame)
+
+        # ランクを検出(OCR)
+        elif task == "ranking":
+            results.ranking_rank_numbers[i] = extractor.extract_rank_number(frame)
+
+        # 選出順の抽出
+        elif task == "select_done":
+            results.pokemon_select_order[i] = extractor.extract_pokemon_select_numbers(
+                frame
+            )
+
+        # 6vs6のポケモンを抽出する
+        elif task == "standing_by":
+            # 対戦ごとに相手が変わるので、相手の名前ウィンドウの言語の履歴を消す
+            extractor.pokemon_name_window_extractor.start_battle()
+            (
+                your_pokemon_names,
+                opponent_pokemon_names,
+                _is_exist_unknown_pokemon,
+            ) = pokemon_extractor.extract_pre_battle_pokemons(frame)
+            results.pre_battle_pokemons[i] = {
+                "your_pokemon_names": your_pokemon_names,
+                "opponent_pokemon_names": opponent_pokemon_names,
+            }
+            results.is_exist_unknown_pokemon_list1.append(_is_exist_unknown_pokemon)
+
+        # 対戦中のポケモンを抽出する
+        elif task == "level_50":
+            (
+                your_pokemon_name,
+                opponent_pokemon_name,
+                _is_exist_unknown_pokemon,
+            ) = extractor.extract_pokemon_name_in_battle(frame)
+            results.battle_pokemons.append(
+                {
+                    "frame_number": i,
+                    "your_pokemon_name": your_pokemon_name,
+                    "opponent_pokemon_name": opponent_pokemon_name,
+                },
+            )
+            results.is_exist_unknown_pokemon_list2.append(_is_exist_unknown_pokemon)
+
+        # 勝ち負けを検出
+        elif task == "win_or_lost":
+            results.pre_win_or_lost[i] = extractor.extract_win_or_lost(frame)
+
+        # メッセージの文字認識(OCR)
+        elif task == "message_window":
+            (
+                pre_battle_your_teams,
+                pre_battle_opponent_teams,
+                your_current_pokemon_name,
+                opponent_current_pokemon_name,
+            ) = self._get_current_teams_and_pokemons(
+                results.pre_battle_pokemons, results.battle_pokemons
+            )
+            # を行う前に、自分のチームのポケモン名に英語を対応させる
+            pre_battle_your_teams_english = [
+                get_pokemon_english_name_from_japanese(name)
+                for name in pre_battle_your_teams
+            ]
+
+            if self.batch_message_correction or self.async_message_correction:
+                _recognized_message = extractor.recognize_message(frame)
+                if _recognized_message is not None:
+                    _request = BattleMessageRequest(
+                        frame_number=i,
+                        message=_recognized_message,
+                        your_current_pokemon_name=your_current_pokemon_name,
+                        opponent_current_pokemon_name=opponent_current_pokemon_name,
+                        context=BattleMessageContext(
+                            tuple(pre_battle_your_teams),
+                            tuple(pre_battle_your_teams_english),
+                            tuple(pre_battle_opponent_teams),
+                        ),
+                    )
+                    if self.message_correction_stage is not None:
+                        self.message_correction_stage.submit(_request)
+                    else:
+                        results.message_requests.append(_request)
+                return
+
+            _message = extractor.extract_message(
+                frame,
+                pre_battle_your_teams=pre_battle_your_teams,
+                pre_battle_your_teams_english=pre_battle_your_teams_english,
+                pre_battle_opponent_teams=pre_battle_opponent_teams,
+                your_current_pokemon_name=your_current_pokemon_name,
+                opponent_current_pokemon_name=opponent_current_pokemon_name,
+            )
+            if _message is not None:
+                results.messages[i] = _message
+
+        # 技選択の文字認識
+        elif task == "move":
+            _move = extractor.extract_move(frame)
+            if _move is not None:
+                # your_pokemon_name, opponent_pokemon_name, move_name
+                results.move_infos[i] = _move
+
+    def _scan_frames(
+        self,
+        frame_detector: FrameDetector,
+        frame_store: Optional[FrameStore],
+        extract: Callable[[str, int, np.ndarray], None],
+    ) -> Tuple[Dict[str, List[int]], int]:
+        if self.streaming:
+            return StreamingBattlePipeline(
+                self.video_path,
+                self.language,
+                extract,
+                detector_threads=self.detection_workers,
+                extraction_workers=self.extraction_workers,
+            ).run()
+        if self.detection_workers > 1:
+            return scan_video_sharded(
+                self.video_path,
+                self.language,
+                self.detection_workers,
+                frame_store=frame_store,
+                strides=self.scan_strides,
+                batch_size=self.detection_batch_size,
+                scene_grammar=self.scene_grammar,
+                change_detection=self.change_detection,
+                frame_source=self.frame_source,
+            )
+        return scan_video(
+            self.video_path,
+            frame_detector,
+            frame_store=frame_store,
+            strides=self.scan_strides,
+            batch_size=self.detection_batch_size,
+            scene_grammar=self.scene_grammar,
+            change_detection=self.change_detection,
+            frame_source=self.frame_source,
+        )
+
+    def _detect_frames(
+        self,
+        frame_detector: FrameDetector,
+        frame_store: Optional[FrameStore],
+        extract: Callable[[str, int, np.ndarray], None],
+    ) -> Tuple[Dict[str, List[int]], int, bool]:
+        """
+        検出結果のキャッシュ(ローカル、なければ GCS)があればそれを使い、なければ検出して保存する
+
+        キャッシュを使った場合 frame_store は空のままなので、抽出時に必要なフレームだけを
+        動画から読み直す。ストリーミング処理で検出した場合は抽出も済んでいるので、
+        3つ目の返り値を True にする
+        """
+        if not self.use_detection_cache:
+            return (
+                *self._scan_frames(frame_detector, frame_store, extract),
+                self.streaming,
+            )
+
+        cache_path = detection_cache_path(self.video_id)
+        # ストリーミング処理は全フレームを1フレームずつ判定する
+        version_key = detector_version_key(
+            frame_detector,
+            strides=None if self.streaming else self.scan_strides,
+            scene_grammar=self.scene_grammar and not self.streaming,
+            change_detection=self.change_detection and not self.streaming,
+            frame_source="opencv" if self.streaming else self.frame_source,
+        )
+        if not os.path.exists(cache_path):
+            try:
+                self.gcs_handler.download_detection_cache_from_gcs(
+                    video_id=self.video_id, local_path=cache_path
+                )
+            except Exception as e:
+                logger.warning(f"Failed to download detection cache: {e}")
+        cached = load_detection_cache(cache_path, version_key)
+        if cached is not None:
+            logger.info(f"Use detection cache... {self.video_id}")
+            return (*cached, False)
+
+        detected_frames, total_frames = self._scan_frames(
+            frame_detector, frame_store, extract
+        )
+        try:
+            save_detection_cache(cache_path, detected_frames, total_frames, version_key)
+            self.gcs_handler.upload_detection_cache_to_gcs(
+                video_id=self.video_id, local_path=cache_path
+            )
+        except Exception as e:
+            # キャッシュの保存に失敗しても抽出は続ける
+            logger.warning(f"Failed to save detection cache: {e}")
+        return detected_frames, total_frames, self.streaming
+
     def run(self) -> Tuple[int, int, int]:
         self.database_handler.update_video_process_status(
             trainer_id_in_DB=self.trainer_id_in_DB,
@@ -146,72 +487,62 @@ class PokemonBattleExtractor:
             video_id=self.video_id, new_message="INFO: Read Video..."
         )
 
-        frame_detector = FrameDetector(self.language)
-        extractor = Extractor(self.language)
+        # 動画の解像度に合わせて検出器のウィンドウとテンプレートを変換する
+        frame_detector = FrameDetector(
+            self.language, FrameGeometry.from_video(self.video_path)
+        )
+        name_window_cache = (
+            NameWindowCache(path=name_window_cache_path(self.trainer_id_in_DB))
+            if self.use_name_window_cache
+            else None
+        )
+        message_correction_cache = (
+            MessageCorrectionCache(
+                message_correction_cache_path(self.trainer_id_in_DB),
+                message_correction_fingerprint(),
+            )
+            if self.use_message_correction_cache
+            else None
+        )
+        local_message_fixer = LocalMessageFixer() if self.local_message_fixer else None
+        extractor = Extractor(
+            self.language,
+            name_window_cache,
+            self.adaptive_name_langs,
+            self.tiled_ocr,
+            message_correction_cache,
+            local_message_fixer,
+        )
         pokemon_extractor = PokemonExtractor()
-
-        first_ranking_frames = []
-        select_done_frames = []
-        standing_by_frames = []
-        level_50_frames = []
-        ranking_frames = []
-        win_or_lost_frames = []
-        message_window_frames = []
-        move_frames = []
+        if self.async_message_correction:
+            self.message_correction_stage = extractor.create_message_correction_stage(
+                self.batch_message_correction,
+                self.message_correction_concurrency,
+                self.message_correction_rate,
+            ).start()
 
         self.firestore_handler.update_log_document(
             video_id=self.video_id, new_message="INFO: Detecting frames..."
         )
         logger.info(f"Detecting frames... {self.video_id}")
 
-        video = cv2.VideoCapture(f"video/{self.video_id}.mp4")
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-        for i in range(total_frames):
-            ret, frame = video.read()
-            if ret:
-                # message window
-                if frame_detector.is_message_window_frame(frame):
-                    message_window_frames.append(i)
-                    continue
-
-                # level_50
-                if frame_detector.is_level_50_frame(frame):
-                    level_50_frames.append(i)
-
-                    # level_50 と move は同時に検出されるべき
-                    if frame_detector.is_move_frame(frame):
-                        move_frames.append(i)
-                        continue
-
-                    continue
-
-                # first ranking
-                if frame_detector.is_first_ranking_frame(frame):
-                    first_ranking_frames.append(i)
-                    continue
-
-                # select done
-                if frame_detector.is_select_done_frame(frame):
-                    select_done_frames.append(i)
-                    continue
-
-                # standing_by
-                if frame_detector.is_standing_by_frame(frame):
-                    standing_by_frames.append(i)
-                    continue
-
-                # ranking
-                if frame_detector.is_ranking_frame(frame):
-                    ranking_frames.append(i)
-                    continue
-
-                # win_or_lost
-                if frame_detector.is_win_or_lost_frame(frame):
-                    win_or_lost_frames.append(i)
-                    continue
-            else:
-                continue
-        video.release()
+        frame_store = FrameStore() if self.decode_once and not self.streaming else None
+        results = BattleExtractionResults()
+        detected_frames, total_frames, is_extracted = self._detect_frames(
+            frame_detector,
+            frame_store,
+            lambda task, i, frame: self._extract_frame(
+                task, i, frame, extractor, pokemon_extractor, results
+            ),
+        )
+        first_ranking_frames = detected_frames["first_ranking"]
+        select_done_frames = detected_frames["select_done"]
+        standing_by_frames = detected_frames["standing_by"]
+        level_50_frames = detected_frames["level_50"]
+        ranking_frames = detected_frames["ranking"]
+        win_or_lost_frames = detected_frames["win_or_lost"]
+        message_window_frames = detected_frames["message_window"]
+        move_frames = detected_frames["move"]
 
         # compress
         self.firestore_handler.update_log_document(
@@ -228,20 +559,10 @@ class PokemonBattleExtractor:
         compressed_ranking_frames = frame_compress(ranking_frames)
         compressed_win_or_lost_frames = frame_compress(win_or_lost_frames)
         compressed_message_window_frames = message_frame_compress(
-            message_window_frames, frame_threshold=3
+            message_window_frames, frame_threshold=MESSAGE_FRAME_SEQUENCE_THRESHOLD
         )
         compressed_move_frames = frame_compress(move_frames)
 
-        video = cv2.VideoCapture(f"video/{self.video_id}.mp4")
-        total_frames = int(video.get(cv2.CAP_PROP_FRAME_COUNT))
-
-        rank_numbers = {}
-        pokemon_select_order = {}
-        pre_battle_pokemons: dict[int, dict[str, list[str]]] = {}
-        is_exist_unknown_pokemon_list1 = []
-        battle_pokemons: list[dict[str, str | int]] = []
-        is_exist_unknown_pokemon_list2 = []
-
         first_ranking_frame_number = compressed_first_ranking_frames[0][-5]
         # first_ranking_frame_number = 0
         ranking_frame_numbers = [v[-5] for v in compressed_ranking_frames]
@@ -251,7 +572,6 @@ class PokemonBattleExtractor:
         level_50_frames = [v[-2] for v in compressed_level_50_frames]
 
         move_frame_numbers = [v[-2] for v in compressed_move_frames]
-        move_infos: dict[int, dict[str, str]] = {}
 
         standing_by_frames = []
         for i in range(len(compressed_standing_by_frames)):
@@ -261,109 +581,120 @@ class PokemonBattleExtractor:
             standing_by_frames.append(_standing_by_frames[-1])
 
         win_or_lost = {}
-        pre_win_or_lost = {}
         win_or_lost_all_frames: list[int] = sum(compressed_win_or_lost_frames, [])
-        messages = {}
         message_window_frames = [v[-1] for v in compressed_message_window_frames]
 
-        video = cv2.VideoCapture(f"video/{self.video_id}.mp4")
-        for i in range(total_frames):
-            ret, frame = video.read()
-            # 開始時のランクを検出(OCR)
-            if i == first_ranking_frame_number:
-                logger.info(f"Extracting first ranking... {self.video_id}")
-                _first_ranking_frame = frame
-                rank_numbers[
-                    first_ranking_frame_number
-                ] = extractor.extract_first_rank_number(_first_ranking_frame)
-
-            # ランクを検出(OCR)
-            if i in ranking_frame_numbers:
-                _ranking_frame = frame
-                rank_numbers[i] = extractor.extract_rank_number(_ranking_frame)
-
-            # 選出順の抽出
-            if i in select_done_frames:
-                _select_done_frame = frame
-                pokemon_select_order[i] = extractor.extract_pokemon_select_numbers(
-                    _select_done_frame
-                )
+        # 同じフレームではこの順に抽出する(message は standing_by / level_50 の結果を使う)
+        extraction_targets = [
+            ("first_ranking", [first_ranking_frame_number]),
+            ("ranking", ranking_frame_numbers),
+            ("select_done", select_done_frames),
+            ("standing_by", standing_by_frames),
+            ("level_50", level_50_frames),
+            ("win_or_lost", win_or_lost_all_frames),
+            ("message_window", message_window_frames),
+            ("move", move_frame_numbers),
+        ]
 
-            # 6vs6のポケモンを抽出する
-            if i in standing_by_frames:
-                _standing_by_frame = frame
-                (
-                    your_pokemon_names,
-                    opponent_pokemon_names,
-                    _is_exist_unknown_pokemon,
-                ) = pokemon_extractor.extract_pre_battle_pokemons(_standing_by_frame)
-                pre_battle_pokemons[i] = {
-                    "your_pokemon_names": your_pokemon_names,
-                    "opponent_pokemon_names": opponent_pokemon_names,
-                }
-                is_exist_unknown_pokemon_list1.append(_is_exist_unknown_pokemon)
-
-            # 対戦中のポケモンを抽出する
-            if i in level_50_frames:
-                _level_50_frame = frame
-                (
-                    your_pokemon_name,
-                    opponent_pokemon_name,
-                    _is_exist_unknown_pokemon,
-                ) = extractor.extract_pokemon_name_in_battle(_level_50_frame)
-                battle_pokemons.append(
-                    {
-                        "frame_number": i,
-                        "your_pokemon_name": your_pokemon_name,
-                        "opponent_pokemon_name": opponent_pokemon_name,
-                    },
+        if not is_extracted:
+            # 抽出するフレームだけを昇順に読む
+            dispatch_table = build_dispatch_table(extraction_targets)
+            if frame_store is not None:
+                # 検出パスで保存した ROI から抽出する(動画を再度デコードしない)
+                frames = frame_store.iter_frames(
+                    list(dispatch_table.keys()), self.video_path
                 )
-                is_exist_unknown_pokemon_list2.append(_is_exist_unknown_pokemon)
-
-            # 勝ち負けを検出
-            if i in win_or_lost_all_frames:
-                _win_or_lost_frame = frame
-                win_or_lost_result = extractor.extract_win_or_lost(_win_or_lost_frame)
-                pre_win_or_lost[i] = win_or_lost_result
-
-            # メッセージの文字認識(OCR)
-
-            if i in message_window_frames:
-                _message_frame = frame
-                (
-                    pre_battle_your_teams,
-                    pre_battle_opponent_teams,
-                    your_current_pokemon_name,
-                    opponent_current_pokemon_name,
-                ) = self._get_current_teams_and_pokemons(
-                    pre_battle_pokemons, battle_pokemons
+            else:
+                frames = read_frames(self.video_path, list(dispatch_table.keys()))
+            for i, frame in frames:
+                if frame is None:
+                    # デコードできなかったフレーム
+                    continue
+                # 抽出処理は BASE_FRAME_SIZE の座標を使う(抽出で参照するウィンドウだけを変換する)
+                frame = frame_detector.geometry.to_base_windows(
+                    frame,
+                    [
+                        window
+                        for task in dispatch_table[i]
+                        for window in TASK_WINDOWS[task]
+                    ],
                 )
-                # を行う前に、自分のチームのポケモン名に英語を対応させる
-                pre_battle_your_teams_english = [
-                    get_pokemon_english_name_from_japanese(name)
-                    for name in pre_battle_your_teams
-                ]
+                for task in dispatch_table[i]:
+                    self._extract_frame(
+                        task, i, frame, extractor, pokemon_extractor, results
+                    )
+
+        # OCR はここまでなので、tesseract のエンジンを閉じる
+        extractor.ocr_engine_pool.shutdown()
+
+        if name_window_cache is not None:
+            name_window_cache.save()
+            stats = name_window_cache.stats
+            logger.info(
+                f"Name window cache: hit rate {stats.hit_rate:.1%} "
+                f"({stats.hits}/{stats.hits + stats.misses}), "
+                f"saved OCR calls {stats.saved_ocr_calls} {self.video_id}"
+            )
 
-                _message = extractor.extract_message(
-                    _message_frame,
-                    pre_battle_your_teams=pre_battle_your_teams,
-                    pre_battle_your_teams_english=pre_battle_your_teams_english,
-                    pre_battle_opponent_teams=pre_battle_opponent_teams,
-                    your_current_pokemon_name=your_current_pokemon_name,
-                    opponent_current_pokemon_name=opponent_current_pokemon_name,
-                )
-                if _message is not None:
-                    messages[i] = _message
-
-            # 技選択の文字認識
-            if i in move_frame_numbers:
-                _move_frame = frame
-                _move = extractor.extract_move(_move_frame)
-                if _move is not None:
-                    # your_pokemon_name, opponent_pokemon_name, move_name
-                    move_infos[i] = _move
-
-        video.release()
+        if self.adaptive_name_langs:
+            name_window_extractor = extractor.pokemon_name_window_extractor
+            logger.info(
+                "Adaptive name languages: "
+                f"early exit {name_window_extractor.early_exit_count}, "
+                f"full sweep {name_window_extractor.full_sweep_count} {self.video_id}"
+            )
+
+        logger.info(
+            "Rank numbers: "
+            f"digit templates {extractor.rank_digit_template_count}, "
+            f"OCR fallback {extractor.rank_ocr_fallback_count} {self.video_id}"
+        )
+
+        if self.message_correction_stage is not None:
+            logger.info(f"Waiting for message correction... {self.video_id}")
+            results.messages.update(self.message_correction_stage.join())
+            stage = self.message_correction_stage
+            logger.info(
+                f"Message correction: {len(results.messages)} messages, "
+                f"{stage.request_count} requests, {stage.retry_count} retries, "
+                f"{stage.fallback_count} fallbacks {self.video_id}"
+            )
+        elif self.batch_message_correction:
+            logger.info(f"Fixing messages... {self.video_id}")
+            results.messages.update(extractor.fix_messages(results.message_requests))
+            message_corrector = extractor.message_corrector
+            logger.info(
+                f"Message correction: {len(results.message_requests)} messages, "
+                f"{message_corrector.batch_call_count} batch requests, "
+                f"{message_corrector.fallback_count} fallbacks {self.video_id}"
+            )
+
+        if local_message_fixer is not None:
+            routing_stats = local_message_fixer.stats
+            logger.info(
+                f"Local message fixer: {routing_stats.local_rate:.1%} fixed locally "
+                f"({routing_stats.local}/{routing_stats.local + routing_stats.llm}), "
+                f"{routing_stats.llm} routed to LLM {self.video_id}"
+            )
+
+        if message_correction_cache is not None:
+            message_correction_cache.close()
+            correction_stats = message_correction_cache.stats
+            logger.info(
+                f"Message correction cache: hit rate {correction_stats.hit_rate:.1%} "
+                f"({correction_stats.hits}/"
+                f"{correction_stats.hits + correction_stats.misses}) {self.video_id}"
+            )
+
+        rank_numbers = results.get_rank_numbers()
+        pokemon_select_order = dict(sorted(results.pokemon_select_order.items()))
+        pre_battle_pokemons = results.pre_battle_pokemons
+        battle_pokemons = results.battle_pokemons
+        is_exist_unknown_pokemon_list1 = results.is_exist_unknown_pokemon_list1
+        is_exist_unknown_pokemon_list2 = results.is_exist_unknown_pokemon_list2
+        pre_win_or_lost = results.pre_win_or_lost
+        messages = results.messages
+        move_infos = dict(sorted(results.move_infos.items()))
 
         if self.final_result is not None:
             rank_numbers[total_frames] = self.final_result
@@ -1,21 +1,58 @@
 import collections
 import datetime
 import glob
-import re
-from typing import Dict, List, Optional, Tuple, cast
+import threading
+from typing import Dict, List, Optional, Tuple
 
 import cv2
-import editdistance
 import numpy as np
-import pandas as pd
-import pytesseract
 from config.config import (
     POKEMON_NAME_WINDOW_THRESHOLD_VALUE1,
     POKEMON_NAME_WINDOW_THRESHOLD_VALUE2,
     POKEMON_TEMPLATE_MATCHING_THRESHOLD,
 )
 
+from poke_battle_logger.batch.name_index import NameIndex
+from poke_battle_logger.batch.name_window_cache import (
+    NameWindowCache,
+    name_window_key,
+    name_window_version_key,
+)
+from poke_battle_logger.batch.ocr_engine import OCREnginePool, get_ocr_engine_pool
+from poke_battle_logger.name_registry import get_name_registry, normalize_japanese_name
+
 EDIT_DISTANCE_THRESHOLD = 0.5
+# adaptive_langs の場合に、全言語で OCR する前に試す言語の数
+ADAPTIVE_LANG_CANDIDATES = 2
+# 日本語の OCR でよくある読み誤り(normalize_japanese_name した結果 -> 日本語名)
+JAPANESE_OCR_CORRECTIONS = {
+    "八八ダクカミ": "ハバタクカミ",
+    "八人タクカミ": "ハバタクカミ",
+    "八ツサム": "ハッサム",
+    "アクジム": "アグノム",
+}
+
+_name_indexes: Optional[Dict[str, NameIndex]] = None
+_name_indexes_lock = threading.Lock()
+
+
+def get_name_indexes() -> Dict[str, NameIndex]:
+    """
+    編集距離で探す言語ごとの索引(見つかった場合は日本語名を返す)。プロセス内で共有する
+
+    名前の一覧は、レジストリで正規化済みのもの(日本語は OCR の結果と同じ正規化)を使う
+    """
+    global _name_indexes
+    with _name_indexes_lock:
+        if _name_indexes is None:
+            name_registry = get_name_registry()
+            ja_names = name_registry.names("ja")
+            _name_indexes = {
+                lang: NameIndex(name_registry.normalized_names[lang], ja_names)
+                for lang in ["en", "fr", "de", "es", "ko", "zh_HK", "zh"]
+            }
+            _name_indexes["ja"] = NameIndex(name_registry.japanese_ocr_names, ja_names)
+        return _name_indexes
 
 
 class PokemonNameWindowExtractor:
@@ -23,7 +60,27 @@ class PokemonNameWindowExtractor:
     対戦中のウィンドウからポケモンの名前を抽出するクラス
     """
 
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        ocr_engine_pool: Optional[OCREnginePool] = None,
+        name_window_cache: Optional[NameWindowCache] = None,
+        adaptive_langs: bool = False,
+        tiled_ocr: bool = False,
+    ) -> None:
+        """
+        adaptive_langs: 側("your" / "opponent")ごとに名前が見つかった言語を覚えておき、
+            その言語から OCR して、確実に見つかった時点で残りの言語の OCR を省略する
+        tiled_ocr: 濃いとき・薄いときの2値化画像を並べて、言語ごとに1回で OCR する
+        """
+        self.ocr_engine_pool = ocr_engine_pool or get_ocr_engine_pool()
+        self.name_window_cache = name_window_cache
+        self.adaptive_langs = adaptive_langs
+        self.tiled_ocr = tiled_ocr
+        # 側ごとの、名前が見つかった言語(直近に見つかった順)
+        self.lang_history: Dict[str, List[str]] = {}
+        self._lang_history_lock = threading.Lock()
+        self.early_exit_count = 0
+        self.full_sweep_count = 0
         self.tesseract_candidate_langs = [
             "chi_sim",
             "chi_tra",
@@ -35,38 +92,32 @@ class PokemonNameWindowExtractor:
             "spa",
             "deu",
         ]
+        if self.name_window_cache is not None:
+            self.name_window_cache.load(
+                name_window_version_key(
+                    self.tesseract_candidate_langs,
+                    EDIT_DISTANCE_THRESHOLD,
+                    adaptive_langs,
+                    tiled_ocr,
+                )
+            )
         self._setup_multi_lang_list()
         self.battle_pokemon_name_window_templates = (
             self._setup_battle_pokemon_name_window_templates()
         )
-        self.non_CJK_patterns = re.compile(
-            "[^"
-            "\U00003040-\U0000309F"  # Hiragana
-            "\U000030A0-\U000030FF"  # Katakana
-            "\U0000FF65-\U0000FF9F"  # Half width Katakana
-            "\U0000FF10-\U0000FF19"  # Full width digits
-            "\U0000FF21-\U0000FF3A"  # Full width Upper case Alphabets
-            "\U0000FF41-\U0000FF5A"  # Full width Lower case Alphabets
-            "\U00000030-\U00000039"  # Half width digits
-            "\U00000041-\U0000005A"  # Half width Upper case Alphabets
-            "\U00000061-\U0000007A"  # Half width Lower case Alphabets
-            "\U00003190-\U0000319F"  # Kanbun
-            "\U00004E00-\U00009FFF"  # CJK unified ideographs. kanjis
-            "]+",
-            flags=re.UNICODE,
-        )
 
     def _setup_multi_lang_list(self) -> None:
-        multi_lang_names = pd.read_csv("data/pokemon_name_multi_language.csv")
-        self.ja_list = multi_lang_names["ja"].values.tolist()
-        self.en_list = multi_lang_names["en"].values.tolist()
-        self.fr_list = multi_lang_names["fr"].values.tolist()
-        self.de_list = multi_lang_names["de"].values.tolist()
-        self.es_list = multi_lang_names["es"].values.tolist()
-        self.it_list = multi_lang_names["it"].values.tolist()
-        self.ko_list = multi_lang_names["ko"].values.tolist()
-        self.zh_HK_list = multi_lang_names["zh_HK"].values.tolist()
-        self.zh_list = multi_lang_names["zh"].values.tolist()
+        name_registry = get_name_registry()
+        self.ja_list = name_registry.names("ja")
+        self.en_list = name_registry.names("en")
+        self.fr_list = name_registry.names("fr")
+        self.de_list = name_registry.names("de")
+        self.es_list = name_registry.names("es")
+        self.it_list = name_registry.names("it")
+        self.ko_list = name_registry.names("ko")
+        self.zh_HK_list = name_registry.names("zh_HK")
+        self.zh_list = name_registry.names("zh")
+        self.name_indexes = get_name_indexes()
 
     def _setup_battle_pokemon_name_window_templates(self) -> Dict[str, np.ndarray]:
         battle_pokemon_name_window_template_paths = glob.glob(
@@ -112,39 +163,15 @@ class PokemonNameWindowExtractor:
             return "unknown_pokemon", True
         return max(score_results, key=score_results.get), False  # type: ignore
 
-    def _search_name_by_edit_distance(
-        self, name_list: List[str], target: str
-    ) -> Optional[str]:
-        target = target.replace("\n", "").replace(" ", "")
-        scores = {}
-        for idx, _name in enumerate(name_list):
-            _score = editdistance.eval(target, _name) / (
-                max(len(_name), len(target)) * 1.00
-            )
-            if _score < EDIT_DISTANCE_THRESHOLD:
-                scores[self.ja_list[idx]] = _score
-        if len(scores) == 0:
-            return None
-        min_score_name = cast(str, min(scores, key=scores.get))  # type: ignore
-        return min_score_name
+    def _search_name_by_edit_distance(self, column: str, target: str) -> Optional[str]:
+        return self.name_indexes[column].search(target, EDIT_DISTANCE_THRESHOLD)
 
     def _normalize_japanese_ocr_name(self, text: str) -> str:
         """
-        OCRで読み取った日本語の名前から特殊文字を削除する
-        """
-        _text = self.non_CJK_patterns.sub(r"", text)
-        # 空白を削除
-        _text = "".join(_text.split())
-        if _text == "八八ダクカミ":
-            return "ハバタクカミ"
-        elif text == "八人タクカミ":
-            return "ハバタクカミ"
-        elif _text == "八ツサム":
-            return "ハッサム"
-        elif _text == "アクジム":
-            return "アグノム"
-        else:
-            return _text
+        OCRで読み取った日本語の名前から特殊文字を削除し、よくある読み誤りを訂正する
+        """
+        _text = normalize_japanese_name(text)
+        return JAPANESE_OCR_CORRECTIONS.get(_text, _text)
 
     def _normalize_korean_ocr_name(self, text: str) -> str:
         """
@@ -157,81 +184,178 @@ class PokemonNameWindowExtractor:
             return _text
 
     def extract_pokemon_name_in_battle(
-        self, name_window: np.ndarray
+        self, name_window: np.ndarray, side: Optional[str] = None
     ) -> Tuple[str, bool]:
-        results = []
-        _name_results = []
-
-        max_value = 255
+        """
+        side: "your" または "opponent"。adaptive_langs の場合に、どちらの名前ウィンドウかで
+            言語の履歴を分ける
+        """
         gray_name_window = cv2.cvtColor(name_window, cv2.COLOR_RGB2GRAY)
+        if self.name_window_cache is None:
+            name, is_unknown, _ = self._recognize_pokemon_name(
+                gray_name_window, name_window, side
+            )
+            return name, is_unknown
 
-        # 濃いときと薄いときで2回テンプレートマッチングを行う
-        for threshold_value in [
-            POKEMON_NAME_WINDOW_THRESHOLD_VALUE1,
-            POKEMON_NAME_WINDOW_THRESHOLD_VALUE2,
-        ]:
-            _, name_window2 = cv2.threshold(
-                gray_name_window, threshold_value, max_value, cv2.THRESH_BINARY
+        key = name_window_key(gray_name_window)
+        cached_name = self.name_window_cache.get(key)
+        if cached_name is not None:
+            return cached_name, False
+        name, is_unknown, ocr_calls = self._recognize_pokemon_name(
+            gray_name_window, name_window, side
+        )
+        if not is_unknown:
+            self.name_window_cache.put(key, name, ocr_calls)
+        return name, is_unknown
+
+    def _search_name(self, lang: str, text: str) -> Optional[str]:
+        """
+        OCR の結果を、tesseract の言語に対応する名前の一覧から編集距離で探す
+        """
+        if lang == "chi_sim":
+            return self._search_name_by_edit_distance("zh", text)
+        elif lang == "chi_tra":
+            return self._search_name_by_edit_distance("zh_HK", text)
+        elif lang == "eng":
+            return self._search_name_by_edit_distance("en", text)
+        elif lang == "fra":
+            return self._search_name_by_edit_distance("fr", text)
+        elif lang == "jpn":
+            return self._search_name_by_edit_distance(
+                "ja", self._normalize_japanese_ocr_name(text)
             )
+        elif lang == "kor":
+            return self._search_name_by_edit_distance(
+                "ko", self._normalize_korean_ocr_name(text)
+            )
+        elif lang == "spa":
+            return self._search_name_by_edit_distance("es", text)
+        elif lang == "deu":
+            return self._search_name_by_edit_distance("de", text)
+        else:
+            return None
+
+    def _ocr_names(
+        self,
+        name_windows: List[np.ndarray],
+        langs: List[str],
+        ocr_results: Dict[Tuple[int, str], str],
+    ) -> None:
+        """
+        (2値化画像の番号, 言語) のうち、まだ OCR していないものをまとめて並列に OCR する
+        (tiled_ocr の場合は、言語ごとに2値化画像を並べて1回で OCR する)
+        """
+        keys = [
+            (k, lang)
+            for k in range(len(name_windows))
+            for lang in langs
+            if (k, lang) not in ocr_results
+        ]
+        if not self.tiled_ocr:
+            texts = self.ocr_engine_pool.map_image_to_string(
+                [(name_windows[k], lang, 6) for k, lang in keys]
+            )
+            ocr_results.update(zip(keys, texts))
+            return
+
+        indexes_by_lang: Dict[str, List[int]] = {}
+        for k, lang in keys:
+            indexes_by_lang.setdefault(lang, []).append(k)
+        tiled_texts = self.ocr_engine_pool.map_tiled_image_to_string(
+            [
+                ([name_windows[k] for k in indexes], lang, 6)
+                for lang, indexes in indexes_by_lang.items()
+            ]
+        )
+        for (lang, indexes), texts in zip(indexes_by_lang.items(), tiled_texts):
+            ocr_results.update(((k, lang), text) for k, text in zip(indexes, texts))
+
+    def _scheduled_langs(self, side: Optional[str]) -> List[str]:
+        if not self.adaptive_langs or side is None:
+            return []
+        with self._lang_history_lock:
+            return self.lang_history.get(side, [])[:ADAPTIVE_LANG_CANDIDATES]
+
+    def start_battle(self) -> None:
+        """
+        新しい対戦の開始時に、相手の言語の履歴を消す(自分の言語は対戦をまたいで変わらない)
+        """
+        with self._lang_history_lock:
+            self.lang_history.pop("opponent", None)
+
+    def _learn_langs(self, side: Optional[str], langs: List[str]) -> None:
+        """
+        名前が見つかった言語を、その側の履歴の先頭に移す
+        """
+        if not self.adaptive_langs or side is None or len(langs) == 0:
+            return
+        with self._lang_history_lock:
+            history = self.lang_history.setdefault(side, [])
+            for lang in reversed(langs):
+                if lang in history:
+                    history.remove(lang)
+                history.insert(0, lang)
+
+    def _recognize_pokemon_name(
+        self,
+        gray_name_window: np.ndarray,
+        name_window: np.ndarray,
+        side: Optional[str] = None,
+    ) -> Tuple[str, bool, int]:
+        """
+        OCR とテンプレートマッチングでポケモン名を認識し、(名前, unknown か, OCR の回数) を返す
+
+        adaptive_langs の場合は、その側で直近に名前が見つかった言語から順に OCR し、
+        濃いとき・薄いときの両方で同じ名前が見つかった時点で打ち切る。
+        見つからなければ全言語で OCR して多数決する
+        """
+        max_value = 255
+        # 濃いときと薄いときの2値化画像
+        name_windows = [
+            cv2.threshold(
+                gray_name_window, threshold_value, max_value, cv2.THRESH_BINARY
+            )[1]
+            for threshold_value in [
+                POKEMON_NAME_WINDOW_THRESHOLD_VALUE1,
+                POKEMON_NAME_WINDOW_THRESHOLD_VALUE2,
+            ]
+        ]
+        ocr_results: Dict[Tuple[int, str], str] = {}
+
+        for _lang in self._scheduled_langs(side):
+            self._ocr_names(name_windows, [_lang], ocr_results)
+            _names = [
+                self._search_name(_lang, ocr_results[(k, _lang)])
+                for k in range(len(name_windows))
+            ]
+            if _names[0] is not None and all(v == _names[0] for v in _names):
+                with self._lang_history_lock:
+                    self.early_exit_count += 1
+                self._learn_langs(side, [_lang])
+                return _names[0], False, len(ocr_results)
+
+        self._ocr_names(name_windows, self.tesseract_candidate_langs, ocr_results)
+        with self._lang_history_lock:
+            self.full_sweep_count += 1
+        results = []
+        for k in range(len(name_windows)):
             for _lang in self.tesseract_candidate_langs:
-                _name = pytesseract.image_to_string(
-                    name_window2, lang=_lang, config="--psm 6"
+                results.append(
+                    (_lang, self._search_name(_lang, ocr_results[(k, _lang)]))
                 )
-                if _lang == "chi_sim":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.zh_list, _name)
-                    )
-                elif _lang == "chi_tra":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.zh_HK_list, _name)
-                    )
-                elif _lang == "eng":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.en_list, _name)
-                    )
-                elif _lang == "fra":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.fr_list, _name)
-                    )
-                elif _lang == "jpn":
-                    _name_results.append(self._normalize_japanese_ocr_name(_name))
-                    results.append(
-                        self._search_name_by_edit_distance(
-                            self.ja_list, self._normalize_japanese_ocr_name(_name)
-                        )
-                    )
-                elif _lang == "kor":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(
-                            self.ko_list, self._normalize_korean_ocr_name(_name)
-                        )
-                    )
-                elif _lang == "spa":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.es_list, _name)
-                    )
-                elif _lang == "deu":
-                    _name_results.append(_name)
-                    results.append(
-                        self._search_name_by_edit_distance(self.de_list, _name)
-                    )
-                else:
-                    continue
-        results_exclude_None = [v for v in results if v is not None]
+        results_exclude_None = [v for _, v in results if v is not None]
         if len(results_exclude_None) > 0:
-            _counter = collections.Counter([v for v in results if v is not None])
+            _counter = collections.Counter(results_exclude_None)
             _most_common_name = _counter.most_common()
             _is_unknown = False
-            return _most_common_name[0][0], _is_unknown
+            _name = _most_common_name[0][0]
+            self._learn_langs(
+                side, list(dict.fromkeys(lang for lang, v in results if v == _name))
+            )
+            return _name, _is_unknown, len(ocr_results)
         else:
             # search by template matching
             _name, _is_unknown = self._search_name_window_by_template_matching(
                 gray_name_window, name_window
             )
-            return _name, _is_unknown
+            return _name, _is_unknown, len(ocr_results)
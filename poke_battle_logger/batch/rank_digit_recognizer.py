@@ -0,0 +1,220 @@
+import os
+import threading
+from typing import List, Optional, Tuple, cast
+
+import cv2
+import numpy as np
+from config.config import RANK_DIGIT_MATCHING_THRESHOLD, RANK_DIGIT_TEMPLATE_DIR
+
+# (x, y, 幅, 高さ)
+GlyphBox = Tuple[int, int, int, int]
+
+# 正規化した文字画像の大きさ(縦横比を保って高さを揃え、中央に置く)
+RANK_DIGIT_SIZE = 36
+# これより小さい連結成分はノイズとして無視する
+RANK_DIGIT_MIN_AREA = 10
+# 最も高い文字に対してこれより低い成分("." や "," など)は文字として扱わない
+RANK_DIGIT_MIN_HEIGHT_RATIO = 0.75
+# 文字の高さに対してこれより広い隙間で単語("No" と順位)を分ける
+RANK_DIGIT_WORD_GAP_RATIO = 0.5
+# 順位の前にある "No" の文字数の上限
+RANK_LABEL_MAX_GLYPHS = 2
+
+
+def foreground_to_white(binary: np.ndarray) -> np.ndarray:
+    """
+    文字が白になるようにする(白い画素が多ければ、背景が白とみなして反転する)
+    """
+    if np.count_nonzero(binary) * 2 > binary.size:
+        return cast(np.ndarray, 255 - binary)
+    return binary
+
+
+def segment_glyphs(binary: np.ndarray) -> List[List[GlyphBox]]:
+    """
+    2値化画像(文字が白)を連結成分で文字に分け、左から順に単語ごとのリストにする
+
+    横方向に重なる成分(かすれて切れた文字など)は1つの文字にまとめる
+    """
+    _, _, stats, _ = cv2.connectedComponentsWithStats(
+        (binary > 0).astype(np.uint8), connectivity=8
+    )
+    # 0 番目は背景
+    boxes = sorted(
+        (int(x), int(y), int(w), int(h))
+        for x, y, w, h, area in stats[1:]
+        if area >= RANK_DIGIT_MIN_AREA
+    )
+    merged: List[GlyphBox] = []
+    for x, y, w, h in boxes:
+        if len(merged) > 0 and x < merged[-1][0] + merged[-1][2]:
+            px, py, pw, ph = merged[-1]
+            top, bottom = min(py, y), max(py + ph, y + h)
+            right = max(px + pw, x + w)
+            merged[-1] = (px, top, right - px, bottom - top)
+        else:
+            merged.append((x, y, w, h))
+    if len(merged) == 0:
+        return []
+
+    max_height = max(h for _, _, _, h in merged)
+    glyphs = [
+        box for box in merged if box[3] >= max_height * RANK_DIGIT_MIN_HEIGHT_RATIO
+    ]
+    words: List[List[GlyphBox]] = []
+    for box in glyphs:
+        if len(words) > 0:
+            px, _, pw, _ = words[-1][-1]
+            if box[0] - (px + pw) <= max_height * RANK_DIGIT_WORD_GAP_RATIO:
+                words[-1].append(box)
+                continue
+        words.append([box])
+    return words
+
+
+def normalize_glyph(binary: np.ndarray, box: GlyphBox) -> np.ndarray:
+    x, y, w, h = box
+    glyph = binary[y : y + h, x : x + w]
+    width = max(1, min(RANK_DIGIT_SIZE, round(w * RANK_DIGIT_SIZE / h)))
+    resized = cv2.resize(glyph, (width, RANK_DIGIT_SIZE), interpolation=cv2.INTER_AREA)
+    normalized = np.zeros((RANK_DIGIT_SIZE, RANK_DIGIT_SIZE), dtype=np.uint8)
+    left = (RANK_DIGIT_SIZE - width) // 2
+    normalized[:, left : left + width] = resized
+    return normalized
+
+
+def _standardize(glyph: np.ndarray) -> np.ndarray:
+    """
+    平均 0、ノルム 1 のベクトルにする(内積が TM_CCOEFF_NORMED のスコアになる)
+    """
+    vector = glyph.astype(np.float32).ravel()
+    vector -= vector.mean()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def _score(glyph1: np.ndarray, glyph2: np.ndarray) -> float:
+    return float(_standardize(glyph1) @ _standardize(glyph2))
+
+
+class RankDigitRecognizer:
+    """
+    順位の数字を、連結成分で1文字ずつに分けて数字のテンプレートと照合して読む
+
+    順位は決まったフォントの10種類の数字だけなので、tesseract を使わずに読める。
+    テンプレートは template_dir の 0.png - 9.png か、OCR で読めた順位から learn で作る。
+    0-9 の全てのテンプレートが揃っていない場合や、照合のスコアが低い文字がある場合は
+    None を返す(呼び出し元で OCR する)
+    """
+
+    def __init__(self, template_dir: str = RANK_DIGIT_TEMPLATE_DIR) -> None:
+        # 数字ごとの確定したテンプレートと、確定前の候補(正規化した文字画像)
+        self.glyphs: List[Optional[np.ndarray]] = self._load_glyphs(template_dir)
+        self._candidates: List[Optional[np.ndarray]] = [None] * 10
+        self._lock = threading.Lock()
+        self.templates: Optional[np.ndarray] = self._build_templates()
+
+    def _load_glyphs(self, template_dir: str) -> List[Optional[np.ndarray]]:
+        glyphs: List[Optional[np.ndarray]] = []
+        for digit in range(10):
+            path = os.path.join(template_dir, f"{digit}.png")
+            if not os.path.exists(path):
+                glyphs.append(None)
+                continue
+            template = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            binary = (template > 127).astype(np.uint8) * 255
+            x, y, w, h = cv2.boundingRect(binary)
+            glyphs.append(normalize_glyph(binary, (x, y, w, h)))
+        return glyphs
+
+    def _build_templates(self) -> Optional[np.ndarray]:
+        if any(glyph is None for glyph in self.glyphs):
+            return None
+        return np.array(
+            [_standardize(glyph) for glyph in self.glyphs if glyph is not None]
+        )
+
+    def _match(self, glyph: np.ndarray) -> Tuple[int, float]:
+        """
+        最もスコアが高い数字と、そのスコア(正規化相互相関)を返す
+        """
+        assert self.templates is not None
+        scores = self.templates @ _standardize(glyph)
+        best_digit = int(np.argmax(scores))
+        return best_digit, float(scores[best_digit])
+
+    def recognize(self, binary: np.ndarray) -> Optional[int]:
+        """
+        "No" に続く順位を読む。読めない場合は None
+        """
+        if self.templates is None:
+            return None
+        binary = foreground_to_white(binary)
+        words = segment_glyphs(binary)
+        digits_by_word: List[Optional[str]] = []
+        for word in words:
+            matches = [self._match(normalize_glyph(binary, box)) for box in word]
+            if all(score >= RANK_DIGIT_MATCHING_THRESHOLD for _, score in matches):
+                digits_by_word.append("".join(str(digit) for digit, _ in matches))
+            else:
+                digits_by_word.append(None)
+
+        # 先頭の "No" だけは数字として読めなくてよい。それ以外の単語は全て数字として読めること
+        if len(words) > 0 and digits_by_word[0] is None:
+            if len(words[0]) > RANK_LABEL_MAX_GLYPHS:
+                return None
+            digits_by_word = digits_by_word[1:]
+        if len(digits_by_word) == 0 or any(v is None for v in digits_by_word):
+            return None
+        return int("".join(v for v in digits_by_word if v is not None))
+
+    def learn(self, binary: np.ndarray, rank: int) -> List[int]:
+        """
+        OCR で rank と読めた画像から数字のテンプレートを作り、確定した数字を返す
+
+        最後の単語の文字数が rank の桁数と同じ場合だけ使う。OCR の読み間違いを
+        テンプレートにしないように、同じ数字として2回読めて2つの文字画像が一致し、
+        かつ他の数字の確定したテンプレートと一致しない場合に確定する
+        """
+        rank_str = str(rank)
+        binary = foreground_to_white(binary)
+        words = segment_glyphs(binary)
+        if len(words) == 0 or len(words[-1]) != len(rank_str):
+            return []
+        learned = []
+        with self._lock:
+            for digit_str, box in zip(rank_str, words[-1]):
+                digit = int(digit_str)
+                if self.glyphs[digit] is not None:
+                    continue
+                glyph = normalize_glyph(binary, box)
+                candidate = self._candidates[digit]
+                self._candidates[digit] = glyph
+                if candidate is None or _score(candidate, glyph) < (
+                    RANK_DIGIT_MATCHING_THRESHOLD
+                ):
+                    continue
+                if any(
+                    other is not None
+                    and _score(other, glyph) >= RANK_DIGIT_MATCHING_THRESHOLD
+                    for other in self.glyphs
+                ):
+                    continue
+                self.glyphs[digit] = glyph
+                learned.append(digit)
+            if learned:
+                self.templates = self._build_templates()
+        return learned
+
+    def save_templates(self, template_dir: str = RANK_DIGIT_TEMPLATE_DIR) -> List[int]:
+        """
+        確定したテンプレートを template_dir に保存し、保存した数字を返す
+        """
+        os.makedirs(template_dir, exist_ok=True)
+        saved = []
+        for digit, glyph in enumerate(self.glyphs):
+            if glyph is None:
+                continue
+            cv2.imwrite(os.path.join(template_dir, f"{digit}.png"), glyph)
+            saved.append(digit)
+        return saved
@@ -0,0 +1,84 @@
+from typing import List, Optional, Sequence
+
+import editdistance
+import numpy as np
+from config.config import (
+    POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_MARGIN,
+    POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_THRESHOLD,
+    TEMPLATE_MATCHING_THRESHOLD,
+)
+
+
+def decisive_select_order(template_scores: np.ndarray) -> Optional[List[int]]:
+    """
+    テンプレートマッチングのスコアだけで選出順が決まる場合は、その順番を返す
+
+    template_scores: (選出順のテンプレート, 選択ウィンドウ) ごとのスコア
+    全てのテンプレートで、最もスコアが高いウィンドウが
+    POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_THRESHOLD を超え、2番目のウィンドウとの差が
+    POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_MARGIN 以上で、かつウィンドウが重複しない場合のみ
+    (それ以外は None)
+    """
+    select_order: List[int] = []
+    for scores in template_scores:
+        best_index = int(np.argmax(scores))
+        second_score = np.partition(scores, -2)[-2] if len(scores) > 1 else -1.0
+        if (
+            scores[best_index] <= POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_THRESHOLD
+            or scores[best_index] - second_score
+            < POKEMON_SELECT_DECISIVE_TEMPLATE_MATCHING_MARGIN
+            or best_index in select_order
+        ):
+            return None
+        select_order.append(best_index)
+    return select_order
+
+
+def solve_select_order(
+    template_scores: np.ndarray,
+    recognized_order_strs: Sequence[str],
+    order_strs: Sequence[str],
+    lang: str,
+    edit_distance_threshold: float,
+) -> List[int]:
+    """
+    ウィンドウごとの OCR 結果とテンプレートマッチングのスコアから、選出順を決める
+
+    選出順 i の候補は、OCR 結果が order_strs[i] を含むか一致するウィンドウと、
+    スコアが TEMPLATE_MATCHING_THRESHOLD を超え編集距離が閾値以下のウィンドウ。
+    選出順の先頭から、候補のうち最も確からしい(en はスコア、ja は編集距離)未使用のウィンドウを選ぶ
+    """
+    pokemon_select_order_score: list[tuple[int, int, float]] = []
+    for i, _order_str in enumerate(order_strs):
+        for k, _recognized_order_str in enumerate(recognized_order_strs):
+            ed_score = editdistance.eval(_recognized_order_str, _order_str) / (
+                max(len(_recognized_order_str), len(_order_str)) * 1.00
+            )
+            score = float(template_scores[i][k])
+            if (
+                _order_str in _recognized_order_str
+                or ed_score == 0
+                or (
+                    score > TEMPLATE_MATCHING_THRESHOLD
+                    and ed_score <= edit_distance_threshold
+                )
+            ):
+                if lang == "en":
+                    pokemon_select_order_score.append((k, i, score))
+                elif lang == "ja":
+                    pokemon_select_order_score.append((k, i, 1 - ed_score))
+                else:
+                    raise ValueError("lang must be en or ja")
+
+    pokemon_select_order: List[int] = []
+    for i in range(len(order_strs)):
+        sorted_orders = sorted(
+            [score for score in pokemon_select_order_score if score[1] == i],
+            key=lambda x: x[2],
+            reverse=True,
+        )
+        for order in sorted_orders:
+            if order[0] not in pokemon_select_order:
+                pokemon_select_order.append(order[0])
+                break
+    return pokemon_select_order
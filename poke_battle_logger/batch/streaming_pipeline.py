@@ -0,0 +1,433 @@
+import heapq
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging import getLogger
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from config.config import BASE_FRAME_SIZE
+
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_scanner import (
+    DETECTION_TARGETS,
+    detect_scenes,
+    get_total_frames,
+)
+from poke_battle_logger.batch.frame_store import (
+    TASK_FRAME_THRESHOLDS,
+    TASK_TAIL_SIZES,
+    TASK_WINDOWS,
+    Window,
+)
+
+logger = getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_MAX_PENDING_EXTRACTIONS = 32
+
+# PokemonBattleExtractor.run のループ内での抽出順(同じフレームではこの順に抽出する)
+EXTRACTION_TASK_ORDER = [
+    "first_ranking",
+    "ranking",
+    "select_done",
+    "standing_by",
+    "level_50",
+    "win_or_lost",
+    "message_window",
+    "move",
+]
+
+# message_window の抽出は、それより前のフレームの standing_by / level_50 の抽出結果を使うので、
+# この3つはフレーム順に1つずつ抽出する。move は level_50 と同じ PokemonNameWindowExtractor
+# (言語の履歴を持つ)でポケモン名を読むので、同じスレッドで抽出する
+SEQUENTIAL_TASKS = ["standing_by", "level_50", "message_window", "move"]
+
+# (途中の区間の最小長, 最後の区間の最小長)
+# frame_compress / message_frame_compress が区間を残す条件と同じ
+SEGMENT_MIN_LENGTHS: Dict[str, Tuple[int, int]] = {
+    "first_ranking": (1, 2),
+    "ranking": (1, 2),
+    "select_done": (1, 2),
+    "standing_by": (2, 2),
+    "level_50": (1, 2),
+    "win_or_lost": (1, 2),
+    "message_window": (2, 1),
+    "move": (1, 2),
+}
+
+Crops = Dict[Window, np.ndarray]
+# (フレーム番号, 抽出の種類, ROI)
+SegmentEvent = Tuple[int, str, Crops]
+
+
+def select_segment_targets(task: str, segment: List[int]) -> List[int]:
+    """
+    連続区間から抽出に使うフレームを選ぶ(PokemonBattleExtractor.run と同じ位置)
+    """
+    if task in ["first_ranking", "ranking"]:
+        return [segment[-5]]
+    if task == "select_done":
+        return [segment[-6] if len(segment) > 5 else segment[-1]]
+    if task == "standing_by":
+        return [segment[-1]] if len(segment) > 1 else []
+    if task in ["level_50", "move"]:
+        return [segment[-2]]
+    if task == "message_window":
+        return [segment[-1]]
+    return list(segment)
+
+
+def crop_task_windows(task: str, frame: np.ndarray) -> Crops:
+    return {
+        window: frame[window[0] : window[1], window[2] : window[3]].copy()
+        for window in TASK_WINDOWS[task]
+    }
+
+
+def restore_frame(
+    crops: Crops, frame_shape: Tuple[int, ...], frame_dtype: np.dtype
+) -> np.ndarray:
+    """
+    ROI を元の位置に配置したフレームを返す(ROI 以外の画素は 0)
+    """
+    frame = np.zeros(frame_shape, dtype=frame_dtype)
+    for window, crop in crops.items():
+        frame[window[0] : window[1], window[2] : window[3]] = crop
+    return frame
+
+
+class StreamingSegmenter:
+    """
+    1種類の検出結果をフレーム順に受け取り、連続区間が閉じた時点で抽出対象のフレームを返す
+
+    長さ 1 の区間のように、最後の区間かどうかで残すかが変わる区間は、
+    次の検出か動画の終わりまで判断を保留する
+    """
+
+    def __init__(self, task: str) -> None:
+        self.task = task
+        self.frame_threshold = TASK_FRAME_THRESHOLDS[task]
+        self.intermediate_min_length, self.final_min_length = SEGMENT_MIN_LENGTHS[task]
+        self.tail_size = TASK_TAIL_SIZES[task]
+        self.segment: List[int] = []
+        self.tail: Deque[Tuple[int, Crops]] = deque(maxlen=self.tail_size)
+        self.deferred: Optional[Tuple[List[int], List[Tuple[int, Crops]]]] = None
+        self.emitted_segments = 0
+
+    def push(self, frame_number: int, crops: Crops) -> List[SegmentEvent]:
+        events = self.advance(frame_number)
+        events.extend(self._resolve_deferred(is_final=False))
+        self.segment.append(frame_number)
+        self.tail.append((frame_number, crops))
+        return events
+
+    def advance(self, frame_number: int) -> List[SegmentEvent]:
+        """
+        frame_number まで判定が進んだ時点で閉じた区間の抽出対象を返す
+        """
+        if self.segment and frame_number - self.segment[-1] > self.frame_threshold:
+            return self._close()
+        return []
+
+    def finish(self) -> List[SegmentEvent]:
+        events = self._close() if self.segment else []
+        events.extend(self._resolve_deferred(is_final=True))
+        return events
+
+    def earliest_pending_frame(self) -> Optional[int]:
+        """
+        まだ抽出対象になりうるフレームのうち、最も前のもの
+        """
+        if self.deferred is not None:
+            return self.deferred[0][0]
+        if self.tail:
+            return self.tail[0][0]
+        return None
+
+    def _close(self) -> List[SegmentEvent]:
+        segment, tail = self.segment, list(self.tail)
+        self.segment = []
+        self.tail = deque(maxlen=self.tail_size)
+        if len(segment) >= max(self.intermediate_min_length, self.final_min_length):
+            return self._emit(segment, tail)
+        if len(segment) < min(self.intermediate_min_length, self.final_min_length):
+            return []
+        self.deferred = (segment, tail)
+        return []
+
+    def _resolve_deferred(self, is_final: bool) -> List[SegmentEvent]:
+        if self.deferred is None:
+            return []
+        segment, tail = self.deferred
+        self.deferred = None
+        min_length = self.final_min_length if is_final else self.intermediate_min_length
+        if len(segment) < min_length:
+            return []
+        return self._emit(segment, tail)
+
+    def _emit(
+        self, segment: List[int], tail: List[Tuple[int, Crops]]
+    ) -> List[SegmentEvent]:
+        self.emitted_segments += 1
+        # 開始時のランクは最初の区間だけを使う
+        if self.task == "first_ranking" and self.emitted_segments > 1:
+            return []
+        tail_crops = dict(tail)
+        return [
+            (frame_number, self.task, tail_crops[frame_number])
+            for frame_number in select_segment_targets(self.task, segment)
+        ]
+
+
+class _Failure:
+    def __init__(self, exception: BaseException) -> None:
+        self.exception = exception
+
+
+_END = object()
+
+
+class StreamingBattlePipeline:
+    """
+    デコード → 検出 → 抽出を、上限付きのキューでつないで並行に動かす
+
+    デコード用のスレッドがフレームを読み、検出用のスレッドが FrameDetector で判定する。
+    判定結果はフレーム順に並べ直して StreamingSegmenter に渡し、区間が閉じた時点で
+    抽出対象のフレームを抽出用のスレッドに渡すので、OCR などの抽出が動画のデコードと
+    並行して進む。抽出が詰まるとキューが埋まり、検出とデコードも待つ(バックプレッシャー)
+
+    extract(task, フレーム番号, フレーム) は抽出用のスレッドから呼ばれる。
+    SEQUENTIAL_TASKS はフレーム順に1つのスレッドで、それ以外は extraction_workers 個の
+    スレッドで抽出する
+    """
+
+    def __init__(
+        self,
+        video_path: str,
+        lang: str,
+        extract: Callable[[str, int, np.ndarray], None],
+        detector_threads: int = 1,
+        extraction_workers: int = 2,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_pending_extractions: int = DEFAULT_MAX_PENDING_EXTRACTIONS,
+    ) -> None:
+        self.video_path = video_path
+        self.lang = lang
+        self.extract = extract
+        self.detector_threads = max(1, detector_threads)
+        self.extraction_workers = max(1, extraction_workers)
+        self.queue_size = queue_size
+        self.max_pending_extractions = max_pending_extractions
+        self.extracted_during_decoding = 0
+        self.extracted_frames = 0
+        self.geometry = FrameGeometry.from_video(video_path)
+        self._frame_shape: Optional[Tuple[int, ...]] = None
+        self._frame_dtype: Optional[np.dtype] = None
+        self._decoding_done = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def _put(self, queue: "Queue[Any]", item: Any) -> bool:
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                continue
+        return False
+
+    def _decode(
+        self,
+        total_frames: int,
+        frame_queue: "Queue[Any]",
+        detection_queue: "Queue[Any]",
+    ) -> None:
+        try:
+            video = cv2.VideoCapture(self.video_path)
+            for i in range(total_frames):
+                ret, frame = video.read()
+                if ret and self._frame_shape is None:
+                    # 抽出処理には BASE_FRAME_SIZE のフレームを渡す
+                    self._frame_shape = BASE_FRAME_SIZE + frame.shape[2:]
+                    self._frame_dtype = frame.dtype
+                if not self._put(frame_queue, (i, frame if ret else None)):
+                    break
+            video.release()
+        except Exception as e:
+            self._put(detection_queue, _Failure(e))
+        finally:
+            self._decoding_done.set()
+            for _ in range(self.detector_threads):
+                self._put(frame_queue, _END)
+
+    def _detect(self, frame_queue: "Queue[Any]", detection_queue: "Queue[Any]") -> None:
+        try:
+            frame_detector = FrameDetector(self.lang, self.geometry)
+            while not self._stop.is_set():
+                try:
+                    item = frame_queue.get(timeout=0.1)
+                except Empty:
+                    continue
+                if item is _END:
+                    break
+                frame_number, frame = item
+                crops_by_task: Dict[str, Crops] = {}
+                tasks = (
+                    detect_scenes(frame_detector, frame) if frame is not None else []
+                )
+                if tasks:
+                    base_frame = self.geometry.to_base_windows(
+                        frame,
+                        [window for task in tasks for window in TASK_WINDOWS[task]],
+                    )
+                    for task in tasks:
+                        crops_by_task[task] = crop_task_windows(task, base_frame)
+                if not self._put(detection_queue, (frame_number, crops_by_task)):
+                    break
+        except Exception as e:
+            self._put(detection_queue, _Failure(e))
+        finally:
+            self._put(detection_queue, _END)
+
+    def _run_extraction(self, task: str, frame_number: int, crops: Crops) -> None:
+        assert self._frame_shape is not None and self._frame_dtype is not None
+        self.extract(
+            task,
+            frame_number,
+            restore_frame(crops, self._frame_shape, self._frame_dtype),
+        )
+        with self._lock:
+            self.extracted_frames += 1
+            if not self._decoding_done.is_set():
+                self.extracted_during_decoding += 1
+
+    def run(self) -> Tuple[Dict[str, List[int]], int]:
+        """
+        動画を処理し、検出結果ごとのフレーム番号(scan_video と同じ)と総フレーム数を返す
+        """
+        start_time = time.time()
+        total_frames = get_total_frames(self.video_path)
+        frame_queue: "Queue[Any]" = Queue(maxsize=self.queue_size)
+        detection_queue: "Queue[Any]" = Queue(maxsize=self.queue_size)
+        threads = [
+            threading.Thread(
+                target=self._decode,
+                args=(total_frames, frame_queue, detection_queue),
+                daemon=True,
+            )
+        ] + [
+            threading.Thread(
+                target=self._detect, args=(frame_queue, detection_queue), daemon=True
+            )
+            for _ in range(self.detector_threads)
+        ]
+
+        detected_frames: Dict[str, List[int]] = {key: [] for key in DETECTION_TARGETS}
+        segmenters = {task: StreamingSegmenter(task) for task in DETECTION_TARGETS}
+        sequential_events: List[Tuple[int, int, str, Crops]] = []
+        # 抽出で最初に起きた例外(検出結果を1つ受け取るごとに確認する)
+        failures: List[_Failure] = []
+        pending_extractions = threading.BoundedSemaphore(self.max_pending_extractions)
+        parallel_executor = ThreadPoolExecutor(max_workers=self.extraction_workers)
+        sequential_executor = ThreadPoolExecutor(max_workers=1)
+
+        def _submit(executor: ThreadPoolExecutor, event: SegmentEvent) -> None:
+            frame_number, task, crops = event
+            pending_extractions.acquire()
+            future = executor.submit(self._run_extraction, task, frame_number, crops)
+            future.add_done_callback(_on_extraction_done)
+
+        def _on_extraction_done(future: "Future[None]") -> None:
+            pending_extractions.release()
+            if future.cancelled():
+                return
+            exception = future.exception()
+            if exception is not None:
+                with self._lock:
+                    failures.append(_Failure(exception))
+
+        def _dispatch(events: List[SegmentEvent]) -> None:
+            for frame_number, task, crops in events:
+                if task in SEQUENTIAL_TASKS:
+                    heapq.heappush(
+                        sequential_events,
+                        (frame_number, EXTRACTION_TASK_ORDER.index(task), task, crops),
+                    )
+                else:
+                    _submit(parallel_executor, (frame_number, task, crops))
+
+        def _release_sequential(watermark: Optional[int]) -> None:
+            # watermark より前のフレームは、standing_by / level_50 の抽出対象が確定している
+            while sequential_events and (
+                watermark is None or sequential_events[0][0] < watermark
+            ):
+                frame_number, _, task, crops = heapq.heappop(sequential_events)
+                _submit(sequential_executor, (frame_number, task, crops))
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            reorder_buffer: Dict[int, Dict[str, Crops]] = {}
+            next_frame_number = 0
+            finished_detectors = 0
+            while finished_detectors < self.detector_threads:
+                item = detection_queue.get()
+                if item is _END:
+                    finished_detectors += 1
+                    continue
+                if isinstance(item, _Failure):
+                    raise item.exception
+                if failures:
+                    raise failures[0].exception
+
+                frame_number, crops_by_task = item
+                reorder_buffer[frame_number] = crops_by_task
+                # 検出用のスレッドが複数あるので、フレーム順に並べ直して区間を作る
+                while next_frame_number in reorder_buffer:
+                    crops_by_task = reorder_buffer.pop(next_frame_number)
+                    for task, segmenter in segmenters.items():
+                        if task in crops_by_task:
+                            detected_frames[task].append(next_frame_number)
+                            _dispatch(
+                                segmenter.push(next_frame_number, crops_by_task[task])
+                            )
+                        else:
+                            _dispatch(segmenter.advance(next_frame_number))
+                    next_frame_number += 1
+                    pending_frames = [
+                        segmenters[task].earliest_pending_frame()
+                        for task in SEQUENTIAL_TASKS
+                    ]
+                    _release_sequential(
+                        min(
+                            [next_frame_number]
+                            + [i for i in pending_frames if i is not None]
+                        )
+                    )
+
+            for segmenter in segmenters.values():
+                _dispatch(segmenter.finish())
+            _release_sequential(None)
+            parallel_executor.shutdown(wait=True)
+            sequential_executor.shutdown(wait=True)
+            if failures:
+                raise failures[0].exception
+        finally:
+            self._stop.set()
+            parallel_executor.shutdown(wait=True, cancel_futures=True)
+            sequential_executor.shutdown(wait=True, cancel_futures=True)
+            for thread in threads:
+                thread.join()
+
+        logger.info(
+            f"Streaming pipeline: {self.extracted_frames} frames extracted "
+            f"({self.extracted_during_decoding} while decoding) "
+            f"in {time.time() - start_time:.1f}s"
+        )
+        return detected_frames, total_frames
@@ -0,0 +1,67 @@
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# (行のテキスト, 上端の y, 下端の y)
+OCRLine = Tuple[str, int, int]
+
+# 画像の間に挟む余白の最小の高さと、左右の余白
+TILE_MIN_SEPARATOR_HEIGHT = 20
+TILE_PADDING = 10
+
+
+def build_tiled_canvas(
+    crops: Sequence[np.ndarray],
+) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    グレースケールにした crops を、余白を挟んで縦に並べた1枚の画像と、
+    各画像の (上端の y, 下端の y) を返す
+
+    余白の高さは最も高い画像の半分(OCR が隣の画像の文字と同じ行にしないように)で、
+    余白の色は全ての画像の縁の画素の中央値(背景色)にする
+    """
+    gray_crops = [
+        cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+        for crop in crops
+    ]
+    border_pixels = np.concatenate(
+        [
+            np.concatenate([crop[0], crop[-1], crop[:, 0], crop[:, -1]])
+            for crop in gray_crops
+        ]
+    )
+    background = int(np.median(border_pixels))
+    separator_height = max(
+        TILE_MIN_SEPARATOR_HEIGHT, max(crop.shape[0] for crop in gray_crops) // 2
+    )
+    width = max(crop.shape[1] for crop in gray_crops) + 2 * TILE_PADDING
+    height = sum(crop.shape[0] for crop in gray_crops) + separator_height * (
+        len(gray_crops) + 1
+    )
+    canvas = np.full((height, width), background, dtype=np.uint8)
+    spans = []
+    top = separator_height
+    for crop in gray_crops:
+        bottom = top + crop.shape[0]
+        canvas[top:bottom, TILE_PADDING : TILE_PADDING + crop.shape[1]] = crop
+        spans.append((top, bottom))
+        top = bottom + separator_height
+    return canvas, spans
+
+
+def assign_lines(
+    lines: Sequence[OCRLine], spans: Sequence[Tuple[int, int]]
+) -> List[str]:
+    """
+    キャンバス上の行を、行の縦の中心が含まれる画像に割り当て、画像ごとのテキストを返す
+    (1つの画像に複数行ある場合は改行でつなぐ)
+    """
+    texts: List[List[str]] = [[] for _ in spans]
+    for text, top, bottom in lines:
+        center = (top + bottom) / 2
+        for k, (span_top, span_bottom) in enumerate(spans):
+            if span_top <= center < span_bottom:
+                texts[k].append(text.rstrip("\n"))
+                break
+    return ["\n".join(lines_in_crop) for lines_in_crop in texts]
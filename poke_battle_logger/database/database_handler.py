@@ -40,12 +40,6 @@ def build_db_connection() -> Union[SqliteDatabase, PostgresqlDatabase]:
     return db
 
 
-pokemon_name_df = pd.read_csv("data/pokemon_names.csv")
-pokemon_japanese_to_no_dict = dict(
-    zip(pokemon_name_df["Japanese"], pokemon_name_df["No."])
-)
-
-
 class BaseModel(Model):  # type: ignore
     class Meta:
         database = build_db_connection()
@@ -160,6 +160,25 @@ class GCSHandler:
         blob = self.bucket.blob(dest_path)
         blob.upload_from_filename(local_path)
 
+    def download_detection_cache_from_gcs(self, video_id: str, local_path: str) -> bool:
+        """
+        gcs://{bucket_name}/detection_cache/{video_id}.npz があればダウンロードする
+        """
+        blob = self.bucket.blob(f"detection_cache/{video_id}.npz")
+        if not blob.exists():
+            return False
+        os.makedirs(os.path.dirname(local_path) or ".", exist_ok=True)
+        blob.download_to_filename(local_path)
+        return True
+
+    @retry(stop=stop_after_attempt(5))
+    def upload_detection_cache_to_gcs(self, video_id: str, local_path: str) -> None:
+        """
+        target_gcs_path -> gcs://{bucket_name}/detection_cache/{video_id}.npz
+        """
+        blob = self.bucket.blob(f"detection_cache/{video_id}.npz")
+        blob.upload_from_filename(local_path)
+
     def mount_ver_upload_video_to_gcs(
         self, trainer_id_in_DB: int, video_id: str, local_path: str
     ) -> None:
@@ -0,0 +1,220 @@
+import csv
+import hashlib
+import os
+import pickle
+import re
+import sys
+import threading
+import unicodedata
+from dataclasses import dataclass
+from logging import getLogger
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+logger = getLogger(__name__)
+
+POKEMON_NAMES_PATH = "data/pokemon_names.csv"
+POKEMON_NAME_MULTI_LANGUAGE_PATH = "data/pokemon_name_multi_language.csv"
+NAME_REGISTRY_PATH = "data/pokemon_name_registry.pickle"
+
+# 保存する内容(正規化の方法など)を変えたら上げる
+NAME_REGISTRY_VERSION = 3
+
+# data/pokemon_name_multi_language.csv の言語の列
+NAME_LANGUAGES = ["ja", "en", "fr", "de", "es", "it", "ko", "zh_HK", "zh"]
+
+NON_CJK_PATTERN = re.compile(
+    "[^"
+    "\U00003040-\U0000309F"  # Hiragana
+    "\U000030A0-\U000030FF"  # Katakana
+    "\U0000FF65-\U0000FF9F"  # Half width Katakana
+    "\U0000FF10-\U0000FF19"  # Full width digits
+    "\U0000FF21-\U0000FF3A"  # Full width Upper case Alphabets
+    "\U0000FF41-\U0000FF5A"  # Full width Lower case Alphabets
+    "\U00000030-\U00000039"  # Half width digits
+    "\U00000041-\U0000005A"  # Half width Upper case Alphabets
+    "\U00000061-\U0000007A"  # Half width Lower case Alphabets
+    "\U00003190-\U0000319F"  # Kanbun
+    "\U00004E00-\U00009FFF"  # CJK unified ideographs. kanjis
+    "]+",
+    flags=re.UNICODE,
+)
+
+
+def normalize_name(name: str) -> str:
+    """
+    NFC に正規化し、空白を削除する
+    """
+    return "".join(unicodedata.normalize("NFC", name).split())
+
+
+def normalize_japanese_name(name: str) -> str:
+    """
+    日本語の OCR 結果と同じく、かな・漢字・英数字以外の文字と空白を削除する
+    """
+    return "".join(NON_CJK_PATTERN.sub(r"", name).split())
+
+
+@dataclass(frozen=True)
+class PokemonNameRegistry:
+    """
+    ポケモン名の一覧と、言語間の対応
+
+    pokedex: data/pokemon_names.csv の (図鑑番号, 日本語名, 英語名)(フォルム違いを含む)
+    multi_language_names: 言語ごとの名前(data/pokemon_name_multi_language.csv の行順)
+    normalized_names: multi_language_names を normalize_name したもの
+    japanese_ocr_names: 日本語名を normalize_japanese_name したもの
+    """
+
+    pokedex: Tuple[Tuple[int, str, str], ...]
+    multi_language_names: Mapping[str, Tuple[str, ...]]
+    normalized_names: Mapping[str, Tuple[str, ...]]
+    japanese_ocr_names: Tuple[str, ...]
+    ja_to_no: Mapping[str, int]
+    ja_to_en: Mapping[str, str]
+    # 言語ごとの、名前 -> multi_language_names の行
+    name_rows: Mapping[str, Mapping[str, int]]
+    # 正規化した名前(いずれかの言語) -> 日本語名
+    normalized_to_ja: Mapping[str, str]
+
+    def names(self, lang: str) -> Tuple[str, ...]:
+        return self.multi_language_names[lang]
+
+    def translate(self, name: str, from_lang: str, to_lang: str) -> Optional[str]:
+        row = self.name_rows[from_lang].get(name)
+        if row is None:
+            return None
+        return self.multi_language_names[to_lang][row]
+
+    def english_name(self, japanese_name: str) -> str:
+        """
+        日本語名を英語名にする(見つからなければそのまま返す)
+        """
+        return self.ja_to_en.get(japanese_name, japanese_name)
+
+
+def _read_csv_rows(path: str) -> List[Dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _source_digest() -> str:
+    digest = hashlib.sha1()
+    digest.update(f"version={NAME_REGISTRY_VERSION};".encode())
+    for path in [POKEMON_NAMES_PATH, POKEMON_NAME_MULTI_LANGUAGE_PATH]:
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _build_payload(digest: str) -> Dict[str, Any]:
+    """
+    CSV を読んで、保存する内容(名前と正規化した名前)を作る
+    """
+    pokedex = tuple(
+        (int(row["No."]), row["Japanese"], row["English"])
+        for row in _read_csv_rows(POKEMON_NAMES_PATH)
+    )
+    multi_language_rows = _read_csv_rows(POKEMON_NAME_MULTI_LANGUAGE_PATH)
+    multi_language_names = {
+        lang: tuple(row[lang] for row in multi_language_rows) for lang in NAME_LANGUAGES
+    }
+    return {
+        "digest": digest,
+        "pokedex": pokedex,
+        "multi_language_names": multi_language_names,
+        "normalized_names": {
+            lang: tuple(normalize_name(name) for name in names)
+            for lang, names in multi_language_names.items()
+        },
+        "japanese_ocr_names": tuple(
+            normalize_japanese_name(name) for name in multi_language_names["ja"]
+        ),
+    }
+
+
+def _intern(value: Any) -> Any:
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, tuple):
+        return tuple(_intern(v) for v in value)
+    if isinstance(value, dict):
+        return {_intern(k): _intern(v) for k, v in value.items()}
+    return value
+
+
+def _build_registry(payload: Dict[str, Any]) -> PokemonNameRegistry:
+    # 同じ名前は1つの文字列オブジェクトを共有する
+    payload = _intern(payload)
+    multi_language_names = payload["multi_language_names"]
+    normalized_names = payload["normalized_names"]
+    ja_names = multi_language_names["ja"]
+
+    normalized_to_ja: Dict[str, str] = {}
+    for lang in NAME_LANGUAGES:
+        for row, name in enumerate(normalized_names[lang]):
+            # 複数の行・言語で同じ場合は、先の行・言語を使う
+            normalized_to_ja.setdefault(name, ja_names[row])
+
+    name_rows: Dict[str, Mapping[str, int]] = {}
+    for lang in NAME_LANGUAGES:
+        rows: Dict[str, int] = {}
+        for row, name in enumerate(multi_language_names[lang]):
+            rows.setdefault(name, row)
+        name_rows[lang] = MappingProxyType(rows)
+
+    return PokemonNameRegistry(
+        pokedex=payload["pokedex"],
+        multi_language_names=MappingProxyType(multi_language_names),
+        normalized_names=MappingProxyType(normalized_names),
+        japanese_ocr_names=payload["japanese_ocr_names"],
+        ja_to_no=MappingProxyType({ja: no for no, ja, _ in payload["pokedex"]}),
+        ja_to_en=MappingProxyType({ja: en for _, ja, en in payload["pokedex"]}),
+        name_rows=MappingProxyType(name_rows),
+        normalized_to_ja=MappingProxyType(normalized_to_ja),
+    )
+
+
+def export_name_registry(path: str = NAME_REGISTRY_PATH) -> None:
+    """
+    CSV から作った内容を pickle で保存する(起動時に CSV の解析と正規化を省略する)
+    """
+    # 同じ名前を1つのオブジェクトにして、pickle で1回だけ保存されるようにする
+    payload = _intern(_build_payload(_source_digest()))
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_name_registry(path: str = NAME_REGISTRY_PATH) -> PokemonNameRegistry:
+    """
+    保存した内容が CSV と一致すればそれを使い、そうでなければ CSV から作る
+    """
+    digest = _source_digest()
+    if os.path.exists(path):
+        try:
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+            if payload["digest"] == digest:
+                return _build_registry(payload)
+            logger.info(f"Name registry is outdated: {path}")
+        except (OSError, pickle.UnpicklingError, EOFError, KeyError) as e:
+            logger.warning(f"Failed to load name registry {path}: {e}")
+    return _build_registry(_build_payload(digest))
+
+
+_name_registry: Optional[PokemonNameRegistry] = None
+_name_registry_lock = threading.Lock()
+
+
+def get_name_registry() -> PokemonNameRegistry:
+    """
+    プロセス内で共有する PokemonNameRegistry を返す(初回の呼び出しで読み込む)
+    """
+    global _name_registry
+    with _name_registry_lock:
+        if _name_registry is None:
+            _name_registry = load_name_registry()
+        return _name_registry
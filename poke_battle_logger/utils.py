@@ -1,14 +1,11 @@
 from datetime import datetime
 from typing import Optional
 
-import pandas as pd
 from pytube import YouTube
 from pytube.exceptions import RegexMatchError
 from pytube.helpers import regex_search
 
-# No.,Japanese,English
-pokemon_names = pd.read_csv("data/pokemon_names.csv")
-POKEMON_NAME_JA_EN_DICT: dict[str, str] = pokemon_names.set_index("Japanese")["English"].to_dict()
+from poke_battle_logger.name_registry import get_name_registry
 
 
 def publish_date(watch_html: str) -> Optional[datetime]:
@@ -50,6 +47,4 @@ def get_youtube_url_with_timestamp(video_url: str, battle_started_at: datetime)
 
 
 def get_pokemon_english_name_from_japanese(japanese_pokemon_name: str) -> str:
-    if japanese_pokemon_name in POKEMON_NAME_JA_EN_DICT:
-        return POKEMON_NAME_JA_EN_DICT[japanese_pokemon_name]
-    return japanese_pokemon_name
+    return get_name_registry().english_name(japanese_pokemon_name)
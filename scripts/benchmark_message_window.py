@@ -0,0 +1,78 @@
+import time
+from typing import Callable
+
+import click
+import cv2
+import numpy as np
+from config.config import (
+    POKEMON_MESSAGE_WINDOW,
+    POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS,
+    POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE,
+)
+
+from poke_battle_logger.batch.frame_detector import FrameDetector
+
+
+def is_message_window_frame_without_gate(frame: np.ndarray) -> bool:
+    """
+    白画素数に関係なく、毎回 MSER を作って文字領域を検出する(変更前の判定)
+    """
+    message_window = frame[
+        POKEMON_MESSAGE_WINDOW[0] : POKEMON_MESSAGE_WINDOW[1],
+        POKEMON_MESSAGE_WINDOW[2] : POKEMON_MESSAGE_WINDOW[3],
+    ]
+    gray = cv2.cvtColor(message_window, cv2.COLOR_BGR2GRAY)
+    _, thresh = cv2.threshold(
+        gray, POKEMON_MESSAGE_WINDOW_THRESHOLD_VALUE, 255, cv2.THRESH_BINARY
+    )
+    white_pixels = cv2.countNonZero(thresh)
+    is_message = (
+        white_pixels > POKEMON_MESSAGE_WINDOW_MIN_WHITE_PIXELS
+        and white_pixels < POKEMON_MESSAGE_WINDOW_MAX_WHITE_PIXELS
+    )
+    mser = cv2.MSER.create()
+    regions, _ = mser.detectRegions(thresh)
+    return bool(is_message & (len(regions) >= 2))
+
+
+def measure(
+    video_path: str, max_frames: int, detect: Callable[[np.ndarray], bool]
+) -> tuple[float, list[bool]]:
+    """
+    detect の呼び出しだけの時間を測り、frames/sec と判定結果を返す
+    """
+    video = cv2.VideoCapture(video_path)
+    elapsed = 0.0
+    results = []
+    for _ in range(max_frames):
+        ret, frame = video.read()
+        if not ret:
+            break
+        start_time = time.perf_counter()
+        results.append(detect(frame))
+        elapsed += time.perf_counter() - start_time
+    video.release()
+    return len(results) / max(elapsed, 1e-9), results
+
+
+@click.command()
+@click.option("--video_path", required=True, type=str)
+@click.option("--max_frames", required=False, type=int, default=3000)
+@click.option("--language", required=False, type=str, default="en")
+def benchmark_message_window(video_path: str, max_frames: int, language: str) -> None:
+    frame_detector = FrameDetector(language)
+    before_fps, before = measure(
+        video_path, max_frames, is_message_window_frame_without_gate
+    )
+    after_fps, after = measure(
+        video_path, max_frames, frame_detector.is_message_window_frame
+    )
+    assert before == after, "message window detection results differ"
+    print(f"frames: {len(after)} (message window: {sum(after)})")
+    print(f"before: {before_fps:.1f} frames/sec")
+    print(f"after : {after_fps:.1f} frames/sec ({after_fps / before_fps:.1f}x)")
+
+
+if __name__ == "__main__":
+    benchmark_message_window()  # type: ignore
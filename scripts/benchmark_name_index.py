@@ -0,0 +1,87 @@
+import random
+import time
+from typing import Callable, List, Optional
+
+import click
+import editdistance
+import pandas as pd
+
+from poke_battle_logger.batch.name_index import NameIndex
+from poke_battle_logger.batch.pokemon_name_window_extractor import (
+    EDIT_DISTANCE_THRESHOLD,
+)
+
+
+def search_name_by_linear_scan(
+    names: List[str], labels: List[str], target: str
+) -> Optional[str]:
+    """
+    一覧の全ての名前と編集距離を計算する(変更前の検索)
+    """
+    target = target.replace("\n", "").replace(" ", "")
+    scores = {}
+    for idx, _name in enumerate(names):
+        _score = editdistance.eval(target, _name) / (
+            max(len(_name), len(target)) * 1.00
+        )
+        if _score < EDIT_DISTANCE_THRESHOLD:
+            scores[labels[idx]] = _score
+    if len(scores) == 0:
+        return None
+    return min(scores, key=scores.get)  # type: ignore
+
+
+def make_ocr_like_targets(names: List[str], size: int, seed: int) -> List[str]:
+    """
+    名前の一部の文字を置換・削除したもの、一覧にない文字列を混ぜた検索語を作る
+    """
+    rng = random.Random(seed)
+    chars = sorted(set("".join(names)))
+    targets = []
+    for _ in range(size):
+        name = list(rng.choice(names))
+        for _ in range(rng.randint(0, 2)):
+            k = rng.randrange(len(name))
+            if rng.random() < 0.5 and len(name) > 1:
+                del name[k]
+            else:
+                name[k] = rng.choice(chars)
+        if rng.random() < 0.2:
+            name = [rng.choice(chars) for _ in range(rng.randint(1, 10))]
+        targets.append("".join(name))
+    return targets
+
+
+def measure(
+    search: Callable[[str], Optional[str]], targets: List[str]
+) -> tuple[float, list]:
+    start_time = time.perf_counter()
+    results = [search(target) for target in targets]
+    return len(targets) / (time.perf_counter() - start_time), results
+
+
+@click.command()
+@click.option("--size", required=False, type=int, default=2000)
+@click.option("--seed", required=False, type=int, default=0)
+def benchmark_name_index(size: int, seed: int) -> None:
+    multi_lang_names = pd.read_csv("data/pokemon_name_multi_language.csv")
+    labels = multi_lang_names["ja"].values.tolist()
+    for column in ["ja", "en", "fr", "de", "es", "ko", "zh_HK", "zh"]:
+        names = multi_lang_names[column].values.tolist()
+        targets = make_ocr_like_targets(names, size, seed)
+        name_index = NameIndex(names, labels)
+        before, before_results = measure(
+            lambda target: search_name_by_linear_scan(names, labels, target), targets
+        )
+        after, after_results = measure(
+            lambda target: name_index.search(target, EDIT_DISTANCE_THRESHOLD), targets
+        )
+        assert before_results == after_results, f"results differ: {column}"
+        print(
+            f"{column:<6} linear: {before:>8.0f} lookups/sec  "
+            f"index: {after:>8.0f} lookups/sec ({after / before:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    benchmark_name_index()  # type: ignore
@@ -0,0 +1,17 @@
+import click
+
+from poke_battle_logger.name_registry import NAME_REGISTRY_PATH, export_name_registry
+
+
+@click.command()
+@click.option("--output_path", required=False, type=str, default=NAME_REGISTRY_PATH)
+def build_name_registry(output_path: str) -> None:
+    """
+    ポケモン名の CSV から、起動時に読み込む名前の一覧を作る
+    """
+    export_name_registry(output_path)
+    print(f"saved: {output_path}")
+
+
+if __name__ == "__main__":
+    build_name_registry()  # type: ignore
@@ -0,0 +1,58 @@
+import click
+from config.config import (
+    FIRST_RANKING_NUMBER_WINDOW,
+    RANK_DIGIT_TEMPLATE_DIR,
+    RANKING_NUMBER_WINDOW,
+)
+
+from poke_battle_logger.batch.extractor import Extractor
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_reader import read_frames
+from poke_battle_logger.batch.frame_scanner import scan_video
+
+
+@click.command()
+@click.option("--video_path", required=True, type=str)
+@click.option("--lang", required=False, type=str, default="en")
+@click.option(
+    "--template_dir", required=False, type=str, default=RANK_DIGIT_TEMPLATE_DIR
+)
+def build_rank_digit_templates(video_path: str, lang: str, template_dir: str) -> None:
+    """
+    動画の順位の画面を OCR で読み、読めた順位から数字のテンプレート(0.png - 9.png)を作る
+
+    抽出時と同じく Extractor で順位を読むので、RankDigitRecognizer.learn で確定した
+    数字のテンプレートが保存される。0-9 が揃わない場合は、別の動画で繰り返す
+    """
+    geometry = FrameGeometry.from_video(video_path)
+    detected_frames, _ = scan_video(video_path, FrameDetector(lang, geometry))
+    first_ranking_frames = set(detected_frames["first_ranking"])
+    target_frames = sorted(first_ranking_frames | set(detected_frames["ranking"]))
+    print(f"{len(target_frames)} rank frames")
+
+    extractor = Extractor(lang)
+    for i, frame in read_frames(video_path, target_frames):
+        if frame is None:
+            continue
+        frame = geometry.to_base_windows(
+            frame, [FIRST_RANKING_NUMBER_WINDOW, RANKING_NUMBER_WINDOW]
+        )
+        try:
+            if i in first_ranking_frames:
+                extractor.extract_first_rank_number(frame)
+            else:
+                extractor.extract_rank_number(frame)
+        except ValueError:
+            # OCR で数字が読めなかったフレーム
+            continue
+
+    saved = extractor.rank_digit_recognizer.save_templates(template_dir)
+    print(f"saved digits: {saved}")
+    missing = sorted(set(range(10)) - set(saved))
+    if missing:
+        print(f"missing digits: {missing}")
+
+
+if __name__ == "__main__":
+    build_rank_digit_templates()  # type: ignore
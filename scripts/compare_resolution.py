@@ -0,0 +1,141 @@
+from typing import Any, Callable, Dict, List
+
+import click
+import numpy as np
+
+from poke_battle_logger.batch.extractor import Extractor
+from poke_battle_logger.batch.frame_compressor import (
+    frame_compress,
+    message_frame_compress,
+)
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_reader import read_frames
+from poke_battle_logger.batch.frame_scanner import scan_video
+from poke_battle_logger.batch.frame_store import TASK_WINDOWS
+from poke_battle_logger.batch.pokemon_extractor import PokemonExtractor
+from poke_battle_logger.batch.streaming_pipeline import select_segment_targets
+
+
+def extraction_targets(detected_frames: Dict[str, List[int]]) -> Dict[str, List[int]]:
+    """
+    検出結果から、抽出に使うフレーム番号を検出の種類ごとに返す
+    """
+    targets: Dict[str, List[int]] = {}
+    for key, frames in detected_frames.items():
+        if key == "message_window":
+            segments = message_frame_compress(frames)
+        else:
+            segments = frame_compress(frames, ignore_short_frames=key == "standing_by")
+        targets[key] = [
+            frame
+            for segment in segments
+            if segment
+            for frame in select_segment_targets(key, segment)
+        ]
+    return targets
+
+
+def extraction_functions(language: str) -> Dict[str, Callable[[np.ndarray], Any]]:
+    """
+    検出の種類ごとの抽出処理(OpenAI API は使わず、OCR とテンプレートマッチングの結果を比べる)
+    """
+    extractor = Extractor(language)
+    pokemon_extractor = PokemonExtractor()
+    return {
+        "first_ranking": extractor.extract_first_rank_number,
+        "ranking": extractor.extract_rank_number,
+        "select_done": extractor.extract_pokemon_select_numbers,
+        "standing_by": pokemon_extractor.extract_pre_battle_pokemons,
+        "level_50": extractor.extract_pokemon_name_in_battle,
+        "win_or_lost": extractor.extract_win_or_lost,
+        "message_window": extractor.recognize_message,
+        "move": extractor.extract_move,
+    }
+
+
+def extract_targets(
+    video_path: str,
+    targets: Dict[str, List[int]],
+    functions: Dict[str, Callable[[np.ndarray], Any]],
+) -> Dict[str, Dict[int, Any]]:
+    """
+    抽出に使うフレームを、PokemonBattleExtractor と同じく抽出で参照するウィンドウだけ
+    BASE_FRAME_SIZE に変換して抽出する
+    """
+    geometry = FrameGeometry.from_video(video_path)
+    results: Dict[str, Dict[int, Any]] = {key: {} for key in targets}
+    for key, frame_numbers in targets.items():
+        for frame_number, frame in read_frames(video_path, sorted(frame_numbers)):
+            if frame is None:
+                continue
+            base_frame = geometry.to_base_windows(frame, TASK_WINDOWS[key])
+            results[key][frame_number] = functions[key](base_frame)
+    return results
+
+
+@click.command()
+@click.option("--video_path_1080", required=True, type=str)
+@click.option("--video_path_720", required=True, type=str)
+@click.option("--language", required=False, type=str, default="en")
+@click.option("--compare_extraction", is_flag=True, default=False)
+def compare_resolution(
+    video_path_1080: str, video_path_720: str, language: str, compare_extraction: bool
+) -> None:
+    """
+    同じ試合の 1080p と 720p の動画で、検出結果と抽出に使うフレームを比較する
+
+    compare_extraction の場合は、両方で抽出に使うフレームの抽出結果(OCR・テンプレートマッチング)も比較する
+    """
+    results = {}
+    for name, video_path in [("1080p", video_path_1080), ("720p", video_path_720)]:
+        geometry = FrameGeometry.from_video(video_path)
+        detected_frames, total_frames = scan_video(
+            video_path, FrameDetector(language, geometry)
+        )
+        print(f"{name}: {geometry.width}x{geometry.height}, {total_frames} frames")
+        results[name] = detected_frames
+
+    targets_1080 = extraction_targets(results["1080p"])
+    targets_720 = extraction_targets(results["720p"])
+    print("key             detected(1080p/720p/common)  targets(1080p/720p/common)")
+    for key in results["1080p"]:
+        detected_1080 = set(results["1080p"][key])
+        detected_720 = set(results["720p"][key])
+        target_1080 = set(targets_1080[key])
+        target_720 = set(targets_720[key])
+        print(
+            f"{key:<16}"
+            f"{len(detected_1080):>6}/{len(detected_720):>6}/"
+            f"{len(detected_1080 & detected_720):>6}        "
+            f"{len(target_1080):>4}/{len(target_720):>4}/"
+            f"{len(target_1080 & target_720):>4}"
+        )
+
+    if not compare_extraction:
+        return
+    common_targets = {
+        key: sorted(set(targets_1080[key]) & set(targets_720[key]))
+        for key in targets_1080
+    }
+    functions = extraction_functions(language)
+    extracted_1080 = extract_targets(video_path_1080, common_targets, functions)
+    extracted_720 = extract_targets(video_path_720, common_targets, functions)
+    print("key             extracted(same/compared)")
+    for key in common_targets:
+        same = [
+            frame_number
+            for frame_number, value in extracted_1080[key].items()
+            if extracted_720[key].get(frame_number) == value
+        ]
+        print(f"{key:<16}{len(same):>6}/{len(extracted_1080[key]):>6}")
+        for frame_number, value in extracted_1080[key].items():
+            if frame_number not in same:
+                print(
+                    f"    frame {frame_number}: 1080p={value!r} "
+                    f"720p={extracted_720[key].get(frame_number)!r}"
+                )
+
+
+if __name__ == "__main__":
+    compare_resolution()  # type: ignore
@@ -5,8 +5,14 @@ from typing import Tuple
 
 import click
 import resend
+from config.config import (
+    MESSAGE_CORRECTION_MAX_CONCURRENCY,
+    MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+)
 from rich.logging import RichHandler
 
+from poke_battle_logger.batch.ffmpeg_frame_source import FRAME_SOURCES
+from poke_battle_logger.batch.frame_scanner import DEFAULT_SCAN_STRIDES
 from poke_battle_logger.batch.pokemon_battle_extractor import PokemonBattleExtractor
 from poke_battle_logger.database.database_handler import DatabaseHandler
 from poke_battle_logger.gcs_handler import GCSHandler
@@ -40,7 +46,72 @@ def get_trainer_id_in_DB_and_email(trainer_id: str) -> Tuple[int, str]:
 @click.option("--video_id", required=True, type=str)
 @click.option("--language", required=True, type=str)
 @click.option("--final_result", required=False, type=int)
-def run_extractor(trainer_id: str, video_id: str, language: str, final_result: int):
+@click.option("--detection_workers", required=False, type=int, default=1)
+@click.option("--coarse_scan", is_flag=True, default=False)
+@click.option("--detection_batch_size", required=False, type=int, default=1)
+@click.option("--scene_grammar", is_flag=True, default=False)
+@click.option("--detection_cache", is_flag=True, default=False)
+@click.option("--streaming", is_flag=True, default=False)
+@click.option("--extraction_workers", required=False, type=int, default=2)
+@click.option("--change_detection", is_flag=True, default=False)
+@click.option(
+    "--frame_source", required=False, type=click.Choice(FRAME_SOURCES), default="opencv"
+)
+@click.option(
+    "--max_height",
+    required=False,
+    type=click.Choice(["720", "1080"]),
+    default="1080",
+    help=(
+        "[experimental] 720 downloads and decodes 720p. Extraction results at 720p "
+        "have not been compared with 1080p on real battle videos yet "
+        "(scripts/compare_resolution.py)."
+    ),
+)
+@click.option("--name_window_cache", is_flag=True, default=False)
+@click.option("--adaptive_name_langs", is_flag=True, default=False)
+@click.option("--tiled_ocr", is_flag=True, default=False)
+@click.option("--batch_message_correction", is_flag=True, default=False)
+@click.option("--async_message_correction", is_flag=True, default=False)
+@click.option("--message_correction_cache", is_flag=True, default=False)
+@click.option("--local_message_fixer", is_flag=True, default=False)
+@click.option(
+    "--message_correction_concurrency",
+    required=False,
+    type=int,
+    default=MESSAGE_CORRECTION_MAX_CONCURRENCY,
+)
+@click.option(
+    "--message_correction_rate",
+    required=False,
+    type=float,
+    default=MESSAGE_CORRECTION_REQUESTS_PER_SECOND,
+)
+def run_extractor(
+    trainer_id: str,
+    video_id: str,
+    language: str,
+    final_result: int,
+    detection_workers: int,
+    coarse_scan: bool,
+    detection_batch_size: int,
+    scene_grammar: bool,
+    detection_cache: bool,
+    streaming: bool,
+    extraction_workers: int,
+    change_detection: bool,
+    frame_source: str,
+    max_height: str,
+    name_window_cache: bool,
+    adaptive_name_langs: bool,
+    tiled_ocr: bool,
+    batch_message_correction: bool,
+    async_message_correction: bool,
+    message_correction_cache: bool,
+    local_message_fixer: bool,
+    message_correction_concurrency: int,
+    message_correction_rate: float,
+):
     trainer_id_in_DB, email = get_trainer_id_in_DB_and_email(trainer_id)
 
     gcs_handler = GCSHandler()
@@ -52,6 +123,25 @@ def run_extractor(trainer_id: str, video_id: str, language: str, final_result: i
         trainer_id_in_DB=trainer_id_in_DB,
         email=email,
         final_result=final_result,
+        detection_workers=detection_workers,
+        scan_strides=DEFAULT_SCAN_STRIDES if coarse_scan else None,
+        detection_batch_size=detection_batch_size,
+        scene_grammar=scene_grammar,
+        use_detection_cache=detection_cache,
+        streaming=streaming,
+        extraction_workers=extraction_workers,
+        change_detection=change_detection,
+        frame_source=frame_source,
+        max_height=int(max_height),
+        use_name_window_cache=name_window_cache,
+        adaptive_name_langs=adaptive_name_langs,
+        tiled_ocr=tiled_ocr,
+        batch_message_correction=batch_message_correction,
+        async_message_correction=async_message_correction,
+        message_correction_concurrency=message_correction_concurrency,
+        message_correction_rate=message_correction_rate,
+        use_message_correction_cache=message_correction_cache,
+        local_message_fixer=local_message_fixer,
     )
 
     try:
@@ -46,30 +46,31 @@ def get_frame_from_video(video_path, frame_number):
 
 
 def test_frame_detector_methods(frame, frame_detector):
-    """Test all FrameDetector methods on the given frame."""
+    """Classify the frame with FrameDetector.classify and collect every detector's verdict."""
     results = {}
 
-    methods_to_test = [
-        ("is_message_window_frame", "Message Window"),
-        ("is_level_50_frame", "Level 50"),
-        ("is_first_ranking_frame", "First Ranking"),
-        ("is_select_done_frame", "Select Done"),
-        ("is_standing_by_frame", "Standing By"),
-        ("is_ranking_frame", "Ranking"),
-        ("is_win_or_lost_frame", "Win/Lost"),
-        ("is_move_frame", "Move"),
-        ("is_pokemon_selection_frame", "Pokemon Selection"),
+    scenes_to_test = [
+        ("message_window", "Message Window"),
+        ("level_50", "Level 50"),
+        ("first_ranking", "First Ranking"),
+        ("select_done", "Select Done"),
+        ("standing_by", "Standing By"),
+        ("ranking", "Ranking"),
+        ("win_or_lost", "Win/Lost"),
+        ("move", "Move"),
+        ("pokemon_selection", "Pokemon Selection"),
     ]
 
-    for method_name, display_name in methods_to_test:
-        try:
-            method = getattr(frame_detector, method_name)
-            result = method(frame)
-            results[display_name] = result
-        except Exception as e:
-            results[display_name] = f"Error: {str(e)}"
+    try:
+        classification = frame_detector.classify(frame, with_scores=True)
+    except Exception as e:
+        return {"Scene": f"Error: {str(e)}"}, {}
 
-    return results
+    results["Scene"] = classification.label
+    for scene, display_name in scenes_to_test:
+        results[display_name] = scene in classification.detected
+
+    return results, classification.scores
 
 
 def draw_detection_regions(frame):
@@ -341,7 +342,7 @@ def main():
                 st.subheader("Detection Results")
 
                 # Test all frame detector methods
-                results = test_frame_detector_methods(frame, frame_detector)
+                results, scores = test_frame_detector_methods(frame, frame_detector)
 
                 # Display results in a nice format
                 for method_name, result in results.items():
@@ -353,7 +354,11 @@ def main():
 
                 # Show summary
                 true_count = sum(1 for r in results.values() if r is True)
-                st.markdown(f"**Total Detections**: {true_count}/{len(results)}")
+                st.markdown(f"**Total Detections**: {true_count}/{len(results) - 1}")
+
+                with st.expander("Scores"):
+                    for score_name, score in scores.items():
+                        st.markdown(f"**{score_name}**: {score:.3f}")
 
             if show_move_extract_debug_info:
                 # Move extraction debugging (full width)
@@ -545,7 +550,7 @@ def main():
                     for sample_frame in sample_frames:
                         test_frame, _ = get_frame_from_video(video_path, sample_frame)
                         if test_frame is not None:
-                            frame_results = test_frame_detector_methods(
+                            frame_results, _ = test_frame_detector_methods(
                                 test_frame, frame_detector
                             )
                             for method, result in frame_results.items():
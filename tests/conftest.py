@@ -0,0 +1,78 @@
+from typing import Callable, Dict, List, Tuple
+
+import cv2
+import numpy as np
+import pytest
+from config.config import (
+    RANKING_TEMPLATE_PATH,
+    RANKING_WINDOW,
+    STANDING_BY_TEMPLATE_PATH,
+    STANDING_BY_WINDOW,
+)
+
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_scanner import scan_video
+
+
+def _write_video(
+    path: str, size: Tuple[int, int], frames: int, draw: Callable[[int], np.ndarray]
+) -> None:
+    writer = cv2.VideoWriter(
+        path, cv2.VideoWriter_fourcc(*"mp4v"), 30, size  # type: ignore
+    )
+    for i in range(frames):
+        writer.write(draw(i))
+    writer.release()
+
+
+@pytest.fixture(scope="session")
+def battle_video(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """
+    20-59 フレーム目に standing_by、90-129 フレーム目に ranking のテンプレートを貼った動画
+    """
+    standing_by_template = cv2.imread(STANDING_BY_TEMPLATE_PATH)
+    ranking_template = cv2.imread(RANKING_TEMPLATE_PATH)
+
+    def draw(i: int) -> np.ndarray:
+        frame = np.full((1080, 1920, 3), 40, dtype=np.uint8)
+        if 20 <= i < 60:
+            frame[
+                STANDING_BY_WINDOW[0] : STANDING_BY_WINDOW[1],
+                STANDING_BY_WINDOW[2] : STANDING_BY_WINDOW[3],
+            ] = standing_by_template
+        if 90 <= i < 130:
+            frame[
+                RANKING_WINDOW[0] : RANKING_WINDOW[1],
+                RANKING_WINDOW[2] : RANKING_WINDOW[3],
+            ] = ranking_template
+        return frame
+
+    video_path = str(tmp_path_factory.mktemp("video") / "battle.mp4")
+    _write_video(video_path, (1920, 1080), 150, draw)
+    return video_path
+
+
+@pytest.fixture(scope="session")
+def battle_video_scan(battle_video: str) -> Tuple[Dict[str, List[int]], int]:
+    """
+    battle_video を全フレーム判定した scan_video の結果(各走査方法の比較対象)
+    """
+    return scan_video(battle_video, FrameDetector("en"))
+
+
+@pytest.fixture(scope="session")
+def numbered_video(tmp_path_factory: pytest.TempPathFactory) -> str:
+    """
+    各フレームにフレーム番号を描いた 640x360・300 フレームの動画
+    """
+
+    def draw(i: int) -> np.ndarray:
+        frame = np.full((360, 640, 3), 40, dtype=np.uint8)
+        cv2.putText(
+            frame, str(i), (20, 120), cv2.FONT_HERSHEY_SIMPLEX, 3, (255, 255, 255), 5
+        )
+        return frame
+
+    video_path = str(tmp_path_factory.mktemp("video") / "numbered.mp4")
+    _write_video(video_path, (640, 360), 300, draw)
+    return video_path
@@ -0,0 +1,173 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from poke_battle_logger.batch.async_message_correction import (
+    AsyncMessageCorrectionStage,
+    TokenBucket,
+)
+from poke_battle_logger.batch.message_correction import (
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+
+CONTEXT1 = BattleMessageContext(("コライドン",), ("Koraidon",), ("ミライドン",))
+CONTEXT2 = BattleMessageContext(("ギャラドス",), ("Gyarados",), ("カイリュー",))
+
+
+class StubServer:
+    """
+    メッセージを大文字にして返す API のスタブ
+
+    最初のリクエストは 429 を返し、同時に処理しているリクエスト数の最大値を記録する
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.request_count = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub.lock:
+                    stub.request_count += 1
+                    is_first = stub.request_count == 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(0.02)
+                with stub.lock:
+                    stub.in_flight -= 1
+                if is_first:
+                    self.send_response(429)
+                    self.end_headers()
+                    return
+                if self.path == "/messages":
+                    response = {
+                        str(m["frame_number"]): m["message"].upper()
+                        for m in body["messages"][:-1]
+                    }
+                else:
+                    response = {"message": f" {body['message'].upper()} "}
+                payload = json.dumps(response).encode()
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    async def post(self, path, body):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+
+        def send():
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())
+
+        return await asyncio.to_thread(send)
+
+    async def fix_message(self, request):
+        return (await self.post("/message", {"message": request.message}))["message"]
+
+    async def fix_messages(self, requests, context):
+        response = await self.post(
+            "/messages",
+            {
+                "messages": [
+                    {"frame_number": r.frame_number, "message": r.message}
+                    for r in requests
+                ]
+            },
+        )
+        return {int(k): v for k, v in response.items()}
+
+
+def build_request(frame_number, message, context=CONTEXT1):
+    return BattleMessageRequest(
+        frame_number=frame_number,
+        message=message,
+        your_current_pokemon_name="コライドン",
+        opponent_current_pokemon_name="ミライドン",
+        context=context,
+    )
+
+
+def test_stage_corrects_messages_concurrently_with_retries():
+    stub = StubServer()
+    stage = AsyncMessageCorrectionStage(
+        stub.fix_message,
+        max_concurrency=3,
+        requests_per_second=1000,
+        burst=100,
+        backoff_seconds=0.01,
+    ).start()
+
+    # Act
+    for i in reversed(range(12)):
+        stage.submit(build_request(i * 10, f"message{i}"))
+    stage.submit(build_request(200, ""))
+    fixed_messages = stage.join()
+    stub.server.shutdown()
+
+    # Assert
+    assert list(fixed_messages.keys()) == [i * 10 for i in range(12)] + [200]
+    assert fixed_messages[30] == "MESSAGE3"
+    assert fixed_messages[200] == ""
+    assert stage.retry_count == 1
+    assert stage.request_count == 13
+    assert 1 < stub.max_in_flight <= 3
+
+
+def test_stage_batches_by_battle_and_falls_back():
+    stub = StubServer()
+    stage = AsyncMessageCorrectionStage(
+        stub.fix_message,
+        stub.fix_messages,
+        requests_per_second=1000,
+        burst=100,
+        backoff_seconds=0.01,
+    ).start()
+
+    # Act
+    stage.submit(build_request(10, "a"))
+    stage.submit(build_request(20, "b"))
+    stage.submit(build_request(30, "c", CONTEXT2))
+    stage.submit(build_request(40, "d", CONTEXT2))
+    fixed_messages = stage.join()
+    stub.server.shutdown()
+
+    # Assert
+    assert fixed_messages == {10: "A", 20: "B", 30: "C", 40: "D"}
+    # 対戦ごとに1回(1回目は 429 で再試行)、最後のメッセージは結果が返らないので1つずつ修正する
+    assert stage.fallback_count == 2
+    assert stage.request_count == 2 + 1 + 2
+
+
+def test_token_bucket_limits_rate():
+    async def acquire_all():
+        token_bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(7):
+            await token_bucket.acquire()
+        return time.monotonic() - start
+
+    # Act
+    elapsed = asyncio.run(acquire_all())
+
+    # Assert
+    # 最初の2回はすぐに、残りの5回は 1/50 秒ずつ待つ
+    assert elapsed >= 0.09
@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+from config.config import (
+    FIRST_RANKING_WINDOW,
+    RANKING_TEMPLATE_PATH,
+    WIN_LOST_WINDOW,
+    WIN_TEMPLATE_PATH,
+)
+
+from poke_battle_logger.batch.batch_template_matcher import (
+    BatchTemplateMatcher,
+    batch_to_gray,
+)
+
+rng = np.random.default_rng(0)
+
+
+def _images_with_template(template: np.ndarray, window: tuple) -> np.ndarray:
+    height, width = window[1] - window[0], window[3] - window[2]
+    images = rng.integers(0, 256, (4, height, width), dtype=np.uint8)
+    images[0, : template.shape[0], : template.shape[1]] = template
+    images[1] = 0
+    noisy_template = template.astype(np.int32) + rng.integers(-20, 20, template.shape)
+    images[2, -template.shape[0] :, -template.shape[1] :] = np.clip(
+        noisy_template, 0, 255
+    )
+    return images
+
+
+def test_batch_template_matcher_matches_cv2():
+    for template_path, window in [
+        (RANKING_TEMPLATE_PATH, FIRST_RANKING_WINDOW),
+        (WIN_TEMPLATE_PATH, WIN_LOST_WINDOW),
+    ]:
+        template = cv2.imread(template_path, 0)
+        images = _images_with_template(template, window)
+        matcher = BatchTemplateMatcher(template)
+
+        # Act
+        results = matcher.match(images)
+        max_scores = matcher.max_scores(images)
+
+        # Assert
+        expected = np.stack(
+            [
+                cv2.matchTemplate(image, template, cv2.TM_CCOEFF_NORMED)
+                for image in images
+            ]
+        )
+        np.testing.assert_allclose(results, expected, atol=1e-4)
+        np.testing.assert_allclose(max_scores, expected.max(axis=(1, 2)), atol=1e-4)
+        assert max_scores[0] > 0.99
+        assert max_scores[1] == 0
+
+
+def test_batch_to_gray_matches_cv2():
+    images = rng.integers(0, 256, (3, 40, 60, 3), dtype=np.uint8)
+
+    for code in [cv2.COLOR_RGB2GRAY, cv2.COLOR_BGR2GRAY]:
+        # Act
+        gray = batch_to_gray(images, code)
+
+        # Assert
+        for image, gray_image in zip(images, gray):
+            np.testing.assert_array_equal(gray_image, cv2.cvtColor(image, code))
@@ -0,0 +1,41 @@
+from poke_battle_logger.batch.detection_cache import (
+    detector_version_key,
+    load_detection_cache,
+    save_detection_cache,
+)
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_scanner import DETECTION_TARGETS
+
+frame_detector = FrameDetector("en")
+
+
+def test_detection_cache_round_trip(tmp_path):
+    path = str(tmp_path / "detection_cache" / "video_id.npz")
+    detected_frames = {key: [] for key in DETECTION_TARGETS}
+    detected_frames["standing_by"] = list(range(20, 60))
+    detected_frames["message_window"] = [100, 101, 250]
+    version_key = detector_version_key(frame_detector)
+
+    # Act
+    save_detection_cache(path, detected_frames, 3000, version_key)
+    cached = load_detection_cache(path, version_key)
+
+    # Assert
+    assert cached == (detected_frames, 3000)
+
+
+def test_detection_cache_ignores_other_version(tmp_path):
+    path = str(tmp_path / "video_id.npz")
+    detected_frames = {key: [1, 2, 3] for key in DETECTION_TARGETS}
+    save_detection_cache(
+        path, detected_frames, 10, detector_version_key(frame_detector)
+    )
+
+    # Act
+    coarse_scan_key = detector_version_key(frame_detector, strides={"ranking": 10})
+    japanese_key = detector_version_key(FrameDetector("ja"))
+
+    # Assert
+    assert load_detection_cache(path, coarse_scan_key) is None
+    assert load_detection_cache(path, japanese_key) is None
+    assert load_detection_cache(str(tmp_path / "not_exists.npz"), "key") is None
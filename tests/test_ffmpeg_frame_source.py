@@ -0,0 +1,104 @@
+import shutil
+
+import cv2
+import numpy as np
+import pytest
+
+from poke_battle_logger.batch.ffmpeg_frame_source import (
+    FFmpegFrameSource,
+    WindowFrame,
+    build_filter_graph,
+    build_tile_layout,
+)
+
+
+def test_build_tile_layout_and_filter_graph():
+    windows = [(801, 840, 285, 331), (50, 90, 1560, 1670), (801, 840, 285, 331)]
+
+    # Act
+    layout, canvas_size = build_tile_layout(windows, 1080, 1920)
+    filter_graph = build_filter_graph(layout, canvas_size[1], "bgr24")
+    bounding_layout, bounding_size = build_tile_layout(
+        [(0, 100, 0, 1000), (100, 200, 0, 10)], 1080, 1920
+    )
+
+    # Assert
+    assert layout == [((50, 90, 1560, 1670), 0), ((800, 840, 284, 332), 40)]
+    assert canvas_size == (80, 110)
+    assert filter_graph == (
+        "[0:v]split=2[out_s0][out_s1];"
+        "[out_s0]crop=110:40:1560:50,pad=110:40:0:0[out_c0];"
+        "[out_s1]crop=48:40:284:800,pad=110:40:0:0[out_c1];"
+        "[out_c0][out_c1]vstack=inputs=2,format=bgr24[out]"
+    )
+    # 並べると幅を揃える分だけ大きくなる場合は、囲む領域1つを切り出す
+    assert bounding_layout == [((0, 200, 0, 1000), 0)]
+    assert bounding_size == (200, 1000)
+
+
+def test_window_frame_slices_decoded_windows():
+    frame = np.arange(200 * 300 * 3, dtype=np.uint32).reshape(200, 300, 3)
+    windows = [(10, 40, 20, 80), (100, 150, 200, 260)]
+    layout, canvas_size = build_tile_layout(windows, 200, 300)
+    canvas = np.concatenate(
+        [
+            np.pad(
+                frame[top:bottom, left:right],
+                ((0, 0), (0, canvas_size[1] - (right - left)), (0, 0)),
+            )
+            for (top, bottom, left, right), _ in layout
+        ]
+    )
+
+    # Act
+    window_frame = WindowFrame([(canvas, layout)], frame.shape)
+
+    # Assert
+    assert (window_frame[10:40, 20:80] == frame[10:40, 20:80]).all()
+    assert (window_frame[110:120, 210:250] == frame[110:120, 210:250]).all()
+    # デコードしていない領域は参照できない
+    with pytest.raises(IndexError):
+        window_frame[30:110, 20:80]
+
+
+@pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg is not installed")
+def test_ffmpeg_frame_source_matches_video_capture(numbered_video):
+    gray_window = (20, 140, 10, 200)
+    color_window = (200, 300, 100, 400)
+    video = cv2.VideoCapture(numbered_video)
+    expected = [video.read()[1] for _ in range(300)]
+    video.release()
+
+    # Act
+    frame_source = FFmpegFrameSource(
+        numbered_video, [gray_window], color_windows=[color_window]
+    )
+    frames = []
+    while True:
+        ret, frame = frame_source.read()
+        if not ret:
+            break
+        frames.append(frame.copy())
+    frame_source.release()
+
+    # Assert
+    assert len(frames) == 300
+    for frame, expected_frame in zip(frames, expected):
+        gray = frame[gray_window[0] : gray_window[1], gray_window[2] : gray_window[3]]
+        color = frame[
+            color_window[0] : color_window[1], color_window[2] : color_window[3]
+        ]
+        expected_gray = cv2.cvtColor(
+            expected_frame[
+                gray_window[0] : gray_window[1], gray_window[2] : gray_window[3]
+            ],
+            cv2.COLOR_BGR2GRAY,
+        )
+        expected_color = expected_frame[
+            color_window[0] : color_window[1], color_window[2] : color_window[3]
+        ]
+        assert gray.shape == expected_gray.shape
+        assert color.shape == expected_color.shape
+        # デコーダの色変換の違いによる誤差だけを許容する
+        assert np.abs(gray.astype(int) - expected_gray).mean() < 2
+        assert np.abs(color.astype(int) - expected_color).mean() < 2
@@ -0,0 +1,29 @@
+import numpy as np
+from config.config import POKEMON_MESSAGE_WINDOW
+
+from poke_battle_logger.batch.frame_change_detector import FrameChangeDetector
+
+
+def test_frame_change_detector_reuses_unchanged_frames():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 200, (1080, 1920, 3), dtype=np.uint8)
+    noisy_frame = frame.copy()
+    noisy_frame[rng.random((1080, 1920)) < 0.01] += 1
+    message_frame = frame.copy()
+    message_frame[
+        POKEMON_MESSAGE_WINDOW[0] : POKEMON_MESSAGE_WINDOW[0] + 20,
+        POKEMON_MESSAGE_WINDOW[2] : POKEMON_MESSAGE_WINDOW[3],
+    ] = 255
+    frame_change_detector = FrameChangeDetector(max_reuse_frames=2)
+
+    # Act
+    results = [
+        frame_change_detector.is_changed(f)
+        for f in [frame, frame, noisy_frame, noisy_frame, message_frame]
+    ]
+
+    # Assert
+    # 3フレーム目までは使い回し、4フレーム目は使い回しの上限で判定し直す
+    assert results == [True, False, False, True, True]
+    assert frame_change_detector.checked_frames == 5
+    assert frame_change_detector.reused_frames == 2
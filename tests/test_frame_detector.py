@@ -0,0 +1,69 @@
+import cv2
+import numpy as np
+from config.config import (
+    LEVEL_50_TEMPLATE_PATH,
+    LEVEL_50_WINDOW,
+    MOVE_ANKER_POSITION,
+    MOVE_ANKER_TEMPLATE,
+    STANDING_BY_TEMPLATE_PATH,
+    STANDING_BY_WINDOW,
+)
+
+from poke_battle_logger.batch.frame_detector import (
+    SCENE_LEVEL_50,
+    SCENE_MOVE,
+    SCENE_NONE,
+    SCENE_STANDING_BY,
+    FrameDetector,
+)
+
+frame_detector = FrameDetector("en")
+
+
+def _frame_with_templates(*window_and_paths: tuple) -> np.ndarray:
+    frame = np.full((1080, 1920, 3), 40, dtype=np.uint8)
+    for window, path in window_and_paths:
+        template = cv2.imread(path)
+        frame[
+            window[0] : window[0] + template.shape[0],
+            window[2] : window[2] + template.shape[1],
+        ] = template
+    return frame
+
+
+def test_classify_standing_by():
+    frame = _frame_with_templates((STANDING_BY_WINDOW, STANDING_BY_TEMPLATE_PATH))
+
+    # Act
+    classification = frame_detector.classify(frame)
+
+    # Assert
+    assert classification.label == SCENE_STANDING_BY
+    assert frame_detector.is_standing_by_frame(frame)
+
+
+def test_classify_move_with_scores():
+    frame = _frame_with_templates(
+        (LEVEL_50_WINDOW, LEVEL_50_TEMPLATE_PATH),
+        (MOVE_ANKER_POSITION, MOVE_ANKER_TEMPLATE),
+    )
+
+    # Act
+    classification = frame_detector.classify(frame, with_scores=True)
+
+    # Assert
+    assert classification.label == SCENE_MOVE
+    assert SCENE_LEVEL_50 in classification.detected
+    assert classification.scores["level_50"] > 0.99
+    assert "ranking" in classification.scores
+
+
+def test_classify_none():
+    frame = np.zeros((1080, 1920, 3), dtype=np.uint8)
+
+    # Act
+    classification = frame_detector.classify(frame)
+
+    # Assert
+    assert classification.label == SCENE_NONE
+    assert classification.detected == []
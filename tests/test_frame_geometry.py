@@ -0,0 +1,96 @@
+import cv2
+import numpy as np
+from config.config import (
+    LEVEL_50_TEMPLATE_PATH,
+    LEVEL_50_WINDOW,
+    RANKING_TEMPLATE_PATH,
+    RANKING_WINDOW,
+    SELECT_DONE_TEMPLATE_PATH,
+    STANDING_BY_TEMPLATE_PATH,
+    STANDING_BY_WINDOW,
+    WIN_LOST_WINDOW,
+    WIN_TEMPLATE_PATH,
+)
+
+from poke_battle_logger.batch.frame_detector import (
+    POKEMON_SELECT_DONE_WINDOW,
+    FrameDetector,
+)
+from poke_battle_logger.batch.frame_geometry import FrameGeometry
+from poke_battle_logger.batch.frame_store import TASK_WINDOWS
+
+
+def _frame_with_template(window: tuple, path: str) -> np.ndarray:
+    frame = np.full((1080, 1920, 3), 40, dtype=np.uint8)
+    template = cv2.imread(path)
+    frame[
+        window[0] : window[0] + template.shape[0],
+        window[2] : window[2] + template.shape[1],
+    ] = template
+    return frame
+
+
+def test_frame_geometry_scales_windows_and_templates():
+    geometry = FrameGeometry(720, 1280)
+    template = np.zeros((155, 500), dtype=np.uint8)
+
+    # Act
+    window = geometry.window(RANKING_WINDOW)
+    scaled_template = geometry.template(template, RANKING_WINDOW)
+
+    # Assert
+    assert window == (240, 343, 473, 807)
+    assert scaled_template.shape[0] <= window[1] - window[0]
+    assert scaled_template.shape[1] <= window[3] - window[2]
+    assert FrameGeometry().window(RANKING_WINDOW) == RANKING_WINDOW
+    assert geometry.to_base(np.zeros((720, 1280, 3), np.uint8)).shape == (
+        1080,
+        1920,
+        3,
+    )
+
+
+def test_to_base_windows_matches_to_base_in_windows():
+    geometry = FrameGeometry(720, 1280)
+    noise = np.random.default_rng(0).integers(0, 256, (720, 1280, 3), dtype=np.uint8)
+    frame = cv2.GaussianBlur(noise, (5, 5), 0)
+    windows = TASK_WINDOWS["message_window"] + TASK_WINDOWS["level_50"]
+
+    # Act
+    base_frame = geometry.to_base(frame)
+    base_windows_frame = geometry.to_base_windows(frame, windows)
+
+    # Assert
+    assert base_windows_frame.shape == base_frame.shape
+    for top, bottom, left, right in windows:
+        difference = np.abs(
+            base_windows_frame[top:bottom, left:right].astype(np.int16)
+            - base_frame[top:bottom, left:right].astype(np.int16)
+        )
+        assert difference.max() <= 1
+    assert base_windows_frame[0:10, 0:10].max() == 0
+
+
+def test_frame_detector_detects_scenes_in_720p_frames():
+    frames = [
+        np.full((1080, 1920, 3), 40, dtype=np.uint8),
+        _frame_with_template(RANKING_WINDOW, RANKING_TEMPLATE_PATH),
+        _frame_with_template(STANDING_BY_WINDOW, STANDING_BY_TEMPLATE_PATH),
+        _frame_with_template(POKEMON_SELECT_DONE_WINDOW, SELECT_DONE_TEMPLATE_PATH),
+        _frame_with_template(LEVEL_50_WINDOW, LEVEL_50_TEMPLATE_PATH),
+        _frame_with_template(WIN_LOST_WINDOW, WIN_TEMPLATE_PATH),
+    ]
+    frame_detector = FrameDetector("en")
+    frame_detector_720p = FrameDetector("en", FrameGeometry(720, 1280))
+
+    # Act
+    labels = [frame_detector.classify(frame).label for frame in frames]
+    labels_720p = [
+        frame_detector_720p.classify(
+            cv2.resize(frame, (1280, 720), interpolation=cv2.INTER_AREA)
+        ).label
+        for frame in frames
+    ]
+
+    # Assert
+    assert labels_720p == labels
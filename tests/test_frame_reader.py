@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+
+from poke_battle_logger.batch.frame_reader import build_dispatch_table, read_frames
+
+
+def test_build_dispatch_table():
+    # Act
+    dispatch_table = build_dispatch_table(
+        [("ranking", [30, 5]), ("win_or_lost", [5, 6]), ("message_window", [30])]
+    )
+
+    # Assert
+    assert list(dispatch_table.items()) == [
+        (5, ["ranking", "win_or_lost"]),
+        (6, ["win_or_lost"]),
+        (30, ["ranking", "message_window"]),
+    ]
+
+
+def test_read_frames_matches_sequential_read(numbered_video, tmp_path):
+    video = cv2.VideoCapture(numbered_video)
+    sequential = [video.read()[1] for _ in range(300)]
+    video.release()
+    frame_numbers = [3, 4, 10, 180, 181, 299]
+
+    # Act
+    frames = list(read_frames(numbered_video, frame_numbers, max_grab_gap=20))
+    missing = list(read_frames(str(tmp_path / "not_exists.mp4"), [1]))
+
+    # Assert
+    assert [i for i, _ in frames] == frame_numbers
+    for i, frame in frames:
+        np.testing.assert_array_equal(frame, sequential[i])
+    assert missing == [(1, None)]
+
+
+class FailingGrabCapture:
+    """
+    fail_at 回目の grab で、フレームを読み飛ばしたのに False を返す VideoCapture
+    """
+
+    def __init__(self, video, fail_at):
+        self.video = video
+        self.fail_at = fail_at
+        self.grab_count = 0
+
+    def grab(self):
+        self.grab_count += 1
+        return self.video.grab() and self.grab_count != self.fail_at
+
+    def __getattr__(self, name):
+        return getattr(self.video, name)
+
+
+def test_read_frames_seeks_after_grab_failure(numbered_video, monkeypatch):
+    video = cv2.VideoCapture(numbered_video)
+    sequential = [video.read()[1] for _ in range(30)]
+    video.release()
+    video_capture = cv2.VideoCapture
+    monkeypatch.setattr(
+        cv2,
+        "VideoCapture",
+        lambda video_path: FailingGrabCapture(video_capture(video_path), 2),
+    )
+    frame_numbers = [3, 10, 15]
+
+    # Act
+    frames = list(read_frames(numbered_video, frame_numbers, max_grab_gap=20))
+
+    # Assert
+    assert [i for i, _ in frames] == frame_numbers
+    for i, frame in frames:
+        np.testing.assert_array_equal(frame, sequential[i])
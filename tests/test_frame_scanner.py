@@ -0,0 +1,161 @@
+import shutil
+
+import pytest
+
+from poke_battle_logger.batch.frame_detector import FrameDetector
+from poke_battle_logger.batch.frame_scanner import (
+    DEFAULT_SCAN_STRIDES,
+    DETECTION_TARGETS,
+    merge_shard_results,
+    scan_video,
+    scan_video_sharded,
+    split_frame_range,
+)
+from poke_battle_logger.batch.frame_store import FrameStore
+
+
+def test_split_frame_range():
+    # Act
+    frame_ranges = split_frame_range(10, 3)
+
+    # Assert
+    assert frame_ranges == [(0, 3), (3, 6), (6, 10)]
+
+
+def test_merge_shard_results_detects_misaligned_shard():
+    frame_ranges = [(0, 10), (10, 20)]
+    empty = {key: [] for key in DETECTION_TARGETS}
+    shard_results = [
+        {**empty, "ranking": [7, 8, 9]},
+        {**empty, "ranking": [10, 11]},
+    ]
+    overlap_results = [empty, {**empty, "ranking": [7, 8, 9]}]
+    tail_hashes = {7: "a", 8: "b", 9: "c"}
+
+    # Act
+    aligned = merge_shard_results(
+        frame_ranges, shard_results, overlap_results, [tail_hashes, tail_hashes], 3
+    )
+    misaligned_detections = merge_shard_results(
+        frame_ranges,
+        shard_results,
+        [empty, {**empty, "ranking": [8, 9]}],
+        [tail_hashes, tail_hashes],
+        3,
+    )
+    # 検出結果は同じでも、1フレームずれてデコードしている
+    misaligned_frames = merge_shard_results(
+        frame_ranges,
+        shard_results,
+        overlap_results,
+        [tail_hashes, {7: "b", 8: "c", 9: "d"}],
+        3,
+    )
+    # overlap 区間のフレームが全て同じなので、ずれていないか確認できない
+    static_frames = merge_shard_results(
+        frame_ranges,
+        shard_results,
+        overlap_results,
+        [{7: "a", 8: "a", 9: "a"}, {7: "a", 8: "a", 9: "a"}],
+        3,
+    )
+
+    # Assert
+    assert aligned is not None
+    assert aligned["ranking"] == [7, 8, 9, 10, 11]
+    assert misaligned_detections is None
+    assert misaligned_frames is None
+    assert static_frames is None
+
+
+def test_scan_video_sharded_verifies_boundary_frames(
+    battle_video, battle_video_scan, caplog
+):
+    # Act
+    result = scan_video_sharded(battle_video, "en", 3)
+
+    # Assert
+    assert result == battle_video_scan
+    assert "Fall back to sequential scan" not in caplog.text
+
+
+@pytest.mark.parametrize(
+    "scan",
+    [
+        pytest.param(
+            lambda video_path, frame_store: scan_video_sharded(
+                video_path, "en", 3, frame_store=frame_store
+            ),
+            id="sharded",
+        ),
+        pytest.param(
+            # scene_grammar / change_detection ではシャードに分けず、順に判定する
+            lambda video_path, frame_store: scan_video_sharded(
+                video_path,
+                "en",
+                3,
+                frame_store=frame_store,
+                scene_grammar=True,
+                change_detection=True,
+            ),
+            id="sharded_stateful",
+        ),
+        pytest.param(
+            lambda video_path, frame_store: scan_video(
+                video_path,
+                FrameDetector("en"),
+                frame_store=frame_store,
+                strides=DEFAULT_SCAN_STRIDES,
+            ),
+            id="coarse_to_fine",
+        ),
+        pytest.param(
+            lambda video_path, frame_store: scan_video(
+                video_path, FrameDetector("en"), frame_store=frame_store, batch_size=16
+            ),
+            id="batched",
+        ),
+        pytest.param(
+            lambda video_path, frame_store: scan_video(
+                video_path,
+                FrameDetector("en"),
+                frame_store=frame_store,
+                scene_grammar=True,
+            ),
+            id="scene_grammar",
+        ),
+        pytest.param(
+            lambda video_path, frame_store: scan_video(
+                video_path,
+                FrameDetector("en"),
+                frame_store=frame_store,
+                change_detection=True,
+            ),
+            id="change_detection",
+        ),
+        pytest.param(
+            lambda video_path, frame_store: scan_video(
+                video_path,
+                FrameDetector("en"),
+                frame_store=frame_store,
+                frame_source="ffmpeg",
+            ),
+            id="ffmpeg",
+            marks=pytest.mark.skipif(
+                shutil.which("ffmpeg") is None, reason="ffmpeg is not installed"
+            ),
+        ),
+    ],
+)
+def test_scan_video_matches_sequential(battle_video, battle_video_scan, scan):
+    frame_store = FrameStore()
+
+    # Act
+    result = scan(battle_video, frame_store)
+
+    # Assert
+    assert battle_video_scan[0]["standing_by"] == list(range(20, 60))
+    assert battle_video_scan[0]["ranking"] == list(range(90, 130))
+    assert result == battle_video_scan
+    assert 59 in frame_store
+    assert 125 in frame_store
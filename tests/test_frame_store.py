@@ -0,0 +1,69 @@
+import numpy as np
+from config.config import MESSAGE_WINDOW, RANKING_NUMBER_WINDOW
+
+from poke_battle_logger.batch.frame_compressor import frame_compress
+from poke_battle_logger.batch.frame_store import FrameStore
+
+rng = np.random.default_rng(0)
+frames = {i: rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8) for i in range(4)}
+
+
+def _window(frame: np.ndarray, window: tuple) -> np.ndarray:
+    return frame[window[0] : window[1], window[2] : window[3]]
+
+
+def test_frame_store_keeps_segment_tails():
+    frame_store = FrameStore()
+    ranking_frames = list(range(0, 20)) + list(range(300, 303))
+    for i in ranking_frames:
+        frame_store.add("ranking", i, frames[i % 4])
+    frame_store.flush()
+
+    # Act
+    targets = [v[-5] if len(v) >= 5 else v[0] for v in frame_compress(ranking_frames)]
+    stored_frame = frame_store.get(targets[0])
+
+    # Assert
+    assert targets[0] in frame_store
+    assert 0 not in frame_store
+    assert all(i in frame_store for i in range(300, 303))
+    assert stored_frame is not None
+    np.testing.assert_array_equal(
+        _window(stored_frame, RANKING_NUMBER_WINDOW),
+        _window(frames[targets[0] % 4], RANKING_NUMBER_WINDOW),
+    )
+
+
+def test_frame_store_drops_whole_frame_over_budget():
+    frame_store = FrameStore(max_bytes=1)
+    frame_store.add("message_window", 10, frames[0])
+    frame_store.flush()
+
+    # Act
+    results = list(frame_store.iter_frames([10], "video/not_exists.mp4"))
+
+    # Assert
+    assert 10 not in frame_store
+    assert 10 in frame_store.dropped_frame_numbers
+    assert frame_store.stored_bytes == 0
+    assert results[0][0] == 10
+    assert results[0][1] is None
+
+
+def test_frame_store_merge():
+    frame_store1 = FrameStore()
+    frame_store2 = FrameStore()
+    frame_store1.add("message_window", 5, frames[1])
+    frame_store2.add("ranking", 5, frames[1])
+
+    # Act
+    frame_store1.merge(frame_store2)
+    frame_store1.flush()
+    stored_frame = frame_store1.get(5)
+
+    # Assert
+    assert stored_frame is not None
+    for window in [MESSAGE_WINDOW, RANKING_NUMBER_WINDOW]:
+        np.testing.assert_array_equal(
+            _window(stored_frame, window), _window(frames[1], window)
+        )
@@ -0,0 +1,91 @@
+from poke_battle_logger.batch.local_message_fixer import LocalMessageFixer
+from poke_battle_logger.batch.message_correction import (
+    BatchMessageCorrector,
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+
+CONTEXT = BattleMessageContext(
+    ("コライドン", "バドレックス(黒馬)", "キラフロル", "ラグラージ", "オーロンゲ", "ギャラドス"),
+    ("Koraidon", "Calyrex", "Glimmora", "Swampert", "Grimmsnarl", "Gyarados"),
+    ("ミライドン", "キラフロル", "サーフゴー", "カイリュー", "ハバタクカミ", "パオジアン"),
+)
+
+
+def build_request(frame_number, message):
+    return BattleMessageRequest(
+        frame_number=frame_number,
+        message=message,
+        your_current_pokemon_name="バドレックス",
+        opponent_current_pokemon_name="ミライドン",
+        context=CONTEXT,
+    )
+
+
+def test_local_message_fixer_fixes_known_patterns():
+    local_message_fixer = LocalMessageFixer()
+
+    # Act
+    fainted = local_message_fixer.fix(build_request(1, "The opposing キラ フロ ル fainted!"))
+    used = local_message_fixer.fix(build_request(2, "Gyarados used  Watcrfall!"))
+    snapped = local_message_fixer.fix(build_request(3, "バドレツクス used Astral Barrage!"))
+    sent_out = local_message_fixer.fix(build_request(4, "モニ ミニ ジ sent out ミラ イド ン !"))
+
+    # Assert
+    assert fainted == "The opposing キラフロル fainted!"
+    assert used == "Gyarados used Waterfall!"
+    assert snapped == "バドレックス used Astral Barrage!"
+    assert sent_out == "モニミニジ sent out ミライドン!"
+    assert local_message_fixer.stats.local == 4
+
+
+def test_local_message_fixer_routes_unconfident_messages():
+    local_message_fixer = LocalMessageFixer()
+
+    # Act
+    # 名前がチームのどのポケモンにも近くない
+    unknown_name = local_message_fixer.fix(build_request(1, "ZEEE used Encore!"))
+    # "!" が "l" と読み取られている
+    broken_end = local_message_fixer.fix(build_request(2, "バドレックス used Encorel"))
+    # 自分のポケモンではない("The opposing" が無い)
+    wrong_side = local_message_fixer.fix(build_request(3, "サーフゴー fainted!"))
+    unknown_pattern = local_message_fixer.fix(build_request(4, "It's super effective!"))
+    # 技の一覧に近い技が無い
+    unknown_move = local_message_fixer.fix(build_request(5, "Gyarados used Wxtcrfxll!"))
+
+    # Assert
+    assert unknown_name is None
+    assert broken_end is None
+    assert wrong_side is None
+    assert unknown_pattern is None
+    assert unknown_move is None
+    assert (local_message_fixer.stats.local, local_message_fixer.stats.llm) == (0, 5)
+
+
+def test_batch_message_corrector_sends_only_unparsed_messages():
+    sent_messages = []
+
+    def fix_messages(chunk, context):
+        sent_messages.extend(r.message for r in chunk)
+        return {r.frame_number: "fixed" for r in chunk}
+
+    local_message_fixer = LocalMessageFixer()
+    corrector = BatchMessageCorrector(
+        fix_messages, str, local_fixer=local_message_fixer
+    )
+
+    # Act
+    fixed_messages = corrector.correct(
+        [
+            build_request(10, "The opposing ミライ ドン used Electro Drift!"),
+            build_request(20, "ZEEE used Encorel"),
+        ]
+    )
+
+    # Assert
+    assert fixed_messages == {
+        10: "The opposing ミライドン used Electro Drift!",
+        20: "fixed",
+    }
+    assert sent_messages == ["ZEEE used Encorel"]
+    assert local_message_fixer.stats.local_rate == 0.5
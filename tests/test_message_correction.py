@@ -0,0 +1,92 @@
+from poke_battle_logger.batch.message_correction import (
+    BatchMessageCorrector,
+    BattleMessageContext,
+    BattleMessageRequest,
+    chunk_requests,
+    split_by_context,
+)
+
+CONTEXT1 = BattleMessageContext(("コライドン",), ("Koraidon",), ("ミライドン",))
+CONTEXT2 = BattleMessageContext(("ギャラドス",), ("Gyarados",), ("カイリュー",))
+
+
+def build_request(frame_number, message, context=CONTEXT1):
+    return BattleMessageRequest(
+        frame_number=frame_number,
+        message=message,
+        your_current_pokemon_name="コライドン",
+        opponent_current_pokemon_name="ミライドン",
+        context=context,
+    )
+
+
+def test_split_by_context_groups_consecutive_battles():
+    requests = [
+        build_request(30, "c", CONTEXT2),
+        build_request(10, "a"),
+        build_request(20, "b"),
+        build_request(40, "d"),
+    ]
+
+    # Act
+    battles = split_by_context(requests)
+
+    # Assert
+    assert [[r.frame_number for r in battle] for battle in battles] == [
+        [10, 20],
+        [30],
+        [40],
+    ]
+
+
+def test_chunk_requests_respects_limits():
+    requests = [build_request(i, "x" * 40) for i in range(5)]
+
+    # Act
+    by_tokens = chunk_requests(requests, max_tokens=150, max_messages=10)
+    by_messages = chunk_requests(requests, max_tokens=10000, max_messages=2)
+    oversized = chunk_requests(requests[:2], max_tokens=10, max_messages=10)
+
+    # Assert
+    assert [len(chunk) for chunk in by_tokens] == [2, 2, 1]
+    assert [len(chunk) for chunk in by_messages] == [2, 2, 1]
+    assert [len(chunk) for chunk in oversized] == [1, 1]
+
+
+def test_batch_message_corrector_falls_back_per_message():
+    batch_calls = []
+
+    def fix_messages(chunk, context):
+        batch_calls.append(([r.frame_number for r in chunk], context))
+        if context == CONTEXT2:
+            raise RuntimeError("invalid structured output")
+        # 最後のメッセージの結果が返らない場合
+        return {r.frame_number: f" {r.message.upper()} " for r in chunk[:-1]}
+
+    def fix_message(request):
+        return f"single:{request.message}"
+
+    corrector = BatchMessageCorrector(fix_messages, fix_message)
+    requests = [
+        build_request(10, "a"),
+        build_request(20, ""),
+        build_request(30, "b"),
+        build_request(40, "c"),
+        build_request(50, "d", CONTEXT2),
+    ]
+
+    # Act
+    fixed_messages = corrector.correct(requests)
+
+    # Assert
+    assert fixed_messages == {
+        10: "A",
+        20: "",
+        30: "B",
+        40: "single:c",
+        50: "single:d",
+    }
+    # 対戦ごとに1回ずつ、空のメッセージは送らない
+    assert batch_calls == [([10, 30, 40], CONTEXT1), ([50], CONTEXT2)]
+    assert corrector.batch_call_count == 2
+    assert corrector.fallback_count == 2
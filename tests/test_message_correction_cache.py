@@ -0,0 +1,89 @@
+from poke_battle_logger.batch.message_correction import (
+    BatchMessageCorrector,
+    BattleMessageContext,
+    BattleMessageRequest,
+)
+from poke_battle_logger.batch.message_correction_cache import (
+    MessageCorrectionCache,
+    message_correction_key,
+)
+
+CONTEXT1 = BattleMessageContext(("コライドン",), ("Koraidon",), ("ミライドン",))
+CONTEXT2 = BattleMessageContext(("ギャラドス",), ("Gyarados",), ("カイリュー",))
+FINGERPRINT = "gpt-4.1-mini:0123"
+
+
+def build_request(frame_number, message, context=CONTEXT1):
+    return BattleMessageRequest(
+        frame_number=frame_number,
+        message=message,
+        your_current_pokemon_name="コライドン",
+        opponent_current_pokemon_name="ミライドン",
+        context=context,
+    )
+
+
+def test_message_correction_key_normalizes_message():
+    # Act
+    key = message_correction_key(
+        build_request(10, "The opposing  X fainted! "), FINGERPRINT
+    )
+    same_key = message_correction_key(
+        build_request(20, " The opposing X fainted!"), FINGERPRINT
+    )
+    other_context_key = message_correction_key(
+        build_request(10, "The opposing X fainted!", CONTEXT2), FINGERPRINT
+    )
+    # モデルやプロンプトを変えた場合
+    other_corrector_key = message_correction_key(
+        build_request(10, "The opposing X fainted!"), "gpt-4.1-mini:4567"
+    )
+
+    # Assert
+    assert key == same_key
+    assert key != other_context_key
+    assert key != other_corrector_key
+
+
+def test_message_correction_cache_persists_and_evicts(tmp_path):
+    path = str(tmp_path / "cache" / "1.sqlite3")
+    cache = MessageCorrectionCache(path, FINGERPRINT, max_size=2)
+
+    # Act
+    cache.put(build_request(10, "a"), "A")
+    cache.put(build_request(20, "b"), "B")
+    hit = cache.get(build_request(30, "a"))
+    # b は最後に使ったのが a より前なので、c を追加すると削除される
+    cache.put(build_request(40, "c"), "C")
+    cache.close()
+    reopened = MessageCorrectionCache(path, FINGERPRINT, max_size=2)
+
+    # Assert
+    assert hit == "A"
+    assert len(reopened) == 2
+    assert reopened.get(build_request(50, "a")) == "A"
+    assert reopened.get(build_request(60, "b")) is None
+    assert reopened.get(build_request(70, "c")) == "C"
+    assert (reopened.stats.hits, reopened.stats.misses) == (2, 1)
+    reopened.close()
+
+
+def test_batch_message_corrector_skips_cached_messages(tmp_path):
+    batch_calls = []
+
+    def fix_messages(chunk, context):
+        batch_calls.append([r.frame_number for r in chunk])
+        return {r.frame_number: r.message.upper() for r in chunk}
+
+    cache = MessageCorrectionCache(str(tmp_path / "1.sqlite3"), FINGERPRINT)
+    requests = [build_request(10, "a"), build_request(20, "b")]
+
+    # Act
+    first = BatchMessageCorrector(fix_messages, str, cache=cache).correct(requests)
+    # 同じ動画を再処理した場合
+    second = BatchMessageCorrector(fix_messages, str, cache=cache).correct(requests)
+    cache.close()
+
+    # Assert
+    assert first == second == {10: "A", 20: "B"}
+    assert batch_calls == [[10, 20]]
@@ -0,0 +1,39 @@
+import editdistance
+
+from poke_battle_logger.batch.name_index import NameIndex
+
+
+def _linear_search(names, labels, target, threshold):
+    target = target.replace("\n", "").replace(" ", "")
+    scores = {}
+    for idx, name in enumerate(names):
+        score = editdistance.eval(target, name) / (max(len(name), len(target)) * 1.00)
+        if score < threshold:
+            scores[labels[idx]] = score
+    if len(scores) == 0:
+        return None
+    return min(scores, key=scores.get)
+
+
+def test_name_index_matches_linear_search():
+    names = ["Scizor", "Scyther", "Breloom", "Flutter Mane", "ハッサム", "ハバタクカミ"]
+    labels = ["ハッサム", "ストライク", "キノガッサ", "ハバタクカミ", "ハッサム", "ハバタクカミ"]
+    name_index = NameIndex(names, labels)
+    targets = [
+        "Scizor\n",
+        "Sclzor",
+        "Scyter",
+        "Brel oom",
+        "FlutterMane",
+        "八ツサム",
+        "xyz",
+        "",
+    ]
+
+    # Act
+    results = [name_index.search(target, 0.5) for target in targets]
+
+    # Assert
+    assert results == [_linear_search(names, labels, target, 0.5) for target in targets]
+    assert results[:3] == ["ハッサム", "ハッサム", "ストライク"]
+    assert results[-2:] == [None, None]
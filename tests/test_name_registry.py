@@ -0,0 +1,27 @@
+import pytest
+
+from poke_battle_logger.name_registry import (
+    export_name_registry,
+    get_name_registry,
+    load_name_registry,
+)
+
+
+def test_name_registry_export_and_load(tmp_path):
+    path = str(tmp_path / "registry.pickle")
+
+    # Act
+    export_name_registry(path)
+    name_registry = load_name_registry(path)
+
+    # Assert
+    assert name_registry == load_name_registry(str(tmp_path / "not_exists.pickle"))
+    assert name_registry.ja_to_no["フシギダネ"] == 1
+    assert name_registry.english_name("ハッサム") == "Scizor"
+    assert name_registry.english_name("Unseen") == "Unseen"
+    assert name_registry.translate("Scizor", "en", "ja") == "ハッサム"
+    assert name_registry.normalized_to_ja["FlutterMane"] == "ハバタクカミ"
+    assert len(name_registry.names("zh")) == len(name_registry.japanese_ocr_names)
+    with pytest.raises(TypeError):
+        name_registry.ja_to_en["ハッサム"] = "Scyther"  # type: ignore
+    assert get_name_registry() is get_name_registry()
@@ -0,0 +1,48 @@
+import numpy as np
+
+from poke_battle_logger.batch.name_window_cache import NameWindowCache, name_window_key
+
+
+def test_name_window_key_ignores_noise_below_threshold():
+    gray_name_window = np.full((60, 240), 20, dtype=np.uint8)
+    gray_name_window[20:40, 30:200] = 250
+    noisy_name_window = gray_name_window.copy()
+    noisy_name_window[0:10, 0:10] = 60
+    other_name_window = gray_name_window.copy()
+    other_name_window[20:40, 100:120] = 20
+
+    # Act
+    key = name_window_key(gray_name_window)
+
+    # Assert
+    assert key == name_window_key(noisy_name_window)
+    assert key != name_window_key(other_name_window)
+
+
+def test_name_window_cache_lru_and_persistence(tmp_path):
+    path = str(tmp_path / "cache.json")
+    name_window_cache = NameWindowCache(max_size=2, path=path)
+    name_window_cache.load("v1")
+
+    # Act
+    name_window_cache.put("a", "ハッサム", 18)
+    name_window_cache.put("b", "キノガッサ", 18)
+    hit = name_window_cache.get("a")
+    name_window_cache.put("c", "ハバタクカミ", 18)  # 最も使われていない b を捨てる
+    miss = name_window_cache.get("b")
+    name_window_cache.save()
+    reloaded = NameWindowCache(max_size=2, path=path)
+    reloaded.load("v1")
+    outdated = NameWindowCache(max_size=2, path=path)
+    outdated.load("v2")
+
+    # Assert
+    assert hit == "ハッサム"
+    assert miss is None
+    assert name_window_cache.stats.hits == 1
+    assert name_window_cache.stats.misses == 1
+    assert name_window_cache.stats.saved_ocr_calls == 18
+    assert name_window_cache.stats.hit_rate == 0.5
+    assert reloaded.get("a") == "ハッサム"
+    assert reloaded.get("c") == "ハバタクカミ"
+    assert len(outdated) == 0
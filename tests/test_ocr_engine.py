@@ -0,0 +1,73 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from poke_battle_logger.batch.ocr_engine import OCREnginePool
+
+
+class RecordingEngine:
+    created = []
+    closed = []
+
+    def __init__(self, lang, psm):
+        self.lang = lang
+        self.psm = psm
+        RecordingEngine.created.append((lang, psm))
+
+    def recognize(self, image):
+        time.sleep(0.001)
+        return f"{self.lang}:{self.psm}:{int(image[0, 0])}"
+
+    def close(self):
+        RecordingEngine.closed.append((self.lang, self.psm))
+
+
+def test_ocr_engine_pool_reuses_engines_and_keeps_order():
+    RecordingEngine.created = []
+    RecordingEngine.closed = []
+    ocr_engine_pool = OCREnginePool(max_workers=2, engine_factory=RecordingEngine)
+    requests = [
+        (np.full((4, 4), k, dtype=np.uint8), lang, 6)
+        for k in range(5)
+        for lang in ["eng", "jpn"]
+    ]
+
+    # Act
+    results = ocr_engine_pool.map_image_to_string(requests)
+    first = ocr_engine_pool.image_to_string(requests[0][0], "eng", psm=8)
+    second = ocr_engine_pool.image_to_string(requests[0][0], "eng", psm=8)
+    ocr_engine_pool.shutdown()
+
+    # Assert
+    assert results == [f"{lang}:6:{k}" for k in range(5) for lang in ["eng", "jpn"]]
+    assert first == second == "eng:8:0"
+    # エンジンは言語・ページ分割モードごとに max_workers 個まで作り、shutdown で全て閉じる
+    assert RecordingEngine.created.count(("eng", 8)) == 1
+    assert RecordingEngine.created.count(("eng", 6)) <= 2
+    assert RecordingEngine.created.count(("jpn", 6)) <= 2
+    assert sorted(RecordingEngine.closed) == sorted(RecordingEngine.created)
+
+
+def test_ocr_engine_pool_bounds_engines_across_threads():
+    RecordingEngine.created = []
+    RecordingEngine.closed = []
+    ocr_engine_pool = OCREnginePool(max_workers=2, engine_factory=RecordingEngine)
+    image = np.zeros((4, 4), dtype=np.uint8)
+    start = threading.Barrier(8)
+
+    def recognize(_):
+        start.wait()
+        return [ocr_engine_pool.image_to_string(image, "eng") for _ in range(5)]
+
+    # Act
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(recognize, range(8)))
+    ocr_engine_pool.shutdown()
+
+    # Assert
+    assert results == [["eng:6:0"] * 5] * 8
+    # 呼び出し元のスレッドが増えても、エンジンは max_workers 個を超えない
+    assert len(RecordingEngine.created) <= 2
+    assert len(RecordingEngine.closed) == len(RecordingEngine.created)
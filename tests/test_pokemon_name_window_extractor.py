@@ -1,5 +1,7 @@
 import cv2
+import numpy as np
 
+from poke_battle_logger.batch.ocr_engine import OCREnginePool
 from poke_battle_logger.batch.pokemon_name_window_extractor import (
     PokemonNameWindowExtractor,
 )
@@ -45,3 +47,87 @@ def test_pokemon_name_window_extract_chi():
     )
     # Assert
     assert pokemon_name.split("_")[0] == "イダイナキバ"
+
+
+def test_pokemon_name_window_search_normalized_names():
+    # Act
+    results = [
+        pokemon_name_window_extractor._search_name("jpn", "八ツ サム\n"),
+        pokemon_name_window_extractor._search_name("jpn", "ハバタク・カミ"),
+        pokemon_name_window_extractor._search_name("eng", "Flutter Mane"),
+        pokemon_name_window_extractor._search_name("eng", "@@@"),
+    ]
+
+    # Assert
+    assert results == ["ハッサム", "ハバタクカミ", "ハバタクカミ", None]
+
+
+class EnglishOnlyEngine:
+    def __init__(self, lang, psm):
+        self.lang = lang
+
+    def recognize(self, image):
+        return "Scizor\n" if self.lang == "eng" else "@@@"
+
+
+def test_pokemon_name_window_extract_adaptive_langs():
+    ocr_engine_pool = OCREnginePool(max_workers=1, engine_factory=EnglishOnlyEngine)
+    adaptive_extractor = PokemonNameWindowExtractor(
+        ocr_engine_pool, adaptive_langs=True
+    )
+    name_window = np.zeros((60, 240, 3), dtype=np.uint8)
+    gray_name_window = cv2.cvtColor(name_window, cv2.COLOR_RGB2GRAY)
+
+    # Act
+    first = adaptive_extractor._recognize_pokemon_name(
+        gray_name_window, name_window, side="opponent"
+    )
+    second = adaptive_extractor._recognize_pokemon_name(
+        gray_name_window, name_window, side="opponent"
+    )
+    other_side = adaptive_extractor._recognize_pokemon_name(
+        gray_name_window, name_window, side="your"
+    )
+    adaptive_extractor.start_battle()
+    next_battle = adaptive_extractor._recognize_pokemon_name(
+        gray_name_window, name_window, side="opponent"
+    )
+    your_next_battle = adaptive_extractor._recognize_pokemon_name(
+        gray_name_window, name_window, side="your"
+    )
+
+    # Assert
+    assert first == ("ハッサム", False, 18)
+    # 英語で見つかったので、2回目は英語の2枚だけ OCR して打ち切る
+    assert second == ("ハッサム", False, 2)
+    assert other_side == ("ハッサム", False, 18)
+    # 新しい対戦では相手の履歴だけが消える
+    assert next_battle == ("ハッサム", False, 18)
+    assert your_next_battle == ("ハッサム", False, 2)
+    assert adaptive_extractor.lang_history["opponent"][0] == "eng"
+    assert adaptive_extractor.early_exit_count == 2
+    assert adaptive_extractor.full_sweep_count == 3
+
+
+class EnglishOnlyLineEngine(EnglishOnlyEngine):
+    calls = 0
+
+    def recognize_lines(self, image):
+        EnglishOnlyLineEngine.calls += 1
+        # 並べた2枚(縦 60 の画像と、その間の 30 の余白)それぞれに1行ずつ返す
+        return [(self.recognize(image), 40, 70), (self.recognize(image), 130, 160)]
+
+
+def test_pokemon_name_window_extract_tiled_ocr():
+    EnglishOnlyLineEngine.calls = 0
+    ocr_engine_pool = OCREnginePool(max_workers=1, engine_factory=EnglishOnlyLineEngine)
+    tiled_extractor = PokemonNameWindowExtractor(ocr_engine_pool, tiled_ocr=True)
+    name_window = np.zeros((60, 240, 3), dtype=np.uint8)
+
+    # Act
+    name, is_unknown = tiled_extractor.extract_pokemon_name_in_battle(name_window)
+
+    # Assert
+    assert (name, is_unknown) == ("ハッサム", False)
+    # 2枚の2値化画像を、言語ごとに1回で OCR する
+    assert EnglishOnlyLineEngine.calls == 9
@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+from poke_battle_logger.batch.rank_digit_recognizer import (
+    RankDigitRecognizer,
+    segment_glyphs,
+)
+
+
+def render(text, inverse=False):
+    image = np.zeros((90, 450), dtype=np.uint8)
+    cv2.putText(image, text, (10, 65), cv2.FONT_HERSHEY_SIMPLEX, 1.8, 255, 4)
+    return 255 - image if inverse else image
+
+
+def build_recognizer(tmp_path):
+    recognizer = RankDigitRecognizer(str(tmp_path / "missing"))
+    # OCR で読めた順位から学習する(各数字は2回読めたときに確定する)
+    for rank in [12345, 67890, 13579, 24680]:
+        recognizer.learn(render(f"No. {rank}"), rank)
+    return recognizer
+
+
+def test_segment_glyphs_splits_label_and_number():
+    # Act
+    words = segment_glyphs(render("No. 1234"))
+
+    # Assert
+    # "o" と "." は数字より低いので文字として扱わず、"N" と順位の2単語になる
+    assert [len(word) for word in words][-1] == 4
+    assert len(words) == 2
+
+
+def test_rank_digit_recognizer_reads_rank(tmp_path):
+    recognizer = build_recognizer(tmp_path)
+
+    # Act
+    rank = recognizer.recognize(render("No. 90817"))
+    inverse_rank = recognizer.recognize(render("No. 3526", inverse=True))
+
+    # Assert
+    assert rank == 90817
+    assert inverse_rank == 3526
+
+
+def test_rank_digit_recognizer_falls_back_when_unsure(tmp_path):
+    recognizer = build_recognizer(tmp_path)
+    empty_recognizer = RankDigitRecognizer(str(tmp_path / "missing"))
+
+    # Act
+    not_digits = recognizer.recognize(render("No. 12A45"))
+    blank = recognizer.recognize(np.zeros((90, 450), dtype=np.uint8))
+    without_templates = empty_recognizer.recognize(render("No. 12345"))
+
+    # Assert
+    assert not_digits is None
+    assert blank is None
+    assert without_templates is None
+
+
+def test_rank_digit_recognizer_learns_only_confirmed_digits(tmp_path):
+    recognizer = RankDigitRecognizer(str(tmp_path / "missing"))
+
+    # Act
+    first = recognizer.learn(render("No. 12345"), 12345)
+    second = recognizer.learn(render("No. 12345"), 12345)
+    # OCR の読み間違い(文字数が合わない・別の数字として読んだ)はテンプレートにしない
+    wrong_length = recognizer.learn(render("No. 6789"), 67890)
+    misread_once = recognizer.learn(render("No. 66666"), 66668)
+    misread_twice = recognizer.learn(render("No. 66666"), 66668)
+    partial = recognizer.recognize(render("No. 12345"))
+
+    # Assert
+    assert first == []
+    assert second == [1, 2, 3, 4, 5]
+    assert wrong_length == []
+    # 同じ順位の中で2回読めた 6 は確定するが、6 を 8 と読んだ文字は 6 と一致するので確定しない
+    assert misread_once == [6]
+    assert misread_twice == []
+    # 0-9 が揃うまでは読まない
+    assert partial is None
+
+
+def test_rank_digit_recognizer_saves_and_loads_templates(tmp_path):
+    recognizer = build_recognizer(tmp_path)
+
+    # Act
+    saved = recognizer.save_templates(str(tmp_path / "templates"))
+    loaded = RankDigitRecognizer(str(tmp_path / "templates"))
+
+    # Assert
+    assert saved == list(range(10))
+    assert loaded.recognize(render("No. 90817")) == 90817
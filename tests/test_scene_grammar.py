@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from config.config import (
+    LEVEL_50_TEMPLATE_PATH,
+    LEVEL_50_WINDOW,
+    RANKING_TEMPLATE_PATH,
+    RANKING_WINDOW,
+    SELECT_DONE_TEMPLATE_PATH,
+    STANDING_BY_TEMPLATE_PATH,
+    STANDING_BY_WINDOW,
+    WIN_LOST_WINDOW,
+    WIN_TEMPLATE_PATH,
+)
+
+from poke_battle_logger.batch.frame_detector import (
+    POKEMON_SELECT_DONE_WINDOW,
+    SCENE_RANKING,
+    SCENE_STANDING_BY,
+    FrameDetector,
+)
+from poke_battle_logger.batch.scene_grammar import SceneGrammarDetector
+
+
+def _frame_with_template(window: tuple, path: str) -> np.ndarray:
+    frame = np.full((1080, 1920, 3), 40, dtype=np.uint8)
+    template = cv2.imread(path)
+    frame[
+        window[0] : window[0] + template.shape[0],
+        window[2] : window[2] + template.shape[1],
+    ] = template
+    return frame
+
+
+def test_scene_grammar_detector_matches_classify_with_fewer_evaluations():
+    blank = np.full((1080, 1920, 3), 40, dtype=np.uint8)
+    screens = [
+        _frame_with_template(RANKING_WINDOW, RANKING_TEMPLATE_PATH),
+        blank,
+        _frame_with_template(STANDING_BY_WINDOW, STANDING_BY_TEMPLATE_PATH),
+        _frame_with_template(POKEMON_SELECT_DONE_WINDOW, SELECT_DONE_TEMPLATE_PATH),
+        blank,
+        _frame_with_template(LEVEL_50_WINDOW, LEVEL_50_TEMPLATE_PATH),
+        blank,
+        _frame_with_template(WIN_LOST_WINDOW, WIN_TEMPLATE_PATH),
+        _frame_with_template(RANKING_WINDOW, RANKING_TEMPLATE_PATH),
+    ]
+    frames = [screen for screen in screens for _ in range(30)]
+    frame_detector = FrameDetector("en")
+    scene_grammar_detector = SceneGrammarDetector(FrameDetector("en"))
+
+    # Act
+    expected = [frame_detector.classify(frame).label for frame in frames]
+    labels = [
+        scene_grammar_detector.classify(i, frame).label
+        for i, frame in enumerate(frames)
+    ]
+
+    # Assert
+    assert labels == expected
+    assert scene_grammar_detector.recoveries == 0
+    assert (
+        scene_grammar_detector.frame_detector.evaluation_count
+        < frame_detector.evaluation_count * 0.6
+    )
+
+
+def test_scene_grammar_detector_recovers_on_full_check():
+    standing_by = _frame_with_template(STANDING_BY_WINDOW, STANDING_BY_TEMPLATE_PATH)
+    ranking = _frame_with_template(RANKING_WINDOW, RANKING_TEMPLATE_PATH)
+    scene_grammar_detector = SceneGrammarDetector(
+        FrameDetector("en"), full_check_interval=5
+    )
+
+    # Act
+    labels = [
+        scene_grammar_detector.classify(i, frame).label
+        for i, frame in enumerate([standing_by] + [ranking] * 6)
+    ]
+
+    # Assert
+    # standing_by の直後に ranking は評価されないので、全検出器で判定する5フレーム目で復帰する
+    assert labels[1] != SCENE_RANKING
+    assert labels[0] == SCENE_STANDING_BY
+    assert labels[5:] == [SCENE_RANKING, SCENE_RANKING]
+    assert scene_grammar_detector.recoveries == 1
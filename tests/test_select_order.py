@@ -0,0 +1,128 @@
+import cv2
+import editdistance
+import numpy as np
+import pytest
+from config.config import TEMPLATE_MATCHING_THRESHOLD
+
+from poke_battle_logger.batch.select_order import (
+    decisive_select_order,
+    solve_select_order,
+)
+
+
+def _template_scores(windows, templates):
+    return np.array(
+        [
+            [
+                cv2.minMaxLoc(cv2.matchTemplate(w, t, cv2.TM_CCOEFF_NORMED))[1]
+                for w in windows
+            ]
+            for t in templates
+        ]
+    )
+
+
+def _nested_loop_select_order(template_scores, recognized_order_strs, order_strs):
+    # 変更前の実装(テンプレートごとに全ウィンドウを調べる)
+    pokemon_select_order_score = []
+    for i in range(3):
+        for k in range(6):
+            recognized = recognized_order_strs[k]
+            ed_score = editdistance.eval(recognized, order_strs[i]) / (
+                max(len(recognized), len(order_strs[i])) * 1.00
+            )
+            score = template_scores[i][k]
+            if (
+                order_strs[i] in recognized
+                or ed_score == 0
+                or (score > TEMPLATE_MATCHING_THRESHOLD and ed_score <= 0.5)
+            ):
+                pokemon_select_order_score.append((k, i, score))
+    pokemon_select_order = []
+    for i in range(3):
+        sorted_orders = sorted(
+            [s for s in pokemon_select_order_score if s[1] == i],
+            key=lambda x: x[2],
+            reverse=True,
+        )
+        for order in sorted_orders:
+            if order[0] not in pokemon_select_order:
+                pokemon_select_order.append(order[0])
+                break
+    return pokemon_select_order
+
+
+def _select_templates(template_dir):
+    return [
+        cv2.imread(f"template_images/{template_dir}/{name}.png", 0)
+        for name in ["first", "second", "third"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "template_dir", ["general_templates", "japanese_general_templates"]
+)
+def test_decisive_select_order(template_dir):
+    templates = _select_templates(template_dir)
+    blank = np.full((50, 180), 30, dtype=np.uint8)
+    windows = [blank, templates[1], blank, templates[0], blank, templates[2]]
+
+    # Act
+    select_order = decisive_select_order(_template_scores(windows, templates))
+    undecided = decisive_select_order(
+        _template_scores([blank, templates[1], blank, blank, blank, blank], templates)
+    )
+
+    # Assert
+    assert select_order == [3, 1, 5]
+    assert undecided is None
+
+
+@pytest.mark.parametrize(
+    "template_dir", ["general_templates", "japanese_general_templates"]
+)
+def test_decisive_select_order_is_never_wrong_on_shifted_windows(template_dir):
+    # ja の "1番目" と "3番目" は数字しか違わないので、ずれ・ノイズのあるウィンドウで
+    # 取り違えず、決まらない場合は None になること
+    templates = _select_templates(template_dir)
+    blank = np.full((50, 180), 30, dtype=np.uint8)
+    rng = np.random.default_rng(0)
+
+    for shift in range(4):
+        for _ in range(20):
+            shifted = [
+                np.clip(
+                    np.roll(template, shift, axis=1).astype(np.int16)
+                    + rng.normal(0, 8, template.shape),
+                    0,
+                    255,
+                ).astype(np.uint8)
+                for template in templates
+            ]
+            windows = [shifted[2], blank, shifted[0], blank, shifted[1], blank]
+
+            # Act
+            select_order = decisive_select_order(_template_scores(windows, templates))
+
+            # Assert
+            assert select_order in (None, [2, 4, 0])
+
+
+def test_solve_select_order_matches_nested_loop():
+    rng = np.random.default_rng(0)
+    order_strs = ["First", "Second", "Third"]
+    candidates = ["First", "Secand", "Thrd", "", "Fist", "xx", "Third", "Second"]
+
+    for _ in range(200):
+        template_scores = rng.uniform(0.3, 1.0, size=(3, 6))
+        recognized_order_strs = list(rng.choice(candidates, size=6))
+
+        # Act
+        select_order = solve_select_order(
+            template_scores, recognized_order_strs, order_strs, "en", 0.5
+        )
+
+        # Assert
+        assert select_order == _nested_loop_select_order(
+            template_scores, recognized_order_strs, order_strs
+        )
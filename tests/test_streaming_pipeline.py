@@ -0,0 +1,79 @@
+import random
+import threading
+
+import numpy as np
+import pytest
+
+from poke_battle_logger.batch.frame_compressor import (
+    frame_compress,
+    message_frame_compress,
+)
+from poke_battle_logger.batch.streaming_pipeline import (
+    StreamingBattlePipeline,
+    StreamingSegmenter,
+)
+
+
+def _stream_targets(task: str, detected: list, total_frames: int) -> list:
+    segmenter = StreamingSegmenter(task)
+    events = []
+    for i in range(total_frames):
+        if i in detected:
+            events.extend(segmenter.push(i, {}))
+        else:
+            events.extend(segmenter.advance(i))
+    events.extend(segmenter.finish())
+    return sorted(frame_number for frame_number, _, _ in events)
+
+
+def test_streaming_segmenter_matches_frame_compress():
+    rng = random.Random(0)
+    for _ in range(20):
+        detected = sorted(rng.sample(range(1500), 150))
+
+        # Act
+        standing_by = _stream_targets("standing_by", set(detected), 1500)
+        select_done = _stream_targets("select_done", set(detected), 1500)
+        win_or_lost = _stream_targets("win_or_lost", set(detected), 1500)
+        message = _stream_targets("message_window", set(detected), 1500)
+
+        # Assert
+        assert standing_by == [
+            v[-1] for v in frame_compress(detected, ignore_short_frames=True)
+        ]
+        assert select_done == [
+            v[-6] if len(v) > 5 else v[-1] for v in frame_compress(detected)
+        ]
+        assert win_or_lost == sum(frame_compress(detected), [])
+        assert message == [v[-1] for v in message_frame_compress(detected)]
+
+
+def test_streaming_pipeline_matches_scan_video(battle_video, battle_video_scan):
+    extracted = []
+    lock = threading.Lock()
+
+    def _extract(task: str, frame_number: int, frame: np.ndarray) -> None:
+        with lock:
+            extracted.append((frame_number, task, frame.shape))
+
+    # Act
+    streamed = StreamingBattlePipeline(
+        battle_video, "en", _extract, detector_threads=2, queue_size=4
+    ).run()
+
+    # Assert
+    assert streamed == battle_video_scan
+    assert sorted(extracted) == [
+        (59, "standing_by", (1080, 1920, 3)),
+        (125, "ranking", (1080, 1920, 3)),
+    ]
+
+
+def test_streaming_pipeline_raises_extraction_failure(battle_video):
+    def _extract(task: str, frame_number: int, frame: np.ndarray) -> None:
+        if task == "ranking":
+            raise ValueError("extraction failed")
+
+    # Act / Assert
+    with pytest.raises(ValueError, match="extraction failed"):
+        StreamingBattlePipeline(battle_video, "en", _extract).run()
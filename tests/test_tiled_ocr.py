@@ -0,0 +1,83 @@
+import numpy as np
+
+from poke_battle_logger.batch.ocr_engine import OCREnginePool
+from poke_battle_logger.batch.tiled_ocr import assign_lines, build_tiled_canvas
+
+
+class RowEngine:
+    """
+    背景と異なる画素値の帯を1行として、その画素値をテキストにするエンジン
+    """
+
+    def __init__(self, lang, psm):
+        self.calls = 0
+
+    def recognize(self, image):
+        return str(int(image.max()))
+
+    def recognize_lines(self, image):
+        self.calls += 1
+        background = int(image[0, 0])
+        rows = np.flatnonzero((image != background).any(axis=1))
+        lines = []
+        for row in rows:
+            if len(lines) > 0 and lines[-1][2] == row:
+                lines[-1] = (lines[-1][0], lines[-1][1], row + 1)
+            else:
+                value = int(image[row][image[row] != background][0])
+                lines.append((f"{value}\n", row, row + 1))
+        return lines
+
+    def close(self):
+        pass
+
+
+def test_build_tiled_canvas_places_crops_on_background():
+    crops = [
+        np.zeros((30, 80), dtype=np.uint8),
+        np.zeros((50, 120, 3), dtype=np.uint8),
+    ]
+    crops[0][10:20, 10:70] = 255
+
+    # Act
+    canvas, spans = build_tiled_canvas(crops)
+
+    # Assert
+    assert canvas.ndim == 2
+    assert [bottom - top for top, bottom in spans] == [30, 50]
+    # 画像の間には、最も高い画像の半分以上の背景の余白がある
+    assert spans[1][0] - spans[0][1] >= 25
+    assert (canvas[spans[0][1] : spans[1][0]] == 0).all()
+    assert canvas[spans[0][0] + 15].max() == 255
+
+
+def test_assign_lines_maps_lines_to_crops():
+    spans = [(20, 50), (70, 120), (140, 170)]
+    lines = [("a\n", 25, 45), ("b", 75, 90), ("c", 95, 115), ("noise", 0, 10)]
+
+    # Act
+    texts = assign_lines(lines, spans)
+
+    # Assert
+    assert texts == ["a", "b\nc", ""]
+
+
+def test_tiled_image_to_string_recognizes_crops_in_one_call():
+    ocr_engine_pool = OCREnginePool(max_workers=1, engine_factory=RowEngine)
+    crops = []
+    for value in [100, 0, 200]:
+        crop = np.zeros((40, 60), dtype=np.uint8)
+        crop[10:30, 5:55] = value
+        crops.append(crop)
+
+    # Act
+    texts = ocr_engine_pool.tiled_image_to_string(crops, "eng")
+    results = ocr_engine_pool.map_tiled_image_to_string(
+        [(crops, "eng", 6), (crops[:1], "jpn", 6)]
+    )
+
+    # Assert
+    assert texts == ["100", "", "200"]
+    assert results == [["100", "", "200"], ["100"]]
+    with ocr_engine_pool._engine("eng", 6) as engine:
+        assert engine.calls == 2